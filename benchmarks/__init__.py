@@ -0,0 +1 @@
+"""Benchmarks of tracking overhead, run with ``python -m benchmarks``"""
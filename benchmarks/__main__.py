@@ -0,0 +1,105 @@
+"""Command line interface of benchmarks.
+
+Run from repository root::
+
+    $ python -m benchmarks --output bench.json
+    $ python -m benchmarks --compare bench.json --set LAZY_SNAPSHOT=True
+"""
+import argparse
+import ast
+import json
+import sys
+
+# Imported for its side effect only: configures settings, sets Django
+# up and registers benchmark models before anything else touches them
+from benchmarks import models  # noqa pylint: disable=unused-import
+
+import django
+from django.core.management import call_command
+from django.test.utils import override_settings
+
+from benchmarks import cases, runner
+from tracked_model import conf
+
+
+def _setting(value):
+    """Returns ``(setting, value)`` parsed from ``NAME=VALUE``"""
+    name, _, value = value.partition('=')
+    if name not in conf.DEFAULTS:
+        raise argparse.ArgumentTypeError('Unknown setting: ' + name)
+    try:
+        return conf.PREFIX + name, ast.literal_eval(value)
+    except (ValueError, SyntaxError):
+        raise argparse.ArgumentTypeError('Invalid value: ' + value)
+
+
+def _parser():
+    """Returns command line arguments parser"""
+    parser = argparse.ArgumentParser(
+        prog='python -m benchmarks',
+        description='Measure overhead of tracked models on SQLite')
+    parser.add_argument(
+        '--objects', type=int, default=100,
+        help='Number of objects every case works with')
+    parser.add_argument(
+        '--repeat', type=int, default=5, help='Number of measured runs')
+    parser.add_argument(
+        '--filter', action='append', default=[],
+        help='Run only cases with names containing given text')
+    parser.add_argument(
+        '--set', action='append', default=[], type=_setting,
+        metavar='NAME=VALUE',
+        help='Set TRACKED_MODEL_<NAME> setting to python literal')
+    parser.add_argument('--output', help='Write results to json file')
+    parser.add_argument(
+        '--compare', help='Compare results with json file written '
+                          'by --output, exit with 1 on regression')
+    parser.add_argument(
+        '--threshold', type=float, default=1.2,
+        help='Time ratio considered regression')
+    return parser
+
+
+def main(argv=None):
+    """Runs benchmarks, returns exit code"""
+    args = _parser().parse_args(argv)
+    # Tables of apps without migrations are created by default before 1.9
+    options = {'run_syncdb': True} if django.VERSION >= (1, 9) else {}
+    call_command('migrate', verbosity=0, interactive=False, **options)
+
+    selected = [
+        x for x in cases.CASES
+        if not args.filter or any(f in x.name for f in args.filter)]
+    results = []
+    row = '{0:<36} {1:>12} {2:>8} {3:>12}'
+    print(row.format('case', 'median ms', 'queries', 'peak KiB'))
+    with override_settings(**dict(args.set)):
+        for case in selected:
+            result = runner.run_case(case, args.objects, args.repeat)
+            results.append(result)
+            print(row.format(
+                result['name'], '{0:.3f}'.format(result['time_median'] * 1e3),
+                result['queries'],
+                '{0:.1f}'.format(result['alloc_peak'] / 1024)))
+
+    if args.output:
+        env = runner.environment()
+        env['settings'] = dict(args.set)
+        with open(args.output, 'w') as stream:
+            json.dump({'environment': env, 'results': results}, stream,
+                      indent=2, sort_keys=True)
+
+    if args.compare:
+        with open(args.compare) as stream:
+            baseline = json.load(stream)['results']
+        regressions = runner.compare(results, baseline, args.threshold)
+        for name, ratio, queries in regressions:
+            print('Regression: {0} {1:.2f}x time, {2:+d} queries'.format(
+                name, ratio, queries))
+        if regressions:
+            return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,281 @@
+"""Benchmark cases.
+
+Every case is prepared once and then run repeatedly. Changes made by
+runs are rolled back, changes made by ``prepare`` are rolled back
+once the case is done (see ``runner``).
+"""
+import datetime
+from collections import namedtuple
+
+from benchmarks import models
+
+
+# ``prepare(objects)`` returns argument of ``run``, ``objects`` is
+# number of objects each run works with
+Case = namedtuple('Case', ('name', 'prepare', 'run'))
+
+CASES = []
+
+
+def case(name):
+    """Registers cases yielded by decorated factory as
+    ``(variant, prepare, run)``. Case names are ``name`` formatted
+    with variant.
+    """
+    def decorator(factory):
+        for variant in factory():
+            CASES.append(Case(name.format(variant[0]), *variant[1:]))
+        return factory
+    return decorator
+
+
+def _narrow_values(num):
+    """Returns field values of ``num``-th narrow model"""
+    return {'num': num, 'txt': 'txt {0}'.format(num),
+            'date': datetime.date(2015, 1, 1 + num % 28)}
+
+
+def _create_narrow(model, objects):
+    """Stores ``objects`` narrow ``model`` instances,
+    returns their pks
+    """
+    objs = [model(**_narrow_values(x)) for x in range(objects)]
+    for obj in objs:
+        obj.save()
+    return [x.pk for x in objs]
+
+
+def _create_wide(model, objects):
+    """Stores ``objects`` wide ``model`` instances, returns their pks"""
+    objs = [model() for _ in range(objects)]
+    for obj in objs:
+        obj.save()
+    return [x.pk for x in objs]
+
+
+def _objects(model, pks):
+    """Returns queryset of ``model`` objects with ``pks``.
+    Filters by range, SQLite limits number of query parameters.
+    """
+    return model.objects.filter(pk__range=(min(pks), max(pks)))
+
+
+NARROW = (
+    ('plain', models.PlainNarrow),
+    ('tracked', models.TrackedNarrow),
+)
+
+WIDE = (
+    ('plain', models.PlainWide),
+    ('tracked', models.TrackedWide),
+    ('dirty', models.DirtyWide),
+)
+
+
+@case('init_narrow_{0}')
+def init_narrow():
+    """Instantiation of unsaved objects"""
+    for kind, model in NARROW:
+        def run(values, model=model):
+            for kwargs in values:
+                model(**kwargs)
+        yield (kind,
+               lambda objects: [_narrow_values(x) for x in range(objects)],
+               run)
+
+
+@case('iterate_narrow_{0}')
+def iterate_narrow():
+    """Loading objects from database"""
+    for kind, model in NARROW:
+        def prepare(objects, model=model):
+            _create_narrow(model, objects)
+            return model.objects.all()
+
+        yield (kind, prepare, lambda queryset: list(queryset.all()))
+
+
+@case('iterate_wide_{0}')
+def iterate_wide():
+    """Loading objects with many fields from database"""
+    for kind, model in WIDE:
+        def prepare(objects, model=model):
+            _create_wide(model, objects)
+            return model.objects.all()
+
+        yield (kind, prepare, lambda queryset: list(queryset.all()))
+
+
+@case('create_narrow_{0}')
+def create_narrow():
+    """Saving new objects one by one"""
+    for kind, model in NARROW:
+        yield (kind, lambda objects: objects,
+               lambda objects, model=model: _create_narrow(model, objects))
+
+
+@case('save_narrow_{0}')
+def save_narrow():
+    """Saving objects with one changed field"""
+    for kind, model in NARROW:
+        def prepare(objects, model=model):
+            pks = _create_narrow(model, objects)
+            return list(_objects(model, pks))
+
+        def run(objs):
+            for obj in objs:
+                obj.num += 1
+                obj.save()
+
+        yield (kind, prepare, run)
+
+
+@case('save_wide_{0}')
+def save_wide():
+    """Saving objects with many fields and one changed field"""
+    for kind, model in WIDE:
+        def prepare(objects, model=model):
+            pks = _create_wide(model, objects)
+            return list(_objects(model, pks))
+
+        def run(objs):
+            for obj in objs:
+                obj.field_0 += 1
+                obj.save()
+
+        yield (kind, prepare, run)
+
+
+@case('save_update_fields_wide_{0}')
+def save_update_fields_wide():
+    """Saving one changed field of objects with many fields"""
+    for kind, model in WIDE:
+        def prepare(objects, model=model):
+            pks = _create_wide(model, objects)
+            return list(_objects(model, pks))
+
+        def run(objs):
+            for obj in objs:
+                obj.field_0 += 1
+                obj.save(update_fields=['field_0'])
+
+        yield (kind, prepare, run)
+
+
+@case('diff_{0}')
+def diff():
+    """Looking for changes without saving"""
+    variants = (
+        ('narrow_tracked', models.TrackedNarrow, _create_narrow, 'num'),
+        ('wide_tracked', models.TrackedWide, _create_wide, 'field_0'),
+        ('wide_dirty', models.DirtyWide, _create_wide, 'field_0'),
+    )
+    for kind, model, create, field in variants:
+        def prepare(objects, model=model, create=create, field=field):
+            objs = list(_objects(model, create(model, objects)))
+            for obj in objs:
+                setattr(obj, field, -1)
+            return objs
+
+        def run(objs):
+            for obj in objs:
+                obj._tracked_model_diff()
+
+        yield (kind, prepare, run)
+
+
+@case('bulk_create_narrow_{0}')
+def bulk_create_narrow():
+    """Inserting objects with single query. Tracked objects are inserted
+    one by one if database doesn't return primary keys of bulk insert.
+    """
+    for kind, model in NARROW:
+        def run(objects, model=model):
+            model.objects.bulk_create(
+                [model(**_narrow_values(x)) for x in range(objects)])
+
+        yield (kind, lambda objects: objects, run)
+
+
+@case('bulk_update_narrow_{0}')
+def bulk_update_narrow():
+    """Updating objects with single query"""
+    for kind, model in NARROW:
+        def prepare(objects, model=model):
+            _create_narrow(model, objects)
+            return model.objects.all()
+
+        def run(queryset):
+            queryset.update(txt='updated')
+
+        yield (kind, prepare, run)
+
+
+@case('m2m_{0}')
+def m2m():
+    """Adding and removing related objects of m2m fields"""
+    variants = (
+        ('plain', models.PlainM2M, models.PlainNarrow),
+        ('tracked', models.TrackedM2M, models.TrackedNarrow),
+    )
+    for kind, model, related in variants:
+        def prepare(objects, model=model, related=related):
+            pks = _create_narrow(related, objects)
+            obj = model.objects.create()
+            return obj, list(_objects(related, pks))
+
+        def run(arg):
+            obj, related = arg
+            for manager in (obj.first, obj.second):
+                manager.add(*related)
+                manager.remove(*related[::2])
+                manager.clear()
+
+        yield (kind, prepare, run)
+
+
+@case('save_m2m_{0}')
+def save_m2m():
+    """Saving and deleting objects with populated m2m fields"""
+    variants = (
+        ('plain', models.PlainM2M, models.PlainNarrow),
+        ('tracked', models.TrackedM2M, models.TrackedNarrow),
+    )
+    for kind, model, related in variants:
+        def prepare(objects, model=model, related=related):
+            pks = _create_narrow(related, objects)
+            related = list(_objects(related, pks))
+            objs = [model.objects.create() for _ in range(objects)]
+            for obj in objs:
+                obj.first.add(*related[:10])
+                obj.second.add(*related[-10:])
+            return _objects(model, [x.pk for x in objs])
+
+        def run(queryset):
+            # Deleted instances lose their pks, so load fresh ones
+            objs = list(queryset.all())
+            for obj in objs:
+                obj.save()
+            for obj in objs:
+                obj.delete()
+
+        yield (kind, prepare, run)
+
+
+# Numbers of revisions replayed by ``materialize``
+CHAIN_LENGTHS = (10, 100, 1000)
+
+
+@case('materialize_{0}')
+def materialize():
+    """Restoring object from history of given length"""
+    for length in CHAIN_LENGTHS:
+        def prepare(objects, length=length):
+            obj = models.TrackedNarrow.objects.create(**_narrow_values(0))
+            for num in range(1, length):
+                obj.num = num
+                obj.save()
+            return obj.tracked_model_history().latest()
+
+        yield ('chain_{0}'.format(length), prepare,
+               lambda hist: hist.materialize())
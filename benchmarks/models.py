@@ -0,0 +1,72 @@
+"""Models for benchmarks, plain and tracked variants of each"""
+import django
+from django.db import models
+from django.conf import settings
+
+from tracked_model.control import (
+    TrackedModelMixin, DirtyTrackedModelMixin, TrackedManager)
+
+
+settings.configure(
+    DEBUG=False,
+    DATABASES={
+        'default': {
+            'ENGINE': 'django.db.backends.sqlite3',
+            'NAME': ':memory:'
+        }
+    },
+    INSTALLED_APPS=(
+        'benchmarks', 'tracked_model',
+        'django.contrib.auth', 'django.contrib.contenttypes'
+    )
+)
+
+django.setup()
+
+
+# Number of integer fields of wide models
+WIDE_FIELDS = 40
+
+
+class PlainNarrow(models.Model):
+    """Few simple fields"""
+    num = models.IntegerField()
+    txt = models.TextField()
+    date = models.DateField(null=True)
+
+
+class TrackedNarrow(TrackedModelMixin, models.Model):
+    """Few simple fields"""
+    num = models.IntegerField()
+    txt = models.TextField()
+    date = models.DateField(null=True)
+
+    objects = TrackedManager()
+
+
+def _wide_model(name, bases):
+    """Returns model class with ``WIDE_FIELDS`` integer fields"""
+    attrs = {
+        'field_{0}'.format(x): models.IntegerField(default=0)
+        for x in range(WIDE_FIELDS)
+    }
+    attrs['__module__'] = __name__
+    attrs['__doc__'] = 'Many integer fields'
+    return type(name, bases, attrs)
+
+
+PlainWide = _wide_model('PlainWide', (models.Model,))
+TrackedWide = _wide_model('TrackedWide', (TrackedModelMixin, models.Model))
+DirtyWide = _wide_model('DirtyWide', (DirtyTrackedModelMixin, models.Model))
+
+
+class PlainM2M(models.Model):
+    """Model with m2m fields"""
+    first = models.ManyToManyField(PlainNarrow, related_name='+')
+    second = models.ManyToManyField(PlainNarrow, related_name='+')
+
+
+class TrackedM2M(TrackedModelMixin, models.Model):
+    """Model with m2m fields"""
+    first = models.ManyToManyField(TrackedNarrow, related_name='+')
+    second = models.ManyToManyField(TrackedNarrow, related_name='+')
@@ -0,0 +1,98 @@
+"""Runs benchmark cases and compares results"""
+import gc
+import platform
+import statistics
+import sys
+import time
+import tracemalloc
+
+import django
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
+
+
+def _run(case, arg):
+    """Runs ``case`` with garbage collection disabled (like ``timeit``)
+    and rolls its changes back. Returns elapsed seconds.
+    """
+    sid = transaction.savepoint()
+    gc.collect()
+    gc.disable()
+    try:
+        start = time.perf_counter()
+        case.run(arg)
+        return time.perf_counter() - start
+    finally:
+        gc.enable()
+        transaction.savepoint_rollback(sid)
+
+
+def _allocations(case, arg):
+    """Returns peak and retained bytes allocated by single run"""
+    sid = transaction.savepoint()
+    tracemalloc.start()
+    try:
+        case.run(arg)
+        retained, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+        transaction.savepoint_rollback(sid)
+    return peak, retained
+
+
+def run_case(case, objects, repeat):
+    """Returns result dict of ``case`` run ``repeat`` times with
+    ``objects`` objects. First run is not measured, so caches
+    are warm.
+    """
+    with transaction.atomic():
+        arg = case.prepare(objects)
+        _run(case, arg)
+        times = [_run(case, arg) for _ in range(repeat)]
+        with CaptureQueriesContext(connection) as queries:
+            _run(case, arg)
+        # Savepoint queries of ``_run``
+        query_count = len(queries.captured_queries) - 2
+        peak, retained = _allocations(case, arg)
+        transaction.set_rollback(True)
+
+    return {
+        'name': case.name,
+        'objects': objects,
+        'repeat': repeat,
+        'time_min': min(times),
+        'time_median': statistics.median(times),
+        'time_mean': statistics.mean(times),
+        'queries': query_count,
+        'alloc_peak': peak,
+        'alloc_retained': retained,
+    }
+
+
+def environment():
+    """Returns dict describing environment results were measured in"""
+    return {
+        'python': platform.python_version(),
+        'django': django.get_version(),
+        'sqlite': connection.Database.sqlite_version,
+        'platform': platform.platform(),
+        'argv': sys.argv[1:],
+    }
+
+
+def compare(results, baseline, threshold):
+    """Returns list of ``(name, time ratio, queries difference)`` of
+    ``results`` slower than ``baseline`` results more than
+    ``threshold`` times, or making more queries
+    """
+    previous = {x['name']: x for x in baseline}
+    regressions = []
+    for result in results:
+        old = previous.get(result['name'])
+        if old is None:
+            continue
+        ratio = result['time_median'] / old['time_median']
+        queries = result['queries'] - old['queries']
+        if ratio > threshold or queries > 0:
+            regressions.append((result['name'], ratio, queries))
+    return regressions
@@ -9,10 +9,18 @@ setup(
     description=tracked_model.__doc__,
     author=tracked_model.__author__,
     author_email=tracked_model.__author_email__,
-    packages=['tracked_model'],
+    packages=[
+        'tracked_model', 'tracked_model.migrations',
+        'tracked_model.management', 'tracked_model.management.commands'
+    ],
     license='MIT',
     long_description=open('README').read(),
     install_requires=['django>=1.8.1'],
+    extras_require={
+        'orjson': ['orjson'],
+        'msgpack': ['msgpack'],
+        'zstd': ['zstandard'],
+    },
     classifiers=[
         'Development Status :: 4 - Beta',
         'Intended Audience :: Developers',
@@ -3,15 +3,24 @@ import django
 from django.db import models
 from django.conf import settings
 
-from tracked_model.control import TrackedModelMixin
+from tracked_model.control import (
+    TrackedModelMixin, DirtyTrackedModelMixin, TrackedManager)
 
 
 settings.configure(
     DEBUG=True,
     DATABASES={
+        # Test databases are files rather than in memory, so background
+        # writer thread waits for locks of other connections
         'default': {
             'ENGINE': 'django.db.backends.sqlite3',
-            'NAME': '/tmp/test.db'
+            'NAME': '/tmp/test.db',
+            'TEST': {'NAME': '/tmp/test_test.db'},
+        },
+        'audit': {
+            'ENGINE': 'django.db.backends.sqlite3',
+            'NAME': '/tmp/test_audit.db',
+            'TEST': {'NAME': '/tmp/test_test_audit.db'},
         }
     },
     INSTALLED_APPS=(
@@ -29,6 +38,15 @@ class BasicModel(TrackedModelMixin, models.Model):
     some_txt = models.TextField()
     some_date = models.DateField(null=True)
 
+    objects = TrackedManager()
+
+
+class RequestModel(TrackedModelMixin, models.Model):
+    """Model with field named like tracking keyword"""
+    request = models.TextField()
+
+    objects = TrackedManager()
+
 
 class FKModel(TrackedModelMixin, models.Model):
     """Model with foreign key"""
@@ -40,3 +58,30 @@ class M2MModel(TrackedModelMixin, models.Model):
     """Model with m2m key"""
     created = models.DateTimeField(auto_now_add=True)
     bunch = models.ManyToManyField(BasicModel)
+
+    objects = TrackedManager()
+
+
+class DirtyModel(DirtyTrackedModelMixin, models.Model):
+    """Model tracking assigned fields"""
+    some_num = models.IntegerField()
+    some_txt = models.TextField()
+    basic = models.ForeignKey(BasicModel, null=True)
+    bunch = models.ManyToManyField(BasicModel, related_name='+')
+
+
+class ConfiguredModel(TrackedModelMixin, models.Model):
+    """Model with ``TrackedMeta`` configuration"""
+    title = models.TextField()
+    hits = models.IntegerField(default=0)
+    updated = models.DateTimeField(auto_now=True)
+    data = models.BinaryField(null=True)
+    tags = models.ManyToManyField(BasicModel)
+
+    objects = TrackedManager()
+
+    class TrackedMeta:
+        """Tracked fields configuration"""
+        exclude = ('updated',)
+        ignore_changes = ('hits', 'tags')
+        skip_blobs = True
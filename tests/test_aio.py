@@ -0,0 +1,99 @@
+"""Test for ``aio`` module"""
+import asyncio
+import threading
+
+import pytest
+
+from tests import models
+
+from tracked_model import aio
+from tracked_model.control import acreate_track_token
+from tracked_model.defs import ActionType
+from tracked_model.models import History, RequestInfo
+
+
+pytestmark = pytest.mark.django_db
+
+
+@pytest.fixture
+def loop():
+    """Returns event loop of current thread"""
+    loop = asyncio.new_event_loop()
+    asyncio.set_event_loop(loop)
+    yield loop
+    loop.close()
+    asyncio.set_event_loop(None)
+
+
+@pytest.fixture
+def shared_db(transactional_db):
+    """Skips tests if database isn't shared with pool threads"""
+    from django.db import connection
+    if connection.settings_dict['NAME'] == ':memory:':
+        pytest.skip('in-memory database is not shared between threads')
+
+
+def _collect(loop, iterator):
+    """Returns list of items of asynchronous ``iterator``"""
+    items = []
+    while True:
+        try:
+            items.append(loop.run_until_complete(iterator.__anext__()))
+        except StopAsyncIteration:
+            return items
+
+
+def test_run(loop):
+    """Test ``aio.run`` calls function in pool thread"""
+    thread = loop.run_until_complete(aio.run(threading.current_thread))
+    assert thread is not threading.current_thread()
+    assert loop.run_until_complete(aio.run(max, 1, 2, key=lambda x: -x)) == 1
+    with pytest.raises(ZeroDivisionError):
+        loop.run_until_complete(aio.run(lambda: 1 / 0))
+
+
+def test_chunk_iterator(loop):
+    """Test ``aio.ChunkIterator`` yields items of all chunks"""
+    iterator = aio.ChunkIterator(iter([[1, 2], [3]]))
+    assert iterator.__aiter__() is iterator
+    assert _collect(loop, iterator) == [1, 2, 3]
+    assert _collect(loop, aio.ChunkIterator(iter([]))) == []
+
+
+@pytest.mark.usefixtures('shared_db')
+def test_asave_adelete(loop, rf, admin_user):
+    """Test ``asave``, ``adelete`` and ``amaterialize`` track changes"""
+    request = rf.get('/')
+    request.user = admin_user
+    token = loop.run_until_complete(acreate_track_token(request))
+    assert RequestInfo.objects.filter(pk=token.request_pk).exists()
+
+    model = models.BasicModel(some_num=1, some_txt='lol')
+    loop.run_until_complete(model.asave(track_token=token))
+    model.some_num = 2
+    loop.run_until_complete(model.asave())
+    hist = model.tracked_model_history().latest()
+    restored = loop.run_until_complete(hist.amaterialize())
+    assert restored.some_num == 2
+
+    history = model.tracked_model_history()
+    loop.run_until_complete(model.adelete())
+    assert history.count() == 3
+    assert history.latest().action_type == ActionType.DELETE
+    assert history.earliest().revision_author == admin_user
+
+
+@pytest.mark.usefixtures('shared_db')
+def test_aiterator(loop):
+    """Test ``HistoryQuerySet.aiterator`` yields history by revision"""
+    model = models.BasicModel.objects.create(some_num=0, some_txt='lol')
+    for num in range(1, 5):
+        model.some_num = num
+        model.save()
+    history = model.tracked_model_history()
+    pks = list(history.order_by('revision_ts', 'pk').values_list(
+        'pk', flat=True))
+    hists = _collect(loop, history.aiterator(chunk_size=2))
+    assert [x.pk for x in hists] == pks
+    assert [x.pk for x in _collect(loop, history.__aiter__())] == pks
+    assert _collect(loop, History.objects.none().aiterator()) == []
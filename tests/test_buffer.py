@@ -0,0 +1,154 @@
+"""Test for ``buffer`` module"""
+import pytest
+from django.db import transaction, connection
+from django.test.utils import CaptureQueriesContext
+
+from tests import models
+
+from tracked_model.defs import ActionType
+from tracked_model.models import History, RequestInfo
+
+
+pytestmark = [
+    pytest.mark.django_db(transaction=True),
+    pytest.mark.skipif(
+        not hasattr(transaction, 'on_commit'),
+        reason='transaction.on_commit is not supported')
+]
+
+
+@pytest.fixture(autouse=True)
+def buffer_enabled(settings):
+    """Enables history buffering"""
+    settings.TRACKED_MODEL_BUFFER = True
+
+
+def test_buffer_flushed_on_commit():
+    """Test history is stored on commit with collapsed updates"""
+    with transaction.atomic():
+        model = models.BasicModel.objects.create(some_num=1, some_txt='lol')
+        for num in range(2, 6):
+            model.some_num = num
+            model.save()
+        model.some_txt = 'wut'
+        model.save()
+        assert History.objects.count() == 0
+
+    history = model.tracked_model_history()
+    assert history.count() == 2
+    assert history.filter(action_type=ActionType.CREATE).count() == 1
+    assert history.latest().materialize().some_num == 5
+    assert history.latest().materialize().some_txt == 'wut'
+
+    with transaction.atomic():
+        model.some_num = 1
+        model.save()
+        model.some_num = 5
+        model.save()
+    assert history.count() == 2
+
+    with CaptureQueriesContext(connection) as queries:
+        with transaction.atomic():
+            for num in range(3):
+                models.BasicModel(some_num=num, some_txt='lol').save()
+    assert History.objects.count() == 5
+    history_table = History._meta.db_table
+    inserts = [x for x in queries if history_table in x['sql']]
+    assert len(inserts) == 1
+
+
+def test_buffer_field_index(settings):
+    """Test collapsed updates are indexed with merged fields"""
+    settings.TRACKED_MODEL_FIELD_INDEX = True
+    with transaction.atomic():
+        model = models.BasicModel.objects.create(some_num=1, some_txt='lol')
+        model.some_num = 2
+        model.save()
+        model.some_txt = 'wut'
+        model.save()
+
+    update = model.tracked_model_history().latest()
+    fields = update.field_changes.values_list('field', flat=True)
+    assert sorted(fields) == ['some_num', 'some_txt']
+
+
+def test_buffer_dropped_on_rollback():
+    """Test history is not stored for rolled back changes"""
+    with pytest.raises(ValueError):
+        with transaction.atomic():
+            models.BasicModel.objects.create(some_num=1, some_txt='lol')
+            raise ValueError()
+    assert History.objects.count() == 0
+
+    with transaction.atomic():
+        models.BasicModel.objects.create(some_num=1, some_txt='lol')
+        try:
+            with transaction.atomic():
+                models.BasicModel.objects.create(some_num=2, some_txt='lol')
+                raise ValueError()
+        except ValueError:
+            pass
+        models.BasicModel.objects.create(some_num=3, some_txt='lol')
+
+    assert models.BasicModel.objects.count() == 2
+    assert History.objects.count() == 2
+
+
+def test_buffer_nested_create():
+    """Test object created in nested atomic block and updated in outer
+    one is stored in order of changes
+    """
+    with transaction.atomic():
+        # Buffer of outer block is flushed first
+        models.BasicModel.objects.create(some_num=0, some_txt='lol')
+        with transaction.atomic():
+            model = models.BasicModel.objects.create(
+                some_num=1, some_txt='lol')
+        model.some_num = 2
+        model.save()
+
+    latest = model.tracked_model_history().latest()
+    assert latest.action_type == ActionType.UPDATE
+    assert latest.get_state() is not None
+    assert latest.materialize().some_num == 2
+
+
+def test_buffer_not_collapsed_over_nested_update():
+    """Test updates aren't collapsed over update of nested atomic block"""
+    model = models.BasicModel.objects.create(some_num=1, some_txt='lol')
+    with transaction.atomic():
+        model.some_num = 2
+        model.save()
+        with transaction.atomic():
+            model.some_num = 5
+            model.save()
+        model.some_num = 3
+        model.save()
+
+    history = model.tracked_model_history()
+    assert history.count() == 4
+    assert history.latest().materialize().some_num == 3
+
+
+def test_buffer_deferred_request_info(rf, settings):
+    """Test deferred ``RequestInfo`` is stored only with history"""
+    from django.contrib.auth.models import AnonymousUser
+    settings.TRACKED_MODEL_DEFER_REQUEST_INFO = True
+    request = rf.get('/')
+    request.user = AnonymousUser()
+    with pytest.raises(ValueError):
+        with transaction.atomic():
+            models.BasicModel(some_num=1, some_txt='lol').save(request=request)
+            raise ValueError()
+    assert RequestInfo.objects.count() == 0
+
+    with transaction.atomic():
+        models.BasicModel(some_num=1, some_txt='lol').save(request=request)
+        assert RequestInfo.objects.count() == 0
+    assert History.objects.get().revision_request == RequestInfo.objects.get()
+
+
+def test_buffer_not_used_in_autocommit():
+    """Test history is stored immediately outside of atomic block"""
+    models.BasicModel.objects.create(some_num=1, some_txt='lol')
+    assert History.objects.count() == 1
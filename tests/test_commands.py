@@ -0,0 +1,135 @@
+"""Test for management commands"""
+import csv
+import datetime
+import io
+import json
+
+import pytest
+from django.core.management import call_command, CommandError
+from django.utils import timezone
+
+from tests import models
+
+from tracked_model.models import History, ArchivedHistory, FieldChange
+
+
+pytestmark = pytest.mark.django_db
+
+
+def test_tracked_model_checkpoint():
+    """Test ``tracked_model_checkpoint`` backfills checkpoints"""
+    obj = models.BasicModel.objects.create(some_num=0, some_txt='spam')
+    other = models.FKModel.objects.create(some_ip='127.0.0.1', basic=obj)
+    for num in range(1, 6):
+        obj.some_num = num
+        obj.save()
+        other.some_ip = '127.0.0.{0}'.format(num)
+        other.save()
+
+    with pytest.raises(CommandError):
+        call_command('tracked_model_checkpoint')
+    call_command('tracked_model_checkpoint', revisions=2,
+                 model='tests.BasicModel')
+    history = obj.tracked_model_history()
+    assert history.exclude(snapshot=None).count() == 2
+    assert History.objects.exclude(snapshot=None).count() == 2
+    assert history[4].materialize().some_num == 4
+
+    call_command('tracked_model_checkpoint', revisions=2)
+    assert History.objects.exclude(snapshot=None).count() == 4
+    history.exclude(snapshot=None).update(change_log=b'broken')
+    assert history.latest().materialize().some_num == 5
+    ips = [x.materialize().some_ip for x in other.tracked_model_history()]
+    assert ips[-1] == '127.0.0.5'
+
+
+def test_tracked_model_export(tmpdir):
+    """Test ``tracked_model_export`` writes NDJSON and CSV"""
+    obj = models.BasicModel.objects.create(some_num=0, some_txt='spam')
+    obj.some_num = 1
+    obj.save()
+    models.FKModel.objects.create(some_ip='127.0.0.1', basic=obj)
+
+    stdout, stderr = io.StringIO(), io.StringIO()
+    call_command('tracked_model_export', model='tests.BasicModel',
+                 chunk_size=1, stdout=stdout, stderr=stderr)
+    lines = stdout.getvalue().splitlines()
+    assert len(lines) == 2
+    assert json.loads(lines[1])['change_log']['some_num']['new'] == 1
+    assert 'Exported 2 revisions' in stderr.getvalue()
+
+    output = str(tmpdir.join('history.csv'))
+    call_command('tracked_model_export', format='csv', output=output,
+                 since='2000-01-01', stdout=io.StringIO())
+    with open(output) as stream:
+        rows = list(csv.DictReader(stream))
+    assert [x['model'] for x in rows] == [
+        'basicmodel', 'basicmodel', 'fkmodel']
+    assert json.loads(rows[2]['change_log'])['basic']['rel']
+
+    call_command('tracked_model_export', until='2000-01-01', stdout=stdout,
+                 stderr=stderr)
+    assert 'Exported 0 revisions' in stderr.getvalue()
+    with pytest.raises(CommandError):
+        call_command('tracked_model_export', since='yesterday')
+
+
+def test_tracked_model_archive(settings):
+    """Test ``tracked_model_archive`` archives by retention"""
+    obj = models.BasicModel.objects.create(some_num=0, some_txt='spam')
+    obj.some_num = 1
+    obj.save()
+    other = models.FKModel.objects.create(some_ip='127.0.0.1', basic=obj)
+    History.objects.update(
+        revision_ts=timezone.now() - datetime.timedelta(days=10))
+
+    with pytest.raises(CommandError):
+        call_command('tracked_model_archive', model='tests.BasicModel')
+    settings.TRACKED_MODEL_RETENTION = {'tests.BasicModel': 5}
+    stdout = io.StringIO()
+    call_command('tracked_model_archive', stdout=stdout)
+    assert 'Archived 2 revisions' in stdout.getvalue()
+    assert ArchivedHistory.objects.count() == 2
+    assert obj.tracked_model_history().get().materialize().some_num == 1
+    assert other.tracked_model_history().count() == 1
+
+    # Checkpoint stored at previous cutoff is archived too
+    call_command('tracked_model_archive', days=5, stdout=stdout)
+    assert ArchivedHistory.objects.count() == 4
+    assert obj.tracked_model_history().get().materialize().some_num == 1
+
+
+def test_tracked_model_partitions():
+    """Test ``tracked_model_partitions`` requires PostgreSQL"""
+    with pytest.raises(CommandError):
+        call_command('tracked_model_partitions')
+
+
+def test_tracked_model_index_fields(settings):
+    """Test ``tracked_model_index_fields`` backfills field index"""
+    obj = models.BasicModel.objects.create(some_num=0, some_txt='spam')
+    obj.some_num = 1
+    obj.save()
+    settings.TRACKED_MODEL_FIELD_INDEX = True
+    obj.some_txt = 'egg'
+    obj.save()
+    assert FieldChange.objects.count() == 1
+
+    stdout = io.StringIO()
+    call_command('tracked_model_index_fields', batch_size=1, stdout=stdout)
+    assert 'Indexed 2 revisions' in stdout.getvalue()
+    assert FieldChange.objects.count() == 6
+    assert History.objects.field_changes('some_num').count() == 2
+
+
+@pytest.mark.parametrize('command, options', [
+    ('tracked_model_archive', {'days': 5}),
+    ('tracked_model_checkpoint', {'revisions': 2}),
+    ('tracked_model_export', {}),
+    ('tracked_model_index_fields', {}),
+])
+def test_invalid_model(command, options):
+    """Test commands reject ``--model`` that isn't app_label.ModelName"""
+    with pytest.raises(CommandError) as excinfo:
+        call_command(command, model='BasicModel', **options)
+    assert '--model must be app_label.ModelName' in str(excinfo.value)
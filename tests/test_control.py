@@ -4,7 +4,8 @@ import pytest
 
 from tests import models
 
-from tracked_model.defs import ActionType
+from tracked_model import control, serializer
+from tracked_model.defs import ActionType, Field, M2M_CACHE_FIELD
 from tracked_model.models import History
 from tracked_model.control import create_track_token
 
@@ -34,8 +35,8 @@ def test_tracked_model_save_and_delete_and_model_history_with_no_request():
     model.some_num = 5
     model.save()
     assert history().count() == 2
-    raw_history = History.objects.filter(
-        table_name=model._meta.db_table, table_id=model.pk)
+    raw_history = History.objects.for_model(model).filter(
+        table_id=model.pk)
     assert raw_history.count() == 2
     model.delete()
     assert raw_history.count() == 3
@@ -64,8 +65,8 @@ def test_tracked_model_save_and_delete_and_model_history_with_request(
     model.some_num = 5
     model.save(request=request)
     assert history().count() == 2
-    raw_history = History.objects.filter(
-        table_name=model._meta.db_table, table_id=model.pk)
+    raw_history = History.objects.for_model(model).filter(
+        table_id=model.pk)
     assert raw_history.count() == 2
     model.delete(request=request)
     assert raw_history.count() == 3
@@ -96,8 +97,8 @@ def test_tracked_model_save_and_delete_and_model_history_with_token(
     model.some_num = 5
     model.save(track_token=token)
     assert model.tracked_model_history().count() == 2
-    raw_history = History.objects.filter(
-        table_name=model._meta.db_table, table_id=model.pk)
+    raw_history = History.objects.for_model(model).filter(
+        table_id=model.pk)
     assert raw_history.count() == 2
     model.delete(track_token=token)
     assert raw_history.count() == 3
@@ -106,3 +107,388 @@ def test_tracked_model_save_and_delete_and_model_history_with_token(
     assert not History.objects.filter(revision_author__isnull=True).exists()
 
     assert raw_history.filter(revision_author=admin_user).count() == 3
+
+
+def test_lazy_snapshot_on_load(settings, django_assert_num_queries):
+    """Test loading tracked models in lazy mode runs no extra queries"""
+    settings.TRACKED_MODEL_LAZY_SNAPSHOT = True
+    basic = models.BasicModel.objects.create(some_num=3, some_txt='lol')
+    for _ in range(3):
+        models.M2MModel.objects.create().bunch.add(basic)
+
+    with django_assert_num_queries(1):
+        objs = list(models.M2MModel.objects.all())
+
+    assert all(x._tracked_model_state is None for x in objs)
+    assert all(x._tracked_model_initial_values for x in objs)
+
+
+def test_lazy_snapshot_tracks_changes(settings):
+    """Test changes are tracked in lazy mode"""
+    settings.TRACKED_MODEL_LAZY_SNAPSHOT = True
+    models.BasicModel.objects.create(some_num=3, some_txt='lol')
+    model = models.BasicModel.objects.get()
+    assert model._tracked_model_diff() is None
+    model.some_txt = 'wut'
+    model.save()
+    history = model.tracked_model_history()
+    assert history.count() == 2
+    assert history.latest().action_type == ActionType.UPDATE
+    assert history.latest().materialize().some_txt == 'wut'
+    model.some_num = 5
+    assert set(model._tracked_model_diff()) == {'some_num'}
+
+
+@pytest.mark.parametrize('lazy', [False, True])
+def test_snapshot_deferred_fields(settings, lazy):
+    """Test deferred fields are left out of initial state"""
+    settings.TRACKED_MODEL_LAZY_SNAPSHOT = lazy
+    models.BasicModel.objects.create(some_num=3, some_txt='lol')
+    model = models.BasicModel.objects.only('some_num').get()
+    model.some_num = 5
+    model.save()
+    history = model.tracked_model_history()
+    assert history.count() == 2
+    change_log = serializer.load_change_log(history.latest().change_log)
+    assert set(change_log) == {'some_num'}
+    assert history.latest().materialize().some_txt == 'lol'
+
+    # Assigned deferred field is compared with its stored value
+    model = models.BasicModel.objects.defer('some_txt').get()
+    model.some_txt = 'wut'
+    model.save()
+    assert history.count() == 3
+    change_log = serializer.load_change_log(history.latest().change_log)
+    assert change_log['some_txt'][Field.OLD] == 'lol'
+    assert history.latest().materialize().some_txt == 'wut'
+
+
+def test_dirty_tracked_model_diff():
+    """Test ``DirtyTrackedModelMixin`` compares only assigned fields"""
+    basic = models.BasicModel.objects.create(some_num=3, some_txt='lol')
+    model = models.DirtyModel.objects.create(some_num=1, some_txt='spam')
+    assert model._tracked_model_dirty == set()
+    assert model._tracked_model_diff() is None
+
+    model.__dict__['some_txt'] = 'not assigned'
+    model.some_num = 2
+    model.basic = basic
+    diff = model._tracked_model_diff()
+    assert set(diff) == {'some_num', 'basic'}
+    assert diff['basic']['new'] == basic.pk
+
+    model.save()
+    assert model.tracked_model_history().latest().materialize().some_num == 2
+    assert model._tracked_model_dirty == set()
+    assert model._tracked_model_diff() is None
+    state = model._tracked_model_initial_state
+    assert state['some_num']['value'] == 2
+    assert state['basic']['value'] == basic.pk
+    assert 'new' not in state['some_num']
+
+    model.bunch.add(basic)
+    assert model._tracked_model_diff() is None
+    history = model.tracked_model_history()
+    assert history.count() == 3
+
+
+def test_m2m_changes(rf, admin_user):
+    """Test m2m changes store only added and removed pks"""
+    request = rf.get('/')
+    request.user = admin_user
+    basics = [
+        models.BasicModel.objects.create(some_num=x, some_txt='lol')
+        for x in range(3)
+    ]
+    model = models.M2MModel()
+    model.save(request=request)
+    history = model.tracked_model_history().order_by('pk')
+
+    model.bunch.add(*basics)
+    model.bunch.remove(basics[0])
+    model.bunch.add(basics[1])
+    assert history.count() == 3
+    basics[0].m2mmodel_set.add(model)
+    changes = [x.get_change_log()['bunch'] for x in history[1:]]
+    assert changes == [
+        {'type': 'm2m', 'rel': changes[0]['rel'],
+         'added': [x.pk for x in basics]},
+        {'type': 'm2m', 'rel': changes[0]['rel'], 'removed': [basics[0].pk]},
+        {'type': 'm2m', 'rel': changes[0]['rel'], 'added': [basics[0].pk]},
+    ]
+    assert history.filter(revision_author=admin_user).count() == 3
+    assert history.last().revision_author is None
+
+    model.bunch.clear()
+    assert history.last().get_change_log()['bunch']['removed'] == sorted(
+        x.pk for x in basics)
+    assert getattr(history.last().materialize(), M2M_CACHE_FIELD) == {
+        'bunch': []}
+    assert getattr(history[2].materialize(), M2M_CACHE_FIELD) == {
+        'bunch': [basics[1].pk, basics[2].pk]}
+
+
+def test_tracked_meta(settings):
+    """Test ``TrackedMeta`` limits tracked fields and ignored changes"""
+    settings.TRACKED_MODEL_LAZY_SNAPSHOT = True
+    basic = models.BasicModel.objects.create(some_num=1, some_txt='lol')
+    obj = models.ConfiguredModel.objects.create(title='spam', data=b'x')
+    history = obj.tracked_model_history()
+    change_log = serializer.load_change_log(history.get().change_log)
+    assert sorted(change_log) == ['hits', 'id', 'title']
+
+    obj = models.ConfiguredModel.objects.get(pk=obj.pk)
+    obj.hits = 1
+    obj.data = b'y'
+    obj.save()
+    obj.tags.add(basic)
+    models.ConfiguredModel.objects.update(hits=2)
+    models.ConfiguredModel.objects.update(data=b'z')
+    assert history.count() == 1
+
+    obj = models.ConfiguredModel.objects.get(pk=obj.pk)
+    obj.title = 'egg'
+    obj.hits = 3
+    obj.save()
+    change_log = serializer.load_change_log(history.latest().change_log)
+    assert sorted(change_log) == ['hits', 'title']
+    assert change_log['hits']['old'] == 2
+
+    restored = history.latest().materialize()
+    assert (restored.title, restored.hits) == ('egg', 3)
+    assert restored.data is None
+
+    obj.delete()
+    state = serializer.load_change_log(history.latest().change_log)
+    assert sorted(state) == ['hits', 'id', 'tags', 'title']
+
+
+def test_tracked_meta_unknown_field():
+    """Test ``TrackedMeta`` referring to unknown field is rejected"""
+    from django.core.exceptions import ImproperlyConfigured
+
+    class TrackedMeta:
+        """Invalid configuration"""
+        exclude = ('spam',)
+
+    models.BasicModel.TrackedMeta = TrackedMeta
+    serializer.clear_plans()
+    try:
+        with pytest.raises(ImproperlyConfigured):
+            serializer.get_plan(models.BasicModel)
+    finally:
+        del models.BasicModel.TrackedMeta
+        serializer.clear_plans()
+
+
+@pytest.mark.parametrize('lazy', [False, True])
+def test_save_update_fields(settings, django_assert_num_queries, lazy):
+    """Test ``save`` compares only ``update_fields``"""
+    settings.TRACKED_MODEL_LAZY_SNAPSHOT = lazy
+    obj = models.ConfiguredModel.objects.create(title='spam')
+    obj = models.ConfiguredModel.objects.get(pk=obj.pk)
+    history = obj.tracked_model_history()
+
+    obj.data = b'x'
+    with django_assert_num_queries(1):
+        obj.save(update_fields=['data', 'updated'])
+
+    obj.title = 'egg'
+    obj.hits = 1
+    obj.save(update_fields=['title'])
+    change_log = serializer.load_change_log(history.latest().change_log)
+    assert list(change_log) == ['title']
+    obj.save(update_fields=['title'])
+    assert history.count() == 2
+
+    obj.title = 'ham'
+    obj.save()
+    change_log = serializer.load_change_log(history.latest().change_log)
+    assert sorted(change_log) == ['hits', 'title']
+    assert change_log['title']['old'] == 'egg'
+
+
+def test_dirty_save_update_fields():
+    """Test ``DirtyTrackedModelMixin.save`` keeps fields not updated"""
+    obj = models.DirtyModel.objects.create(some_num=1, some_txt='lol')
+    obj.some_num = 2
+    obj.some_txt = 'wut'
+    obj.save(update_fields=['some_num'])
+    assert obj._tracked_model_dirty == {'some_txt'}
+    obj.save()
+    change_log = serializer.load_change_log(
+        obj.tracked_model_history().latest().change_log)
+    assert list(change_log) == ['some_txt']
+
+
+def test_prefetch_history(admin_user, rf, django_assert_num_queries):
+    """Test ``prefetch_history`` loads history with single query"""
+    from django.utils import timezone
+    request = rf.get('/')
+    request.user = admin_user
+    objs = [models.BasicModel.objects.create(some_num=x, some_txt='lol')
+            for x in range(4)]
+    objs[1].some_num = 10
+    objs[1].save(request=request)
+    objs[2].delete()
+
+    queryset = models.BasicModel.objects.order_by('pk').prefetch_history()
+    with django_assert_num_queries(2):
+        loaded = list(queryset)
+        revisions = [x.tracked_model_revisions() for x in loaded]
+    assert [len(x) for x in revisions] == [1, 2, 1]
+    assert revisions[1][-1].revision_author_id == admin_user.pk
+
+    history = History.objects.select_related('revision_author')
+    queryset = queryset.filter(pk__lte=objs[1].pk).prefetch_history(
+        latest_only=True, queryset=history)
+    with django_assert_num_queries(2):
+        latest = [x.tracked_model_latest_revision() for x in queryset]
+        assert latest[1].revision_author == admin_user
+    assert [x.action_type for x in latest] == [
+        ActionType.CREATE, ActionType.UPDATE]
+
+    # Older revision made at the time of other object's latest one
+    created = objs[1].tracked_model_history().earliest().revision_ts
+    objs[0].tracked_model_history().update(revision_ts=created)
+    latest = [x.tracked_model_latest_revision() for x in queryset]
+    assert [x.action_type for x in latest] == [
+        ActionType.CREATE, ActionType.UPDATE]
+
+    # Revisions made at the same time are ordered by pk
+    objs[1].tracked_model_history().update(revision_ts=timezone.now())
+    obj = queryset.get(pk=objs[1].pk)
+    assert obj.tracked_model_latest_revision().action_type == (
+        ActionType.UPDATE)
+    obj.some_num = 11
+    obj.save()
+    assert len(obj.tracked_model_revisions()) == 3
+
+
+def test_tracked_queryset_bulk_create(django_assert_num_queries):
+    """Test ``TrackedQuerySet.bulk_create`` stores history in bulk"""
+    objs = [models.BasicModel(pk=x, some_num=x, some_txt='lol')
+            for x in range(1, 11)]
+    objs.append(models.BasicModel(some_num=0, some_txt='no pk'))
+    # savepoint, 2 inserts (with and without pk), history insert, release
+    with django_assert_num_queries(5):
+        models.BasicModel.objects.bulk_create(objs)
+
+    assert models.BasicModel.objects.count() == 11
+    history = History.objects.filter(action_type=ActionType.CREATE)
+    assert history.count() == 11
+    assert objs[0]._tracked_model_diff() is None
+    assert history.get(table_id=3).materialize().some_num == 3
+    assert objs[-1].pk is not None
+    no_pk = objs[-1].tracked_model_history().get()
+    assert no_pk.materialize().some_txt == 'no pk'
+
+
+def test_tracked_queryset_update(rf, admin_user, django_assert_num_queries):
+    """Test ``TrackedQuerySet.update`` stores history in bulk"""
+    from django.db.models import F
+    request = rf.get('/')
+    request.user = admin_user
+    for num in range(5):
+        models.BasicModel.objects.create(some_num=num, some_txt='lol')
+    history = History.objects.filter(action_type=ActionType.UPDATE)
+
+    queryset = models.BasicModel.objects.filter(some_num__gte=2)
+    # savepoint, select, update, history insert, release
+    with django_assert_num_queries(5):
+        assert queryset.update(some_txt='wut') == 3
+    assert history.count() == 3
+    changed = {int(x.table_id) for x in history.all()}
+    assert changed == set(queryset.values_list('pk', flat=True))
+
+    queryset = models.BasicModel.objects.all()
+    assert queryset.update(some_txt='wut', request=request) == 5
+    assert history.count() == 5
+    assert history.filter(revision_author=admin_user).count() == 2
+
+    models.BasicModel.objects.update(some_num=F('some_num') + 10)
+    assert history.count() == 10
+    latest = models.BasicModel.objects.get(some_num=14)
+    assert latest.tracked_model_history().latest().materialize().some_num == 14
+
+
+def test_tracked_queryset_update_chunks(monkeypatch,
+                                        django_assert_num_queries):
+    """Test ``TrackedQuerySet.update`` updates objects in chunks"""
+    from django.db.models import F
+    monkeypatch.setattr(control, 'BULK_BATCH_SIZE', 2)
+    objs = [models.BasicModel.objects.create(some_num=num, some_txt='lol')
+            for num in range(5)]
+    queryset = models.BasicModel.objects.filter(some_num__lt=10)
+    # savepoint, 3 chunks of (select, update, refetch, history), release
+    with django_assert_num_queries(14):
+        assert queryset.update(some_num=F('some_num') + 10) == 5
+    assert queryset.count() == 0
+    history = History.objects.filter(action_type=ActionType.UPDATE)
+    assert history.count() == 5
+    for obj in objs:
+        latest = obj.tracked_model_history().latest()
+        assert latest.materialize().some_num == obj.some_num + 10
+
+
+def test_tracked_queryset_update_field_request(rf, admin_user):
+    """Test ``TrackedQuerySet.update`` keyword named like model field
+    updates the field
+    """
+    request = rf.get('/')
+    request.user = admin_user
+    obj = models.RequestModel.objects.create(request='old')
+    assert models.RequestModel.objects.update(request='new') == 1
+    latest = obj.tracked_model_history().latest()
+    assert latest.revision_author is None
+    assert latest.materialize().request == 'new'
+
+    models.BasicModel.objects.create(some_num=1, some_txt='lol')
+    models.BasicModel.objects.update(some_num=2, request=request)
+    latest = History.objects.latest()
+    assert latest.revision_author == admin_user
+
+
+def test_tracked_queryset_delete():
+    """Test ``TrackedQuerySet.delete`` stores history in bulk"""
+    basic = models.BasicModel.objects.create(some_num=1, some_txt='lol')
+    for _ in range(3):
+        models.M2MModel.objects.create().bunch.add(basic)
+
+    models.M2MModel.objects.all().delete()
+    assert models.M2MModel.objects.count() == 0
+    history = History.objects.filter(action_type=ActionType.DELETE)
+    assert history.count() == 3
+    for hist in history:
+        change_log = serializer.load_change_log(hist.change_log)
+        assert change_log['created']['value'] is not None
+        assert change_log['bunch']['value'] == [basic.pk]
+
+
+def test_tracked_queryset_delete_chunks(monkeypatch):
+    """Test ``TrackedQuerySet.delete`` deletes objects in chunks"""
+    monkeypatch.setattr(control, 'BULK_BATCH_SIZE', 2)
+    dump_m2m_many = serializer.dump_m2m_many
+    chunks = []
+
+    def dump_chunk(model, pks):
+        chunks.append(len(pks))
+        return dump_m2m_many(model, pks)
+
+    monkeypatch.setattr(serializer, 'dump_m2m_many', dump_chunk)
+    basic = models.BasicModel.objects.create(some_num=1, some_txt='lol')
+    for _ in range(5):
+        models.M2MModel.objects.create().bunch.add(basic)
+
+    result = models.M2MModel.objects.all().delete()
+    assert chunks == [2, 2, 1]
+    if result is not None:
+        assert result[0] == 10
+        assert result[1]['tests.M2MModel'] == 5
+    assert models.M2MModel.objects.count() == 0
+    history = History.objects.filter(action_type=ActionType.DELETE)
+    assert history.count() == 5
+    for hist in history:
+        change_log = serializer.load_change_log(hist.change_log)
+        assert change_log['bunch']['value'] == [basic.pk]
+    assert models.M2MModel.objects.all().delete() in (None, (0, {}))
@@ -0,0 +1,29 @@
+"""Tests for tracked_model.fields"""
+import pytest
+
+from tracked_model.defs import ActionType
+from tracked_model.fields import ActionTypeField
+from tracked_model.models import History
+
+from tests.models import BasicModel
+
+pytestmark = pytest.mark.django_db
+
+
+def test_action_type_field_conversion():
+    """Tests ``ActionTypeField`` stores codes and returns names"""
+    field = ActionTypeField()
+    for name, code in ActionType.CODES.items():
+        assert field.get_prep_value(name) == code
+        assert field.to_python(code) == name
+        assert field.to_python(name) == name
+    assert field.get_prep_value(None) is None
+
+
+def test_action_type_field_storage():
+    """Tests action types are stored as small integers"""
+    obj = BasicModel.objects.create(some_num=1, some_txt='a')
+    obj.delete()
+    codes = History.objects.values_list('action_type', flat=True)
+    assert sorted(codes) == [ActionType.CREATE, ActionType.DELETE]
+    assert History.objects.filter(action_type=ActionType.DELETE).count() == 1
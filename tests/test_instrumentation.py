@@ -0,0 +1,103 @@
+"""Test for ``instrumentation`` module"""
+import pytest
+
+from tests import models
+
+from tracked_model import instrumentation
+from tracked_model.defs import Operation
+
+
+pytestmark = pytest.mark.django_db
+
+
+@pytest.fixture
+def reports():
+    """Returns list of ``operation_measured`` reports"""
+    received = []
+
+    def receiver(sender, **kwargs):
+        """Collects reports"""
+        kwargs['sender'] = sender
+        received.append(kwargs)
+
+    instrumentation.operation_measured.connect(receiver)
+    yield received
+    instrumentation.operation_measured.disconnect(receiver)
+
+
+def test_disabled(reports):
+    """Test nothing is reported without ``TRACKED_MODEL_INSTRUMENT``"""
+    obj = models.BasicModel.objects.create(some_num=1, some_txt='spam')
+    obj.tracked_model_history().get().materialize()
+    assert reports == []
+    assert instrumentation.measure(Operation.DIFF, obj).active is False
+
+
+def test_operations_reported(rf, settings, reports):
+    """Test tracking operations are reported and aggregated"""
+    settings.TRACKED_MODEL_INSTRUMENT = True
+    instrumentation.aggregator.reset()
+    from django.contrib.auth.models import AnonymousUser
+    request = rf.get('/')
+    request.user = AnonymousUser()
+
+    obj = models.BasicModel.objects.create(some_num=1, some_txt='spam')
+    obj.some_num = 2
+    obj.save(request=request)
+    obj.tracked_model_history().latest().materialize()
+
+    operations = {x['operation'] for x in reports}
+    assert operations == {
+        Operation.SNAPSHOT, Operation.DIFF, Operation.SERIALIZE,
+        Operation.HISTORY_INSERT, Operation.REQUEST_INFO_INSERT,
+        Operation.MATERIALIZE}
+    diff = [x for x in reports if x['operation'] == Operation.DIFF][-1]
+    assert diff['sender'] is models.BasicModel
+    assert diff['fields'] == ['some_num']
+    inserts = [x for x in reports
+               if x['operation'] == Operation.HISTORY_INSERT]
+    assert [x['queries'] for x in inserts] == [1, 1]
+    assert inserts[0]['rows'] == 1
+    assert inserts[0]['size'] > 0
+
+    stats = instrumentation.aggregator.get_stats()
+    model_stats = stats['operations']['tests.BasicModel']
+    assert model_stats[Operation.HISTORY_INSERT]['count'] == 2
+    assert model_stats[Operation.HISTORY_INSERT]['queries'] == 2
+    assert sum(model_stats[Operation.SERIALIZE]['size_histogram']) == 2
+    assert stats['operations']['*'][Operation.REQUEST_INFO_INSERT][
+        'rows'] == 1
+    assert stats['fields'] == {'tests.BasicModel': {'some_num': 1}}
+
+
+def test_queries_counted_with_full_log(settings, reports):
+    """Test queries are counted when debug log of connection is full"""
+    from django.db import connection
+    settings.TRACKED_MODEL_INSTRUMENT = True
+    log = connection.queries_log
+    log.extend([{'sql': 'SELECT 1', 'time': '0.000'}] * log.maxlen)
+    try:
+        models.BasicModel.objects.create(some_num=1, some_txt='spam')
+    finally:
+        log.clear()
+    inserts = [x for x in reports
+               if x['operation'] == Operation.HISTORY_INSERT]
+    assert [x['queries'] for x in inserts] == [1]
+    assert connection.force_debug_cursor is False
+
+
+def test_aggregator():
+    """Test ``Aggregator`` histograms"""
+    aggregator = instrumentation.Aggregator()
+    aggregator.record(None, Operation.SERIALIZE, 0.002, size=100)
+    aggregator.record(None, Operation.SERIALIZE, 5.0, size=10 ** 6)
+    stats = aggregator.get_stats()['operations']['*'][Operation.SERIALIZE]
+    assert stats['count'] == 2
+    assert stats['size'] == 10 ** 6 + 100
+    assert stats['duration_histogram'][3] == 1
+    assert stats['duration_histogram'][-1] == 1
+    assert stats['size_histogram'][1] == 1
+    assert stats['size_histogram'][-1] == 1
+
+    aggregator.reset()
+    assert aggregator.get_stats() == {'operations': {}, 'fields': {}}
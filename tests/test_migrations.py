@@ -0,0 +1,44 @@
+"""Tests for ``tracked_model`` migrations"""
+import pytest
+
+from tests.models import BasicModel
+
+from django.db import connection
+from django.db.migrations.executor import MigrationExecutor
+from tracked_model.models import History
+
+
+pytestmark = pytest.mark.django_db(transaction=True)
+
+BEFORE_COMPACT = [('tracked_model', '0003_history_indexes')]
+
+
+def _migrate(targets):
+    """Migrates database to ``targets`` and returns its migration state"""
+    executor = MigrationExecutor(connection)
+    executor.migrate(targets)
+    executor.loader.build_graph()
+    return executor.loader.project_state(targets)
+
+
+def test_compact_history_reversible():
+    """Test compact storage migration converts history both ways"""
+    latest = MigrationExecutor(connection).loader.graph.leaf_nodes()
+    latest = [node for node in latest if node[0] == 'tracked_model']
+    obj = BasicModel.objects.create(some_num=1, some_txt='lol')
+    obj.some_num = 2
+    obj.save()
+    try:
+        state = _migrate(BEFORE_COMPACT)
+        OldHistory = state.apps.get_model('tracked_model', 'History')
+        old = list(OldHistory.objects.order_by('revision_ts'))
+        assert [hist.action_type for hist in old] == ['create', 'update']
+        assert old[0].model_name == 'BasicModel'
+        assert old[0].app_label == 'tests'
+        assert old[0].table_name == 'tests_basicmodel'
+        assert '"some_num"' in old[1].change_log
+    finally:
+        _migrate(latest)
+    history = History.objects.filter(table_name='tests_basicmodel')
+    assert history.count() == 2
+    assert history.latest().materialize().some_num == 2
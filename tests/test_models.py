@@ -1,10 +1,15 @@
 """Test some model methods"""
+import datetime
+
 import pytest
+from django.core.exceptions import FieldError
 
-from tracked_model.defs import REQUEST_CACHE_FIELD
-from tracked_model.models import RequestInfo, History
+from tracked_model import serializer
+from tracked_model.defs import REQUEST_CACHE_FIELD, M2M_CACHE_FIELD
+from tracked_model.models import (
+    RequestInfo, History, HistorySchema, UserAgent, UserHost, FieldChange)
 
-from tests.models import BasicModel
+from tests.models import BasicModel, M2MModel, FKModel
 
 
 pytestmark = pytest.mark.django_db
@@ -46,6 +51,41 @@ def test_request_info_cached(rf):
     assert req_info3 == req_info4
 
 
+def test_request_info_interned(rf, settings):
+    """Tests repeated ``RequestInfo`` values are stored once"""
+    settings.TRACKED_MODEL_INTERN_REQUEST_INFO = True
+    agent = 'Mozilla/5.0 ' * 20
+    infos = [
+        RequestInfo.create_or_get_from_request(
+            rf.get('/', HTTP_USER_AGENT=agent, REMOTE_HOST='example.com'))
+        for _ in range(3)
+    ]
+    assert UserAgent.objects.get().value == agent
+    assert UserHost.objects.get().value == 'example.com'
+    for info in RequestInfo.objects.filter(pk__in=[x.pk for x in infos]):
+        assert info.user_agent is None
+        assert info.get_user_agent() == agent
+        assert info.get_user_host() == 'example.com'
+
+
+def test_request_info_deferred(rf, admin_user, settings):
+    """Tests deferred ``RequestInfo`` is stored together with history"""
+    settings.TRACKED_MODEL_DEFER_REQUEST_INFO = True
+    request = rf.get('/')
+    request.user = admin_user
+    obj = BasicModel.objects.create(some_num=1, some_txt='lol')
+    obj.save(request=request)
+    assert RequestInfo.objects.count() == 0
+    obj.some_num = 2
+    obj.save(request=request)
+    obj.some_num = 3
+    obj.save(request=request)
+    info = RequestInfo.objects.get()
+    history = obj.tracked_model_history().filter(revision_request=info)
+    assert history.count() == 2
+    assert getattr(request, REQUEST_CACHE_FIELD) == info
+
+
 def test_materialize():
     """Tests ``History.materialize`` can restore object"""
     txt1 = 'spam'
@@ -69,8 +109,8 @@ def test_materialize():
     assert hist1.materialize().some_txt == txt1
 
     obj.delete()
-    hist4 = History.objects.filter(
-        model_name='BasicModel', table_id=obj_pk).latest()
+    hist4 = History.objects.for_model(BasicModel).filter(
+        table_id=obj_pk).latest()
 
     assert hist4.materialize().some_txt == txt3
     with pytest.raises(BasicModel.DoesNotExist):
@@ -80,3 +120,268 @@ def test_materialize():
     hist1.materialize().save()
     assert BasicModel.objects.count() == 1
     assert BasicModel.objects.first().some_txt == txt1
+
+
+def test_materialize_from_checkpoint(settings):
+    """Tests ``History.materialize`` starts from latest checkpoint"""
+    settings.TRACKED_MODEL_CHECKPOINT_REVISIONS = 3
+    obj = BasicModel.objects.create(some_num=0, some_txt='spam')
+    for num in range(1, 8):
+        obj.some_num = num
+        obj.save()
+
+    history = obj.tracked_model_history()
+    snapshots = history.exclude(snapshot=None)
+    assert list(snapshots.values_list('pk', flat=True)) == [
+        history[3].pk, history[6].pk]
+
+    # Rows before the checkpoint are not needed anymore
+    history.filter(pk__lt=history[6].pk).update(change_log=b'broken')
+    assert history.latest().materialize().some_num == 7
+    assert history[6].materialize().some_num == 6
+
+    obj = BasicModel.objects.get(pk=obj.pk)
+    obj.some_num = 8
+    obj.save()
+    obj.some_num = 9
+    obj.save()
+    assert history.exclude(snapshot=None).count() == 3
+
+
+def test_materialize_m2m():
+    """Tests ``History.materialize`` restores m2m values"""
+    basic = BasicModel.objects.create(some_num=42, some_txt='Cheese')
+    obj = M2MModel.objects.create()
+    obj.bunch.add(basic)
+    obj.save()
+    obj.delete()
+    materialized = History.objects.for_model(
+        obj).latest().materialize()
+    assert getattr(materialized, M2M_CACHE_FIELD) == {'bunch': [basic.pk]}
+
+
+def test_history_as_of(settings):
+    """Tests ``History.objects.as_of`` restores many objects at once"""
+    settings.TRACKED_MODEL_CHECKPOINT_REVISIONS = 2
+    objs = [BasicModel.objects.create(some_num=x, some_txt='spam')
+            for x in range(3)]
+    for obj in objs:
+        for _ in range(3):
+            obj.some_num += 10
+            obj.save()
+    timestamp = History.objects.latest().revision_ts
+    pks = [x.pk for x in objs]
+    # Rows before the latest checkpoint aren't read, reading unknown
+    # action type would fail
+    for obj in objs:
+        rows = list(obj.tracked_model_history())
+        checkpoint = max(
+            index for index, hist in enumerate(rows)
+            if hist.snapshot is not None)
+        assert checkpoint > 0
+        History.objects.filter(
+            pk__in=[x.pk for x in rows[:checkpoint]]).update(action_type=9)
+    objs[0].some_txt = 'ham'
+    objs[0].save()
+    objs[1].delete()
+    new = BasicModel.objects.create(some_num=42, some_txt='egg')
+
+    restored = History.objects.as_of(
+        BasicModel, pks + [new.pk, 1000], timestamp)
+    assert set(restored) == set(pks)
+    assert [restored[x].some_num for x in pks] == [30, 31, 32]
+    assert restored[pks[0]].some_txt == 'spam'
+    assert restored[pks[0]].pk == pks[0]
+
+    timestamp = new.tracked_model_history().get().revision_ts
+    restored = History.objects.as_of(BasicModel, pks + [new.pk], timestamp)
+    assert set(restored) == {pks[0], pks[2], new.pk}
+    assert restored[pks[0]].some_txt == 'ham'
+
+
+def test_materialize_mixed_codecs(settings):
+    """Tests ``materialize`` replays rows stored with different codecs"""
+    obj = BasicModel.objects.create(some_num=1, some_txt='json')
+    settings.TRACKED_MODEL_CODEC = 'compact'
+    settings.TRACKED_MODEL_COMPRESS_MIN_BYTES = 0
+    obj.some_txt = 'compact'
+    obj.save()
+    obj.some_num = 2
+    obj.save()
+    hist = obj.tracked_model_history().latest()
+    assert serializer.load_change_log(hist.change_log) == {
+        'some_num': {'old': 1, 'new': 2}}
+    materialized = hist.materialize()
+    assert (materialized.some_num, materialized.some_txt) == (2, 'compact')
+
+
+def test_history_compat_lookups():
+    """Test ``History`` lookups of columns removed by compact storage"""
+    basic = BasicModel.objects.create(some_num=1, some_txt='lol')
+    fk_model = FKModel.objects.create(some_ip='127.0.0.1', basic=basic)
+    history = History.objects.all()
+    assert list(history.filter(table_name='tests_basicmodel')) == list(
+        basic.tracked_model_history())
+    assert history.filter(model_name='FKModel').get().table_id == str(
+        fk_model.pk)
+    assert history.filter(
+        app_label='tests',
+        model_name__in=['BasicModel', 'FKModel']).count() == 2
+    assert history.filter(app_label='tests', model_name='Missing').count() == 0
+    assert history.exclude(model_name='BasicModel').get().table_id == str(
+        fk_model.pk)
+    with pytest.raises(FieldError):
+        history.filter(model_name__startswith='Basic')
+
+
+def test_history_schema():
+    """Tests relation metadata is stored once in ``HistorySchema``"""
+    basic = BasicModel.objects.create(some_num=1, some_txt='lol')
+    obj = FKModel.objects.create(some_ip='127.0.0.1', basic=basic)
+    obj.basic = BasicModel.objects.create(some_num=2, some_txt='wut')
+    obj.save()
+    hist = obj.tracked_model_history().latest()
+    assert serializer.load_change_log(hist.change_log) == {
+        'basic': {'old': basic.pk, 'new': obj.basic.pk}}
+    change_log = hist.get_change_log()
+    assert change_log['basic']['type'] == 'rel'
+    assert change_log['basic']['rel']['model'] == 'BasicModel'
+    assert hist.get_snapshot() is None
+    assert hist.materialize().basic == obj.basic
+    schemas = HistorySchema.objects.filter(pk=hist.schema_id)
+    assert schemas.get().content_type.model_class() is FKModel
+    assert obj.tracked_model_history().exclude(schema=hist.schema).count() == 0
+
+
+def test_history_schema_cached_after_commit():
+    """Tests schema created inside transaction is not cached"""
+    HistorySchema.objects.all().delete()
+    HistorySchema.objects.clear_cache([FKModel])
+    schema_id = HistorySchema.objects.get_for_model(FKModel)
+    assert HistorySchema.objects._cache.get(FKModel) is None
+    assert HistorySchema.objects.get_for_model(FKModel) == schema_id
+    HistorySchema.objects.clear_cache([FKModel])
+
+
+def test_legacy_history_without_schema():
+    """Tests ``History`` without schema keeps metadata in change log"""
+    obj = BasicModel.objects.create(some_num=1, some_txt='lol')
+    hist = obj.tracked_model_history().get()
+    data = serializer.dump_model(obj)
+    History.objects.filter(pk=hist.pk).update(
+        schema=None, change_log=serializer.to_json(data).encode('utf-8'))
+    hist = History.objects.get(pk=hist.pk)
+    assert hist.get_change_log() == serializer.load_change_log(
+        serializer.to_json(data))
+    assert hist.materialize().some_txt == 'lol'
+
+
+def test_history_stream(django_assert_num_queries):
+    """Tests ``History.objects.stream`` reads history in chunks"""
+    obj = BasicModel.objects.create(some_num=0, some_txt='lol')
+    for num in range(1, 5):
+        obj.some_num = num
+        obj.save()
+    history = obj.tracked_model_history()
+    history.update(revision_ts=history.first().revision_ts)
+    pks = list(history.order_by('pk').values_list('pk', flat=True))
+
+    # 3 chunks and content type lookup
+    with django_assert_num_queries(4):
+        records = list(history.stream(chunk_size=2))
+    assert [x['id'] for x in records] == pks
+    assert records[0]['action_type'] == 'create'
+    assert records[0]['model'] == 'basicmodel'
+    assert records[-1]['change_log']['some_num'] == {
+        'type': 'val', 'old': 3, 'new': 4}
+
+
+def test_history_field_changes(admin_user, rf, settings):
+    """Test ``field_changes`` finds history by indexed changed fields"""
+    from django.utils import timezone
+    settings.TRACKED_MODEL_FIELD_INDEX = True
+    request = rf.get('/')
+    request.user = admin_user
+    obj = BasicModel.objects.create(some_num=1, some_txt='spam')
+    obj.some_num = 2
+    obj.save(request=request)
+    obj.some_txt = 'egg'
+    obj.save()
+    FKModel.objects.create(some_ip='127.0.0.1', basic=obj)
+    BasicModel.objects.filter(pk=obj.pk).update(some_num=3, request=request)
+
+    assert FieldChange.objects.filter(action_type='create').count() == 7
+    changes = History.objects.field_changes('some_num', model=BasicModel)
+    assert changes.count() == 3
+    by_admin = History.objects.field_changes('some_num', author=admin_user)
+    assert by_admin.count() == 2
+    assert {x.revision_author for x in by_admin} == {admin_user}
+    assert History.objects.field_changes('some_ip').count() == 1
+    since = timezone.now() - datetime.timedelta(hours=1)
+    assert History.objects.field_changes(
+        'some_txt', since=since, until=timezone.now()).count() == 2
+    assert not History.objects.field_changes(
+        'some_txt', until=since).exists()
+
+    obj.delete()
+    assert History.objects.field_changes(
+        'some_date', model=BasicModel).count() == 2
+
+
+def test_history_diff(django_assert_num_queries):
+    """Tests ``History.diff`` composes changes between revisions"""
+    obj = BasicModel.objects.create(some_num=1, some_txt='spam')
+    obj.some_num = 2
+    obj.save()
+    obj.some_txt = 'ham'
+    obj.save()
+    obj.some_num = 1
+    obj.save()
+    history = obj.tracked_model_history()
+    history.update(revision_ts=history.first().revision_ts)
+    hists = list(history.order_by('pk'))
+
+    hists[0].diff(hists[1])
+    with django_assert_num_queries(1):
+        changes = hists[0].diff(hists[3])
+    assert changes == {
+        'some_txt': {'type': 'val', 'old': 'spam', 'new': 'ham'}}
+    assert hists[3].diff(hists[0]) == {
+        'some_txt': {'type': 'val', 'old': 'ham', 'new': 'spam'}}
+    assert hists[2].diff(hists[3]) == {
+        'some_num': {'type': 'val', 'old': 2, 'new': 1}}
+    assert hists[2].diff(hists[2]) == {}
+
+    obj.delete()
+    deletion = history.latest()
+    assert hists[1].diff(deletion) is None
+    assert deletion.diff(hists[1]) is None
+    other = BasicModel.objects.create(some_num=1, some_txt='spam')
+    with pytest.raises(ValueError):
+        hists[0].diff(other.tracked_model_history().get())
+
+
+def test_history_queryset_diff():
+    """Tests ``History.objects.diff`` composes changes between times"""
+    obj = BasicModel.objects.create(some_num=1, some_txt='spam')
+    created = obj.tracked_model_history().get().revision_ts
+    other = BasicModel.objects.create(some_num=1, some_txt='spam')
+    obj.some_num = 2
+    obj.save()
+    updated = obj.tracked_model_history().latest().revision_ts
+    obj.some_txt = 'ham'
+    obj.save()
+
+    history = obj.tracked_model_history()
+    assert history.diff(created) == {
+        'some_num': {'type': 'val', 'old': 1, 'new': 2},
+        'some_txt': {'type': 'val', 'old': 'spam', 'new': 'ham'}}
+    assert history.diff(created, updated) == {
+        'some_num': {'type': 'val', 'old': 1, 'new': 2}}
+    assert history.diff(updated, updated) == {}
+    assert history.diff(created - datetime.timedelta(days=1)) is None
+
+    other.some_num = 2
+    other.save()
+    with pytest.raises(ValueError):
+        History.objects.for_model(BasicModel).diff(created)
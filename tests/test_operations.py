@@ -0,0 +1,55 @@
+"""Test for ``operations`` module"""
+import pytest
+from django.db import connection
+from django.db.migrations.loader import MigrationLoader
+
+# Imported for its side effect only: configures settings
+from tests import models  # noqa pylint: disable=unused-import
+
+from tracked_model.models import History
+from tracked_model.operations import AddHistoryIndex, PartitionHistory
+
+
+pytestmark = pytest.mark.django_db
+
+
+def _history_indexes():
+    """Returns names of indexes on ``History`` table"""
+    with connection.cursor() as cursor:
+        constraints = connection.introspection.get_constraints(
+            cursor, History._meta.db_table)
+    return {name for name, info in constraints.items() if info['index']}
+
+
+def test_add_history_index():
+    """Test ``AddHistoryIndex`` creates and drops index"""
+    operation = AddHistoryIndex(
+        'history_author_ts', ['revision_author', 'revision_ts'])
+    state = MigrationLoader(connection).project_state()
+    assert 'history_author_ts' not in _history_indexes()
+
+    with connection.schema_editor() as editor:
+        operation.database_forwards('tests', editor, state, state)
+    assert 'history_author_ts' in _history_indexes()
+
+    with connection.schema_editor() as editor:
+        operation.database_backwards('tests', editor, state, state)
+    assert 'history_author_ts' not in _history_indexes()
+
+    name, args, kwargs = operation.deconstruct()
+    assert name == 'AddHistoryIndex'
+    assert AddHistoryIndex(*args, **kwargs).fields == operation.fields
+
+
+def test_partition_history_noop():
+    """Test ``PartitionHistory`` does nothing without PostgreSQL"""
+    operation = PartitionHistory(months_ahead=2)
+    state = MigrationLoader(connection).project_state()
+    indexes = _history_indexes()
+    with connection.schema_editor() as editor:
+        operation.database_forwards('tests', editor, state, state)
+    assert _history_indexes() == indexes
+
+    name, args, kwargs = operation.deconstruct()
+    assert name == 'PartitionHistory'
+    assert PartitionHistory(*args, **kwargs).months_ahead == 2
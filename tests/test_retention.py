@@ -0,0 +1,118 @@
+"""Test for ``retention`` module"""
+import datetime
+import gzip
+import json
+
+import pytest
+from django.utils import timezone
+
+from tests import models
+
+from tracked_model import retention
+from tracked_model.defs import ActionType
+from tracked_model.models import History, ArchivedHistory
+
+
+pytestmark = pytest.mark.django_db
+
+
+def _age(history, days):
+    """Moves ``history`` ``days`` back in time"""
+    for hist in history:
+        History.objects.filter(pk=hist.pk).update(
+            revision_ts=hist.revision_ts - datetime.timedelta(days=days))
+
+
+def test_get_cutoff(settings):
+    """Test ``get_cutoff`` reads ``TRACKED_MODEL_RETENTION``"""
+    settings.TRACKED_MODEL_RETENTION = {'tests.BasicModel': 30}
+    cutoff = retention.get_cutoff(models.BasicModel)
+    expected = timezone.now() - datetime.timedelta(days=30)
+    assert abs(cutoff - expected) < datetime.timedelta(minutes=1)
+    assert retention.get_cutoff(models.FKModel) is None
+
+
+def test_archive():
+    """Test ``archive`` keeps remaining history restorable"""
+    kept = models.BasicModel.objects.create(some_num=0, some_txt='kept')
+    for num in range(1, 4):
+        kept.some_num = num
+        kept.save()
+    idle = models.BasicModel.objects.create(some_num=0, some_txt='idle')
+    idle.some_num = 1
+    idle.save()
+    deleted = models.BasicModel.objects.create(some_num=0, some_txt='gone')
+    deleted_history = History.objects.filter(table_id=str(deleted.pk))
+    deleted.delete()
+    _age(History.objects.all(), 10)
+    kept.some_num = 4
+    kept.save()
+    kept.some_num = 5
+    kept.save()
+
+    cutoff = timezone.now() - datetime.timedelta(days=5)
+    history = History.objects.for_model(models.BasicModel)
+    assert retention.archive(history, cutoff, batch_size=2) == 8
+    assert ArchivedHistory.objects.count() == 8
+    assert not History.objects.filter(revision_ts__lt=cutoff).exists()
+
+    revisions = list(kept.tracked_model_history())
+    assert len(revisions) == 2
+    assert [x.materialize().some_num for x in revisions] == [4, 5]
+    assert revisions[0].snapshot is not None
+
+    checkpoint = idle.tracked_model_history().get()
+    assert checkpoint.action_type == ActionType.UPDATE
+    assert checkpoint.revision_ts == cutoff
+    assert checkpoint.materialize().some_num == 1
+    assert not deleted_history.exists()
+
+    archived = ArchivedHistory.objects.filter(table_id=str(kept.pk))
+    assert archived.count() == 4
+    assert archived.latest().action_type == ActionType.UPDATE
+
+
+def test_archive_to_stream(tmpdir):
+    """Test ``archive`` writes revisions to stream"""
+    obj = models.BasicModel.objects.create(some_num=0, some_txt='spam')
+    obj.some_num = 1
+    obj.save()
+    _age(obj.tracked_model_history(), 10)
+
+    cutoff = timezone.now() - datetime.timedelta(days=5)
+    path = str(tmpdir.join('archive.ndjson.gz'))
+    with gzip.open(path, 'wt') as stream:
+        assert retention.archive(History.objects.all(), cutoff, stream) == 2
+    with gzip.open(path, 'rt') as stream:
+        records = [json.loads(x) for x in stream]
+    assert [x['action_type'] for x in records] == ['create', 'update']
+    assert not ArchivedHistory.objects.exists()
+    assert obj.tracked_model_history().get().materialize().some_num == 1
+
+
+def test_boundaries():
+    """Test ``_boundaries`` tells revisions with snapshot apart
+    without reading snapshots
+    """
+    from django.contrib.contenttypes.models import ContentType
+    from django.db import connection
+    from django.test.utils import CaptureQueriesContext
+    obj = models.BasicModel.objects.create(some_num=0, some_txt='lol')
+    for num in range(1, 4):
+        obj.some_num = num
+        obj.save()
+    revisions = list(obj.tracked_model_history())
+    _age(revisions[:2], 10)
+    History.objects.filter(pk=revisions[2].pk).update(snapshot=b'{}')
+    content_type = ContentType.objects.get_for_model(models.BasicModel)
+    cutoff = timezone.now() - datetime.timedelta(days=5)
+
+    with CaptureQueriesContext(connection) as queries:
+        boundaries = retention._boundaries(
+            content_type.pk, [str(obj.pk)], cutoff, 'default')
+    assert boundaries == {str(obj.pk): (
+        (revisions[1].pk, ActionType.UPDATE, False),
+        (revisions[2].pk, ActionType.UPDATE, True))}
+    sql = queries.captured_queries[0]['sql']
+    assert sql.count('"snapshot"') == 1
+    assert '"snapshot" IS NULL' in sql
@@ -0,0 +1,87 @@
+"""Tests for ``routers`` module"""
+import pytest
+from django.db import transaction
+
+from tests import models
+
+from tracked_model.models import History, HistorySchema, RequestInfo
+from tracked_model.routers import HistoryRouter
+
+
+pytestmark = pytest.mark.django_db(transaction=True)
+
+
+@pytest.fixture
+def audit_database(settings):
+    """Routes tracking models to ``audit`` database"""
+    settings.DATABASE_ROUTERS = ['tracked_model.routers.HistoryRouter']
+    settings.TRACKED_MODEL_DATABASE = 'audit'
+    # Cached schema ids are ids of ``default`` database rows
+    HistorySchema.objects.clear_cache()
+    yield
+    for model in (History, RequestInfo, HistorySchema):
+        model.objects.using('audit').all().delete()
+    HistorySchema.objects.clear_cache()
+
+
+def test_router(settings):
+    """Test ``HistoryRouter`` routes only tracking models"""
+    from django.contrib.contenttypes.models import ContentType
+    router = HistoryRouter()
+    assert router.db_for_write(History) is None
+    assert router.allow_migrate('default', 'tracked_model') is None
+
+    settings.TRACKED_MODEL_DATABASE = 'audit'
+    assert router.db_for_write(History) == 'audit'
+    assert router.db_for_read(RequestInfo) == 'audit'
+    assert router.db_for_write(models.BasicModel) is None
+    settings.TRACKED_MODEL_READ_DATABASE = 'replica'
+    assert router.db_for_read(History) == 'replica'
+    assert router.db_for_write(History) == 'audit'
+
+    hist = History()
+    assert router.db_for_read(ContentType, instance=hist) == 'default'
+    assert router.db_for_read(ContentType) is None
+    assert router.allow_relation(hist, ContentType()) is True
+    assert router.allow_relation(ContentType(), ContentType()) is None
+    assert router.allow_migrate('audit', 'tracked_model') is True
+    assert router.allow_migrate('default', 'tracked_model') is None
+    assert router.allow_migrate('audit', 'tests') is None
+
+
+@pytest.mark.usefixtures('audit_database')
+def test_history_database():
+    """Test history is stored in and read from routed database"""
+    model = models.BasicModel.objects.create(some_num=1, some_txt='lol')
+    model.some_num = 2
+    model.save()
+    assert History.objects.using('default').count() == 0
+    assert History.objects.using('audit').count() == 2
+
+    history = model.tracked_model_history()
+    assert history.db == 'audit'
+    assert history.count() == 2
+    assert history.latest().materialize().some_num == 2
+    assert history.latest().revision_author is None
+
+
+@pytest.mark.skipif(not hasattr(transaction, 'on_commit'),
+                    reason='transaction.on_commit is not supported')
+@pytest.mark.usefixtures('audit_database')
+def test_history_database_on_commit():
+    """Test history of transaction is stored in routed database
+    once transaction commits
+    """
+    with transaction.atomic():
+        model = models.BasicModel.objects.create(some_num=1, some_txt='lol')
+        model.some_num = 2
+        model.save()
+        assert History.objects.using('audit').count() == 0
+    assert History.objects.using('audit').count() == 2
+
+    with pytest.raises(ValueError):
+        with transaction.atomic():
+            model.some_num = 3
+            model.save()
+            raise ValueError
+    assert History.objects.using('audit').count() == 2
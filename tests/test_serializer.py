@@ -61,3 +61,125 @@ def test_to_json():
     deserialized = json.loads(serialized)
 
     assert deserialized == data
+
+
+def test_dump_fields_from_values():
+    """Test ``serializers.dump_fields`` with captured raw values"""
+    model = _fk_model()
+    values = serializer.dump_values(model)
+    model.some_ip = '10.0.0.1'
+    dumped = serializer.dump_fields(model, values)
+    assert dumped['some_ip'][defs.Field.VALUE] == '127.0.0.1'
+    assert dumped['basic'][defs.Field.TYPE] == defs.FieldType.REL
+    assert dumped == serializer.dump_fields(models.FKModel.objects.get())
+
+
+@pytest.mark.parametrize('codec', sorted(serializer.CODECS))
+def test_change_log_codecs(settings, codec):
+    """Tests change logs survive every registered codec"""
+    settings.TRACKED_MODEL_CODEC = codec
+    data = serializer.dump_model(_m2m_model())
+    data.update(serializer.dump_model(_fk_model()))
+    value = serializer.dump_change_log(data)
+    assert value[0] == serializer.CODECS[codec].code
+    assert serializer.load_change_log(value) == json.loads(
+        serializer.to_json(data))
+
+
+def test_compact_codec_is_smaller(settings):
+    """Tests compact codec drops field data keys"""
+    data = serializer.dump_model(_fk_model())
+    json_value = serializer.dump_change_log(data)
+    settings.TRACKED_MODEL_CODEC = 'compact'
+    compact_value = serializer.dump_change_log(data)
+    assert len(compact_value) < len(json_value)
+    assert serializer.from_compact(serializer.to_compact(data)) == data
+
+
+@pytest.mark.parametrize('compression', sorted(serializer.COMPRESSIONS))
+def test_change_log_compression(settings, compression):
+    """Tests change logs of at least ``COMPRESS_MIN_BYTES`` are compressed"""
+    settings.TRACKED_MODEL_COMPRESSION = compression
+    settings.TRACKED_MODEL_COMPRESS_MIN_BYTES = 100
+    small = {'some_num': {defs.Field.OLD: 1, defs.Field.NEW: 2}}
+    assert serializer.dump_change_log(small)[1] == 0
+    big = {'some_txt': {defs.Field.OLD: 'lol' * 100, defs.Field.NEW: None}}
+    value = serializer.dump_change_log(big)
+    assert value[1] == serializer.COMPRESSIONS[compression][0]
+    assert len(value) < 300
+    assert serializer.load_change_log(value) == big
+
+
+def test_load_legacy_change_log():
+    """Tests change logs stored as plain json are still loaded"""
+    data = {'some_num': {defs.Field.OLD: 1, defs.Field.NEW: 2}}
+    assert serializer.load_change_log(serializer.to_json(data)) == data
+    assert serializer.load_change_log(
+        serializer.to_json(data).encode('utf-8')) == data
+
+
+def test_register_codec_checks_code():
+    """Tests codec codes are unique and fit row header"""
+    with pytest.raises(ValueError):
+        serializer.register_codec(1, 'other', None, None)
+    with pytest.raises(ValueError):
+        serializer.register_codec(ord('{'), 'other', None, None)
+    with pytest.raises(ValueError):
+        serializer.register_codec(256, 'other', None, None)
+
+
+def test_dump_plan_is_cached():
+    """Tests ``get_plan`` builds plan once and shares relation info"""
+    plan = serializer.get_plan(models.FKModel)
+    assert serializer.get_plan(models.FKModel) is plan
+    first = serializer.dump_model(_fk_model())
+    second = serializer.dump_model(_fk_model())
+    assert first['basic'][defs.Field.REL] is second['basic'][defs.Field.REL]
+    assert first['basic'] is not second['basic']
+
+
+def test_dump_plan_cleared(settings):
+    """Tests plans are rebuilt when ``INSTALLED_APPS`` change"""
+    plan = serializer.get_plan(models.BasicModel)
+    settings.DEBUG = False
+    assert serializer.get_plan(models.BasicModel) is plan
+    serializer.clear_plans(setting='INSTALLED_APPS')
+    assert serializer.get_plan(models.BasicModel) is not plan
+
+
+def test_apply_m2m_changes():
+    """Test m2m changes are applied to list of related pks"""
+    data = {'bunch': {defs.Field.VALUE: [1, 2, 3]}}
+    changes = {'bunch': {'added': [4, 2], 'removed': [1]}}
+    serializer.apply_changes(data, changes)
+    assert data['bunch'][defs.Field.VALUE] == [2, 3, 4]
+    data = {}
+    serializer.apply_changes(data, {'bunch': {'added': [1]}})
+    assert data == {'bunch': {defs.Field.VALUE: [1]}}
+
+
+def test_merge_changes():
+    """Test ``serializer.merge_changes``"""
+    first = {
+        'a': {'type': 'val', 'old': 1, 'new': 2},
+        'b': {'type': 'val', 'old': 1, 'new': 2}
+    }
+    second = {
+        'a': {'type': 'val', 'old': 2, 'new': 3},
+        'b': {'type': 'val', 'old': 2, 'new': 1},
+        'c': {'type': 'val', 'old': 1, 'new': 2}
+    }
+    merged = serializer.merge_changes(first, second)
+    assert merged == {
+        'a': {'type': 'val', 'old': 1, 'new': 3},
+        'c': {'type': 'val', 'old': 1, 'new': 2}
+    }
+
+
+def test_merge_m2m_changes():
+    """Test ``serializer.merge_changes`` merges added and removed pks"""
+    first = {'a': {'added': [1, 2]}, 'b': {'added': [3]}}
+    second = {'a': {'added': [4], 'removed': [1, 5]}, 'b': {'removed': [3]}}
+    assert serializer.merge_changes(first, second) == {
+        'a': {'added': [2, 4], 'removed': [5]}
+    }
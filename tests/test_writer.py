@@ -0,0 +1,142 @@
+"""Test for ``writer`` module"""
+import threading
+import time
+
+import pytest
+from django.db import transaction
+
+from tests.models import BasicModel
+
+from tracked_model.defs import Backpressure
+from tracked_model.models import History
+from tracked_model.writer import HistoryWriter, flush, get_writer, stop
+
+
+class Recorder:
+    """Records written batches.
+    If ``event`` is given, writer thread waits for it before writing.
+    """
+    def __init__(self, event=None):
+        self.batches = []
+        self.event = event
+
+    def __call__(self, batch):
+        name = threading.current_thread().name
+        if self.event is not None and name == 'tracked-model-writer':
+            self.event.wait()
+        self.batches.append(list(batch))
+
+    @property
+    def written(self):
+        """Returns all written objects"""
+        return [x for batch in self.batches for x in batch]
+
+
+def _wait_for_empty_queue(writer):
+    """Waits until writer thread takes all objects from queue"""
+    while not writer.queue.empty():
+        time.sleep(0.001)
+
+
+def test_writer_writes_in_batches():
+    """Test ``HistoryWriter`` writes queued objects in batches"""
+    event = threading.Event()
+    recorder = Recorder(event)
+    writer = HistoryWriter(100, 3, Backpressure.BLOCK, write=recorder)
+    writer.put([0])
+    writer.put(list(range(1, 8)))
+    event.set()
+    writer.flush()
+    assert recorder.written == list(range(8))
+    assert all(len(x) <= 3 for x in recorder.batches)
+    writer.stop()
+    assert writer._thread is None
+
+
+def test_writer_backpressure_drop():
+    """Test ``HistoryWriter`` drops objects when queue is full"""
+    event = threading.Event()
+    recorder = Recorder(event)
+    writer = HistoryWriter(2, 1, Backpressure.DROP, write=recorder)
+    writer.put([0])
+    _wait_for_empty_queue(writer)
+    writer.put(list(range(1, 6)))
+    assert writer.dropped == 3
+    event.set()
+    writer.stop()
+    assert recorder.written == [0, 1, 2]
+
+
+def test_writer_backpressure_sync():
+    """Test ``HistoryWriter`` writes in caller thread when queue is full,
+    after objects queued before
+    """
+    event = threading.Event()
+    recorder = Recorder(event)
+    writer = HistoryWriter(2, 1, Backpressure.SYNC, write=recorder)
+    writer.put([0])
+    _wait_for_empty_queue(writer)
+    caller = threading.Thread(target=writer.put, args=(list(range(1, 6)),))
+    caller.start()
+    caller.join(0.05)
+    assert caller.is_alive()
+    assert recorder.batches == []
+    event.set()
+    caller.join()
+    assert recorder.written == [0, 1, 2, 3, 4, 5]
+    assert recorder.batches[-1] == [3, 4, 5]
+    writer.stop()
+    assert writer.dropped == 0
+
+
+@pytest.mark.django_db(transaction=True)
+@pytest.mark.parametrize('backpressure', [
+    Backpressure.BLOCK, Backpressure.SYNC])
+def test_async_history(settings, backpressure):
+    """Test history stored by background writer keeps order of changes"""
+    settings.TRACKED_MODEL_ASYNC = True
+    settings.TRACKED_MODEL_ASYNC_QUEUE_SIZE = 2
+    settings.TRACKED_MODEL_ASYNC_BATCH_SIZE = 1
+    settings.TRACKED_MODEL_ASYNC_BACKPRESSURE = backpressure
+    stop()
+    try:
+        obj = BasicModel.objects.create(some_num=0, some_txt='lol')
+        for num in range(1, 10):
+            obj.some_num = num
+            obj.save()
+        flush()
+    finally:
+        stop()
+    history = obj.tracked_model_history()
+    assert history.count() == 10
+    assert history.latest().materialize().some_num == 9
+    states = [hist.materialize().some_num for hist in history]
+    assert states == list(range(10))
+    assert get_writer().dropped == 0
+    stop()
+
+
+@pytest.mark.django_db(transaction=True)
+@pytest.mark.skipif(
+    not hasattr(transaction, 'on_commit'),
+    reason='transaction.on_commit is not supported')
+def test_async_history_queued_on_commit(settings):
+    """Test history made inside atomic block is queued on commit"""
+    settings.TRACKED_MODEL_ASYNC = True
+    stop()
+    try:
+        with transaction.atomic():
+            obj = BasicModel.objects.create(some_num=1, some_txt='lol')
+            obj.some_num = 2
+            obj.save()
+            flush()
+        with transaction.atomic():
+            BasicModel.objects.create(some_num=3, some_txt='lol')
+            transaction.set_rollback(True)
+        flush()
+    finally:
+        stop()
+    history = obj.tracked_model_history()
+    assert history.count() == 2
+    assert history.latest().materialize().some_num == 2
+    assert History.objects.count() == 2
@@ -0,0 +1,88 @@
+"""Awaitable counterparts of blocking tracking calls.
+
+Django ORM is synchronous, so calls run in a pool of
+``TRACKED_MODEL_AIO_WORKERS`` threads, each with its own database
+connections, instead of hopping one by one through a single thread.
+Returned futures can be awaited (or ``yield from`` on python 3.4).
+
+Calls don't run inside atomic blocks of the calling thread, and
+objects shouldn't be used by other code until their future is done.
+"""
+import asyncio
+import builtins
+import collections
+import functools
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django.db import close_old_connections
+
+from tracked_model import conf
+
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def get_executor():
+    """Returns thread pool running blocking calls"""
+    global _executor  # pylint: disable=global-statement
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(conf.get('AIO_WORKERS'))
+        return _executor
+
+
+def _call(func, args, kwargs):
+    """Calls ``func`` in pool thread. Its connections are closed
+    afterwards, unless they can be reused (see ``CONN_MAX_AGE``).
+    """
+    try:
+        return func(*args, **kwargs)
+    finally:
+        close_old_connections()
+
+
+def run(func, *args, **kwargs):
+    """Returns future of ``func(*args, **kwargs)`` called in pool thread"""
+    loop = asyncio.get_event_loop()
+    return loop.run_in_executor(
+        get_executor(), functools.partial(_call, func, args, kwargs))
+
+
+class ChunkIterator:
+    """Asynchronous iterator of items of non-empty lists yielded by
+    ``chunks`` generator. Next list is fetched in pool thread once
+    items of previous one are consumed.
+    """
+    def __init__(self, chunks):
+        self._chunks = chunks
+        self._items = collections.deque()
+
+    def __aiter__(self):
+        return self
+
+    def __anext__(self):
+        loop = asyncio.get_event_loop()
+        result = asyncio.Future(loop=loop)
+        if self._items:
+            result.set_result(self._items.popleft())
+            return result
+
+        def fetched(future):
+            """Resolves ``result`` with first item of fetched list"""
+            if result.cancelled():
+                return
+            if future.cancelled():
+                result.cancel()
+            elif future.exception() is not None:
+                result.set_exception(future.exception())
+            elif future.result() is None:
+                # Not defined before python 3.5, neither is ``async for``
+                result.set_exception(builtins.StopAsyncIteration())
+            else:
+                self._items.extend(future.result())
+                result.set_result(self._items.popleft())
+
+        run(next, self._chunks, None).add_done_callback(fetched)
+        return result
@@ -0,0 +1,105 @@
+"""Transaction scoped buffer of ``History`` objects"""
+from django.db import transaction
+
+from tracked_model import serializer, writer
+from tracked_model.defs import (
+    ActionType, PENDING_REQUEST_FIELD, CHANGED_FIELDS_FIELD)
+
+
+BUFFERS_FIELD = '_tracked_model_buffers'
+
+
+class HistoryBuffer:
+    """Pending ``History`` objects of single atomic block.
+
+    Consecutive updates of the same object made by the same author
+    during the same request are collapsed into single ``History``.
+    Updates aren't collapsed over revisions of the object buffered in
+    between by other buffers (of nested atomic blocks) sharing ``latest``.
+    """
+    def __init__(self, latest=None):
+        self.hists = []
+        self._updates = {}
+        # Latest buffered ``History`` by object
+        self._latest = {} if latest is None else latest
+
+    def add(self, hist):
+        """Adds ``hist`` to buffer"""
+        key = (hist.content_type_id, str(hist.table_id))
+        if hist.action_type != ActionType.UPDATE:
+            self._updates.pop(key, None)
+            self._append(key, hist)
+            return
+
+        index = self._updates.get(key)
+        last = self.hists[index] if index is not None else None
+        if (last is None or self._latest.get(key) is not last or
+                last.snapshot is not None or
+                last.revision_author_id != hist.revision_author_id or
+                last.revision_request_id != hist.revision_request_id or
+                getattr(last, PENDING_REQUEST_FIELD, None) is not
+                getattr(hist, PENDING_REQUEST_FIELD, None)):
+            self._updates[key] = len(self.hists)
+            self._append(key, hist)
+            return
+
+        changes = serializer.merge_changes(
+            serializer.load_change_log(last.change_log),
+            serializer.load_change_log(hist.change_log))
+        if changes:
+            last.change_log = serializer.dump_change_log(changes)
+            last.snapshot = hist.snapshot
+            last.revision_ts = hist.revision_ts
+            if CHANGED_FIELDS_FIELD in last.__dict__:
+                setattr(last, CHANGED_FIELDS_FIELD, list(changes))
+        else:
+            self.hists[index] = None
+            del self._updates[key]
+            del self._latest[key]
+
+    def _append(self, key, hist):
+        """Appends ``hist`` of object identified by ``key``"""
+        self.hists.append(hist)
+        self._latest[key] = hist
+
+    def flush(self):
+        """Stores buffered ``History`` objects with single query"""
+        hists = [x for x in self.hists if x is not None]
+        self.hists = []
+        self._updates = {}
+        if hists:
+            writer.write_history(hists)
+
+
+def buffer_history(hists, using):
+    """Adds ``hists`` to buffer of current atomic block
+    on ``using`` connection. Buffer is flushed on commit and
+    dropped on rollback.
+
+    Returns False if there is no atomic block to buffer for, or
+    Django doesn't support ``transaction.on_commit``.
+    """
+    if not hasattr(transaction, 'on_commit'):
+        return False
+    connection = transaction.get_connection(using)
+    if not connection.in_atomic_block:
+        return False
+
+    # Django replaces ``run_on_commit`` list on commit and rollback,
+    # so buffers registered for previous hooks list are stale
+    hooks, buffers, latest = getattr(
+        connection, BUFFERS_FIELD, (None, None, None))
+    if hooks is not connection.run_on_commit:
+        buffers, latest = {}, {}
+        setattr(connection, BUFFERS_FIELD,
+                (connection.run_on_commit, buffers, latest))
+
+    key = tuple(connection.savepoint_ids)
+    buffer = buffers.get(key)
+    if buffer is None:
+        buffer = buffers[key] = HistoryBuffer(latest)
+        transaction.on_commit(buffer.flush, using=using)
+
+    for hist in hists:
+        buffer.add(hist)
+    return True
@@ -0,0 +1,52 @@
+"""Application settings"""
+from django.conf import settings
+
+
+PREFIX = 'TRACKED_MODEL_'
+
+DEFAULTS = {
+    # Capture raw field values on instantiation and build full
+    # initial state only when instance is saved or diffed
+    'LAZY_SNAPSHOT': False,
+    # Collect ``History`` created inside atomic blocks and store it
+    # with single query on commit
+    'BUFFER': False,
+    # Store ``History`` in a background thread
+    'ASYNC': False,
+    'ASYNC_QUEUE_SIZE': 10000,
+    'ASYNC_BATCH_SIZE': 500,
+    # One of ``defs.Backpressure``
+    'ASYNC_BACKPRESSURE': 'block',
+    # Store full state of object with every N-th revision, or once
+    # change logs stored since last full state exceed N bytes
+    'CHECKPOINT_REVISIONS': None,
+    'CHECKPOINT_BYTES': None,
+    # Name of ``serializer.CODECS`` used to encode change logs
+    'CODEC': 'json',
+    # Compress encoded change logs of at least N bytes
+    'COMPRESS_MIN_BYTES': None,
+    # One of ``serializer.COMPRESSIONS``
+    'COMPRESSION': 'zlib',
+    # Store ``RequestInfo`` together with first ``History`` of request
+    'DEFER_REQUEST_INFO': False,
+    # Store user agents and hosts of ``RequestInfo`` in lookup tables
+    'INTERN_REQUEST_INFO': False,
+    # Days history of models given as ``app_label.ModelName`` is kept
+    # for by ``tracked_model_archive`` command
+    'RETENTION': {},
+    # Report tracking operations, see ``instrumentation``
+    'INSTRUMENT': False,
+    # Store names of fields changed by ``History`` in ``FieldChange``
+    'FIELD_INDEX': False,
+    # Database alias tracking models are stored in and read from,
+    # see ``routers.HistoryRouter``
+    'DATABASE': None,
+    'READ_DATABASE': None,
+    # Threads running blocking calls of async API, see ``aio``
+    'AIO_WORKERS': 10,
+}
+
+
+def get(name):
+    """Returns ``TRACKED_MODEL_<name>`` setting or its default value"""
+    return getattr(settings, PREFIX + name, DEFAULTS[name])
@@ -1,24 +1,129 @@
 """Access control tools"""
+from collections import Counter, OrderedDict
 
-from tracked_model import serializer
-from tracked_model.defs import TrackToken, ActionType, Field
+from django.core.exceptions import FieldDoesNotExist
+from django.db import models, transaction, connections
+from django.db.models import Max
+from django.db.models.functions import Length
+from django.db.models.signals import m2m_changed
 
+from tracked_model import (
+    serializer, conf, buffer, writer, instrumentation, aio)
+from tracked_model.defs import (
+    TrackToken, ActionType, Field, Operation, PENDING_REQUEST_FIELD,
+    CHANGED_FIELDS_FIELD, HISTORY_CACHE_FIELD, BULK_BATCH_SIZE)
 
-def create_track_token(request):
+
+def create_track_token(request, defer=False):
     """Returns ``TrackToken``.
     ``TrackToken' contains request and user making changes.
 
     It can be passed to ``TrackedModel.save`` instead of ``request``.
     It is intended to be used when passing ``request`` is not possible
     e.g. when ``TrackedModel.save`` will be called from celery task.
+
+    With ``defer``, ``RequestInfo`` is not stored until ``History``
+    referencing it is, so such token can't leave current process.
     """
     from tracked_model.models import RequestInfo
-    request_pk = RequestInfo.create_or_get_from_request(request).pk
+    request_info = RequestInfo.create_or_get_from_request(request, defer)
     user_pk = None
     if request.user.is_authenticated():
         user_pk = request.user.pk
 
-    return TrackToken(request_pk=request_pk, user_pk=user_pk)
+    if request_info.pk is None:
+        return TrackToken(
+            request_pk=None, user_pk=user_pk, request_info=request_info)
+    return TrackToken(request_pk=request_info.pk, user_pk=user_pk)
+
+
+def acreate_track_token(request, defer=False):
+    """Returns future of ``create_track_token``, see ``aio``"""
+    return aio.run(create_track_token, request, defer)
+
+
+def _get_track_token(request=None, track_token=None):
+    """Returns ``TrackToken`` for ``request`` or ``track_token``.
+    If none of them is given, returned token is empty.
+    """
+    if request:
+        return create_track_token(
+            request, defer=conf.get('DEFER_REQUEST_INFO'))
+    return track_token or TrackToken(request_pk=None, user_pk=None)
+
+
+def _create_history(model, table_id, action, changes, track_token):
+    """Returns unsaved ``History`` of ``action`` made on ``model``
+    object identified by ``table_id``.
+    """
+    from django.contrib.contenttypes.models import ContentType
+    from tracked_model.models import History, HistorySchema
+    hist = History()
+    hist.content_type = ContentType.objects.get_for_model(model)
+    hist.schema_id = HistorySchema.objects.get_for_model(model)
+    hist.table_id = table_id
+    with instrumentation.measure(Operation.SERIALIZE, model) as measurement:
+        hist.change_log = serializer.dump_change_log(
+            serializer.strip_schema(changes))
+        measurement.size = len(hist.change_log)
+    if conf.get('FIELD_INDEX'):
+        setattr(hist, CHANGED_FIELDS_FIELD, list(changes))
+    hist.action_type = action
+    hist.revision_author_id = track_token.user_pk
+    hist.revision_request_id = track_token.request_pk
+    if track_token.request_info is not None:
+        setattr(hist, PENDING_REQUEST_FIELD, track_token.request_info)
+    return hist
+
+
+def _save_history(hists, using):
+    """Stores ``History`` objects in database with single query.
+
+    With ``TRACKED_MODEL_BUFFER`` or ``TRACKED_MODEL_ASYNC`` setting
+    enabled, or history stored in ``TRACKED_MODEL_DATABASE`` other than
+    ``using``, objects created inside atomic block on ``using``
+    connection are stored on commit. Background writer uses its own
+    connection, so it can't see uncommitted rows they reference.
+    See also ``writer.write_history``.
+    """
+    if not hists:
+        return
+    database = conf.get('DATABASE')
+    if ((conf.get('ASYNC') or conf.get('BUFFER') or
+         database not in (None, using)) and
+            buffer.buffer_history(hists, using)):
+        return
+    writer.write_history(hists)
+
+
+def _diff_states(initial_state, current_state):
+    """Returns changes between two dumped states of an object.
+    Only fields present in both states are compared.
+    Returns None if no changes were made.
+    """
+    change_log = {}
+    for field in current_state:
+        if field not in initial_state:
+            continue
+        old_value = initial_state[field][Field.VALUE]
+        new_value = current_state[field][Field.VALUE]
+        if old_value == new_value:
+            continue
+        field_data = initial_state[field].copy()
+        del field_data[Field.VALUE]
+        field_data[Field.OLD] = old_value
+        field_data[Field.NEW] = new_value
+        change_log[field] = field_data
+
+    return change_log or None
+
+
+def _only_ignored(model, changes):
+    """Returns True if ``changes`` were made only to fields listed
+    in ``TrackedMeta.ignore_changes`` of ``model``
+    """
+    ignored = serializer.get_plan(model).ignored
+    return bool(ignored) and ignored.issuperset(changes)
 
 
 class TrackedModelMixin:
@@ -30,101 +135,670 @@ class TrackedModelMixin:
 
     Changes can be then accessed through model's
     ``tracked_model_history`` method.
+
+    M2M changes are stored as soon as they are made through related
+    managers, with ``request`` or ``track_token`` of last ``save``.
+
+    With ``TRACKED_MODEL_LAZY_SNAPSHOT`` setting enabled, only raw field
+    values are captured on instantiation. Initial state is built when
+    instance is saved or diffed for the first time.
+
+    ``asave`` and ``adelete`` return awaitable futures of ``save``
+    and ``delete``, see ``aio``.
+
+    Tracked fields can be configured with ``TrackedMeta`` class
+    of the model, all attributes are optional::
+
+        class TrackedMeta:
+            fields = ('title', 'body')  # track only these fields
+            exclude = ('updated_at',)  # don't track these fields
+            ignore_changes = ('hits',)  # don't store changes of only these
+            skip_blobs = True  # don't track ``BinaryField`` fields
+
+    Untracked fields are never dumped, diffed or stored, and are left
+    with default values by ``History.materialize``. Primary key is
+    always tracked.
     """
+    _tracked_model_state = None
+    _tracked_model_initial_values = None
+    # ``request`` and ``track_token`` m2m changes are stored with
+    _tracked_model_m2m_token = (None, None)
+    _tracked_model_checkpoint_counters = None
+
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
-        self._tracked_model_initial_state = serializer.dump_model(self)
+        if not conf.get('LAZY_SNAPSHOT'):
+            with instrumentation.measure(Operation.SNAPSHOT, self):
+                state = serializer.dump_fields(self)
+            self._tracked_model_initial_state = state
+        elif (args and not kwargs and
+              len(args) == len(self._meta.concrete_fields)):
+            # Called by ``Model.from_db`` with all concrete field values
+            self._tracked_model_initial_values = args
+        else:
+            self._tracked_model_initial_values = serializer.dump_values(self)
+
+    @property
+    def _tracked_model_initial_state(self):
+        """State of instance after it was loaded or last saved"""
+        if self._tracked_model_state is None:
+            values = self._tracked_model_initial_values
+            with instrumentation.measure(Operation.SNAPSHOT, self):
+                state = serializer.dump_fields(self, values)
+            self._tracked_model_state = state
+            self._tracked_model_initial_values = None
+        return self._tracked_model_state
+
+    @_tracked_model_initial_state.setter
+    def _tracked_model_initial_state(self, state):
+        self._tracked_model_state = state
+        self._tracked_model_initial_values = None
+
+    def _tracked_model_reset_state(self, action=None, changes=None):
+        """Makes current state of instance its initial state.
+
+        ``action`` and ``changes`` describe the save that just happened.
+        """
+        if conf.get('LAZY_SNAPSHOT'):
+            self._tracked_model_state = None
+            self._tracked_model_initial_values = serializer.dump_values(self)
+        else:
+            with instrumentation.measure(Operation.SNAPSHOT, self):
+                state = serializer.dump_fields(self)
+            self._tracked_model_initial_state = state
+
+    def _tracked_model_checkpoint_due(self, action, hist):
+        """Returns True if ``hist`` should store full state of instance.
+
+        Revisions and bytes of change logs stored since last checkpoint
+        are fetched once and then counted on instance.
+        See ``TRACKED_MODEL_CHECKPOINT_REVISIONS`` and
+        ``TRACKED_MODEL_CHECKPOINT_BYTES`` settings.
+        """
+        max_revisions = conf.get('CHECKPOINT_REVISIONS')
+        max_bytes = conf.get('CHECKPOINT_BYTES')
+        if not max_revisions and not max_bytes:
+            return False
+        if action == ActionType.CREATE:
+            self._tracked_model_checkpoint_counters = [0, 0]
+            return False
+
+        counters = self._tracked_model_checkpoint_counters
+        if counters is None:
+            counters = [0, 0]
+            history = self.tracked_model_history().order_by(
+                '-revision_ts', '-pk')
+            history = history.annotate(size=Length('change_log'))
+            history = history.values_list('action_type', 'snapshot', 'size')
+            if max_revisions:
+                history = history[:max_revisions]
+            for action_type, snapshot, size in history.iterator():
+                if snapshot is not None or action_type != ActionType.UPDATE:
+                    break
+                counters[0] += 1
+                counters[1] += size
+
+        counters[0] += 1
+        counters[1] += len(hist.change_log)
+        due = ((max_revisions and counters[0] >= max_revisions) or
+               (max_bytes and counters[1] >= max_bytes))
+        self._tracked_model_checkpoint_counters = [0, 0] if due else counters
+        return bool(due)
 
     def save(self, *args, **kwargs):
         """Saves changes made on model instance if ``request`` or
         ``track_token`` keyword are provided.
+
+        With ``update_fields``, only those fields are compared, and
+        nothing is tracked if none of them is tracked.
         """
-        from tracked_model.models import History, RequestInfo
+        request = kwargs.pop('request', None)
+        track_token = kwargs.pop('track_token', None)
+        if request or track_token:
+            self._tracked_model_m2m_token = (request, track_token)
+
+        update_fields = kwargs.get('update_fields')
+        if self.pk and update_fields is not None:
+            fields = self._tracked_model_update_fields(update_fields)
+            super().save(*args, **kwargs)
+            if fields:
+                with instrumentation.measure(Operation.DIFF, self) as measure:
+                    changes = self._tracked_model_fields_diff(fields)
+                    measure.fields = changes
+                self._tracked_model_store(
+                    ActionType.UPDATE, changes, request, track_token)
+                self._tracked_model_reset_fields(fields)
+            return
+
         if self.pk:
             action = ActionType.UPDATE
             changes = None
+            self._tracked_model_load_assigned()
         else:
             action = ActionType.CREATE
-            changes = serializer.dump_model(self)
-
-        request = kwargs.pop('request', None)
-        track_token = kwargs.pop('track_token', None)
+            changes = serializer.dump_fields(self)
 
         super().save(*args, **kwargs)
         if not changes:
-            changes = self._tracked_model_diff()
-
-        if changes:
-            hist = History()
-            hist.model_name = self._meta.model.__name__
-            hist.app_label = self._meta.app_label
-            hist.table_name = self._meta.db_table
-            hist.table_id = self.pk
-            hist.change_log = serializer.to_json(changes)
-            hist.action_type = action
-            if request:
-                if request.user.is_authenticated():
-                    hist.revision_author = request.user
-                req_info = RequestInfo.create_or_get_from_request(request)
-                hist.revision_request = req_info
-            elif track_token:
-                hist.revision_author_id = track_token.user_pk
-                hist.revision_request_id = track_token.request_pk
-
-            hist.save()
-
-        self._tracked_model_initial_state = serializer.dump_model(self)
+            with instrumentation.measure(Operation.DIFF, self) as measure:
+                changes = self._tracked_model_diff()
+                measure.fields = changes
+        self._tracked_model_store(action, changes, request, track_token)
+        self._tracked_model_reset_state(action, changes)
+
+    def _tracked_model_store(self, action, changes, request, track_token):
+        """Stores history of ``changes`` made by saving instance"""
+        if not changes or (action == ActionType.UPDATE and
+                           _only_ignored(type(self), changes)):
+            return
+        self.__dict__.pop(HISTORY_CACHE_FIELD, None)
+        track_token = _get_track_token(request, track_token)
+        hist = _create_history(self, self.pk, action, changes, track_token)
+        if self._tracked_model_checkpoint_due(action, hist):
+            snapshot = serializer.dump_model(self)
+            with instrumentation.measure(
+                    Operation.SERIALIZE, self) as measurement:
+                hist.snapshot = serializer.dump_change_log(
+                    serializer.strip_schema(snapshot))
+                measurement.size = len(hist.snapshot)
+        _save_history([hist], self._state.db)
+
+    def _tracked_model_update_fields(self, names):
+        """Returns tracked concrete fields of ``update_fields`` ``names``
+        (field names or attnames)
+        """
+        tracked = serializer.fields_by_attname(type(self))
+        fields = {}
+        for name in names:
+            field = self._meta.get_field(name)
+            if field.attname in tracked:
+                fields[field.attname] = field
+        return list(fields.values())
+
+    def _tracked_model_fields_diff(self, fields):
+        """Returns changes made to ``fields``, without building
+        initial state of other fields. Returns None if no changes
+        were made.
+        """
+        values = self._tracked_model_initial_values
+        if values is None:
+            initial_state = self._tracked_model_initial_state
+            initial_state = {
+                f.name: initial_state[f.name] for f in fields
+                if f.name in initial_state
+            }
+        else:
+            index = serializer.get_plan(type(self)).index
+            initial_state = serializer.dump_fields(
+                type(self), [values[index[f.attname]] for f in fields],
+                fields)
+        current_state = serializer.dump_fields(self, fields=fields)
+        return _diff_states(initial_state, current_state)
+
+    def _tracked_model_reset_fields(self, fields):
+        """Makes current values of ``fields`` their initial values"""
+        values = self._tracked_model_initial_values
+        if values is None:
+            self._tracked_model_state.update(
+                serializer.dump_fields(self, fields=fields))
+        else:
+            index = serializer.get_plan(type(self)).index
+            values = list(values)
+            for field in fields:
+                values[index[field.attname]] = getattr(self, field.attname)
+            self._tracked_model_initial_values = values
 
     def delete(self, *args, **kwargs):
         """Saves history of model instance deletion"""
-        from tracked_model.models import History, RequestInfo
-        hist = History()
-        hist.model_name = self._meta.model.__name__
-        hist.app_label = self._meta.app_label
-        hist.table_name = self._meta.db_table
-        hist.table_id = self.pk
-        hist.action_type = ActionType.DELETE
         state = serializer.dump_model(self)
-        hist.change_log = serializer.to_json(state)
         request = kwargs.pop('request', None)
         track_token = kwargs.pop('track_token', None)
-        if request:
-            if request.user.is_authenticated():
-                hist.revision_author = request.user
-            req_info = RequestInfo.create_or_get_from_request(request)
-            hist.revision_request = req_info
-        elif track_token:
-            hist.revision_author_id = track_token.user_pk
-            hist.revision_request_id = track_token.request_pk
-
-        hist.save()
+        track_token = _get_track_token(request, track_token)
+        hist = _create_history(
+            self, self.pk, ActionType.DELETE, state, track_token)
+        _save_history([hist], self._state.db)
         super().delete(*args, **kwargs)
 
+    def asave(self, *args, **kwargs):
+        """Returns future of ``save`` called in pool thread, see ``aio``"""
+        return aio.run(self.save, *args, **kwargs)
+
+    def adelete(self, *args, **kwargs):
+        """Returns future of ``delete`` called in pool thread,
+        see ``aio``
+        """
+        return aio.run(self.delete, *args, **kwargs)
+
+    def _tracked_model_current_state(self):
+        """Returns current state of fields that could have changed"""
+        return serializer.dump_fields(self)
+
+    def _tracked_model_load_assigned(self):
+        """Adds stored state of fields deferred on load and assigned
+        since to initial state. Must be called before saving.
+        """
+        initial_state = self._tracked_model_initial_state
+        tracked = serializer.fields_by_attname(type(self))
+        if len(initial_state) >= len(tracked):
+            return
+        deferred = serializer.deferred_fields(self)
+        fields = [
+            f for f in tracked.values()
+            if f.name not in initial_state and f.attname not in deferred
+        ]
+        if not fields:
+            return
+        rows = type(self)._base_manager.using(self._state.db).filter(
+            pk=self.pk).values_list(*[f.attname for f in fields])
+        for values in rows:
+            initial_state.update(
+                serializer.dump_fields(type(self), values, fields))
+
     def _tracked_model_diff(self):
         """Returns changes made to model instance.
         Returns None if no changes were made.
         """
         initial_state = self._tracked_model_initial_state
-        current_state = serializer.dump_model(self)
-        if current_state == initial_state:
-            return None
-
-        change_log = {}
-        for field in initial_state:
-            old_value = initial_state[field][Field.VALUE]
-            new_value = current_state[field][Field.VALUE]
-            if old_value == new_value:
-                continue
-            field_data = initial_state.copy()[field]
-            del field_data[Field.VALUE]
-            field_data[Field.OLD] = old_value
-            field_data[Field.NEW] = new_value
-            change_log[field] = field_data
-
-        return change_log or None
+        current_state = self._tracked_model_current_state()
+        return _diff_states(initial_state, current_state)
 
     def tracked_model_history(self):
         """Returns history of a tracked object"""
         from tracked_model.models import History
-        return History.objects.filter(
-            table_name=self._meta.db_table, table_id=self.pk)
+        return History.objects.for_model(self).filter(table_id=self.pk)
+
+    def tracked_model_revisions(self):
+        """Returns list of ``History`` of a tracked object, ordered by
+        revision. Uses history loaded by ``prefetch_history``, if any.
+        """
+        prefetched = self.__dict__.get(HISTORY_CACHE_FIELD)
+        if prefetched is not None:
+            return prefetched
+        return list(self.tracked_model_history().order_by(
+            'revision_ts', 'pk'))
+
+    def tracked_model_latest_revision(self):
+        """Returns latest ``History`` of a tracked object, or None.
+        Uses history loaded by ``prefetch_history``, if any.
+        """
+        prefetched = self.__dict__.get(HISTORY_CACHE_FIELD)
+        if prefetched is not None:
+            return prefetched[-1] if prefetched else None
+        history = self.tracked_model_history()
+        return history.order_by('-revision_ts', '-pk').first()
+
+
+class DirtyTrackedModelMixin(TrackedModelMixin):
+    """``TrackedModelMixin`` which records fields assigned on instance.
+
+    Only assigned fields are compared when looking for
+    changes, and only changed fields are updated in initial state after
+    ``save``. Suited for wide models with few fields changed per save.
+    """
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._tracked_model_dirty = set()
+
+    def __setattr__(self, name, value):
+        dirty = self.__dict__.get('_tracked_model_dirty')
+        if dirty is not None:
+            dirty.add(name)
+        super().__setattr__(name, value)
+
+    def _tracked_model_reset_fields(self, fields):
+        """Makes current values of ``fields`` their initial values"""
+        super()._tracked_model_reset_fields(fields)
+        dirty = self._tracked_model_dirty
+        for field in fields:
+            dirty.discard(field.name)
+            dirty.discard(field.attname)
+
+    def _tracked_model_reset_state(self, action=None, changes=None):
+        """Applies saved ``changes`` to initial state"""
+        if action == ActionType.UPDATE and self._tracked_model_state:
+            state = self._tracked_model_state
+            for field in changes or ():
+                state[field][Field.VALUE] = changes[field][Field.NEW]
+        else:
+            super()._tracked_model_reset_state(action, changes)
+        self._tracked_model_dirty.clear()
+
+    def _tracked_model_current_state(self):
+        """Returns current state of assigned fields"""
+        fields = serializer.fields_by_attname(type(self))
+        dirty = [fields[x] for x in self._tracked_model_dirty if x in fields]
+        return serializer.dump_fields(self, fields=dirty)
+
+    def _tracked_model_diff(self):
+        """Returns changes made to assigned fields.
+        Returns None if no changes were made.
+        """
+        if not self._tracked_model_dirty:
+            return None
+        return super()._tracked_model_diff()
+
+
+def _m2m_cleared_pks(m2m, instance, reverse):
+    """Returns pks related by ``m2m`` field to ``instance``, which is
+    about to be cleared. On ``reverse`` side these are pks of objects
+    owning the field.
+    """
+    through = m2m.rel.through
+    source = through._meta.get_field(m2m.m2m_field_name()).attname
+    target = through._meta.get_field(m2m.m2m_reverse_field_name()).attname
+    if reverse:
+        source, target = target, source
+    rows = through._default_manager.filter(**{source: instance.pk})
+    return set(rows.values_list(target, flat=True))
+
+
+def track_m2m_changes(sender, instance, action, reverse, model, pk_set,
+                      using, **kwargs):
+    """Stores history of m2m changes made through related managers.
+    Only added or removed pks are stored, never whole related sets.
+    Connected to ``m2m_changed`` signal.
+    """
+    if action not in ('post_add', 'post_remove', 'pre_clear'):
+        return
+    tracked = model if reverse else type(instance)
+    if not issubclass(tracked, TrackedModelMixin):
+        return
+    plan = serializer.get_plan(tracked)
+    for m2m, _, _ in plan.m2m:
+        if m2m.rel.through is sender:
+            break
+    else:
+        return
+    if m2m.name in plan.ignored:
+        return
+
+    if action == 'pre_clear':
+        pk_set = _m2m_cleared_pks(m2m, instance, reverse)
+    if not pk_set:
+        return
+    key = Field.ADDED if action == 'post_add' else Field.REMOVED
+    token = getattr(instance, '_tracked_model_m2m_token', (None, None))
+    track_token = _get_track_token(*token)
+    if reverse:
+        changes = {m2m.name: {key: [instance.pk]}}
+        hists = [
+            _create_history(tracked, pk, ActionType.UPDATE, changes,
+                            track_token)
+            for pk in sorted(pk_set)
+        ]
+    else:
+        changes = {m2m.name: {key: sorted(pk_set)}}
+        hists = [_create_history(
+            tracked, instance.pk, ActionType.UPDATE, changes, track_token)]
+    _save_history(hists, using)
+
+
+m2m_changed.connect(track_m2m_changes, dispatch_uid='tracked_model_m2m')
+
+
+def _latest_revisions(history):
+    """Returns ``history`` queryset limited to revisions made at the
+    time of the latest revision of any matched object. It holds the
+    latest revisions of every object, and possibly few older ones.
+
+    ``Max`` per object is an uncorrelated subquery, as the ORM of
+    Django<1.11 can't reference outer query (``OuterRef``).
+    """
+    latest = history.order_by().values('table_id').annotate(
+        latest=Max('revision_ts')).values('latest')
+    return history.filter(revision_ts__in=latest)
+
+
+def prefetch_history(objs, latest_only=False, queryset=None):
+    """Loads history of tracked ``objs`` of the same model with one query
+    per ``BULK_BATCH_SIZE`` objects and attaches it to them, see
+    ``TrackedModelMixin.tracked_model_revisions`` and
+    ``tracked_model_latest_revision``.
+
+    With ``latest_only``, only the latest revision of every object is
+    loaded. ``queryset`` of ``History`` can be given to customize
+    lookup, e.g. to ``select_related`` authors or ``defer`` change logs.
+    """
+    from tracked_model.models import History
+    objs = [x for x in objs if x.pk is not None]
+    if not objs:
+        return
+    if queryset is None:
+        queryset = History.objects.all()
+    history = queryset.for_model(type(objs[0]))
+    history = history.order_by('table_id', 'revision_ts', 'pk')
+
+    revisions = {}
+    table_ids = sorted({str(x.pk) for x in objs})
+    for batch in serializer.batches(table_ids):
+        batch_history = history.filter(table_id__in=batch)
+        if latest_only:
+            batch_history = _latest_revisions(batch_history)
+        for hist in batch_history:
+            revisions.setdefault(hist.table_id, []).append(hist)
+    for obj in objs:
+        found = revisions.get(str(obj.pk), [])
+        if latest_only:
+            found = found[-1:]
+        obj.__dict__[HISTORY_CACHE_FIELD] = found
+
+
+def _has_field(model, name):
+    """Returns True if ``model`` has field ``name``"""
+    try:
+        model._meta.get_field(name)
+    except FieldDoesNotExist:
+        return False
+    return True
+
+
+class TrackedQuerySet(models.QuerySet):
+    """``QuerySet`` storing history of bulk operations.
+
+    ``bulk_create``, ``update`` and ``delete`` accept ``request`` or
+    ``track_token`` keywords, same as ``TrackedModelMixin.save``.
+    Old values are fetched with one query per ``BULK_BATCH_SIZE``
+    objects and their ``History`` objects are inserted with
+    ``bulk_create``.
+
+    History of matched objects can be loaded together with them,
+    see ``prefetch_history``.
+    """
+    _tracked_model_prefetch = None
+
+    def prefetch_history(self, latest_only=False, queryset=None):
+        """Returns queryset loading history of matched objects once
+        they are fetched, see ``control.prefetch_history``
+        """
+        clone = self._clone()
+        clone._tracked_model_prefetch = {
+            'latest_only': latest_only, 'queryset': queryset}
+        return clone
+
+    def _clone(self, *args, **kwargs):
+        clone = super()._clone(*args, **kwargs)
+        clone._tracked_model_prefetch = self._tracked_model_prefetch
+        return clone
+
+    def _fetch_all(self):
+        fetched = self._result_cache is not None
+        super()._fetch_all()
+        if self._tracked_model_prefetch is not None and not fetched:
+            objs = [
+                x for x in self._result_cache
+                if isinstance(x, TrackedModelMixin)
+            ]
+            prefetch_history(objs, **self._tracked_model_prefetch)
+
+    def _tracked_model_values(self, fields, limit=None):
+        """Returns dict of matched objects ``fields`` values keyed by pk.
+        With ``limit``, only that many first objects in queryset order.
+        """
+        attnames = [self.model._meta.pk.attname]
+        attnames.extend(f.attname for f in fields)
+        queryset = self if limit is not None else self.order_by()
+        rows = queryset.select_for_update().values_list(*attnames)
+        if limit is not None:
+            rows = rows[:limit]
+        return OrderedDict((row[0], row[1:]) for row in rows)
+
+    def _tracked_model_chunks(self, fields, chunk_size):
+        """Yields dicts of up to ``chunk_size`` matched objects ``fields``
+        values keyed by pk, see ``_tracked_model_values``. Objects are
+        fetched in order of pk, next chunk starts after last pk.
+        """
+        queryset = self.order_by('pk')
+        while True:
+            chunk = queryset._tracked_model_values(fields, chunk_size)
+            if chunk:
+                yield chunk
+            if len(chunk) < chunk_size:
+                return
+            last_pk = next(reversed(chunk))
+            queryset = self.order_by('pk').filter(pk__gt=last_pk)
+
+    def _tracked_model_refetch(self, pks, fields):
+        """Returns dict of objects ``fields`` values keyed by pk"""
+        queryset = TrackedQuerySet(self.model, using=self.db)
+        values = {}
+        for batch in serializer.batches(pks):
+            batch_qs = queryset.filter(pk__in=batch)
+            values.update(batch_qs._tracked_model_values(fields))
+        return values
+
+    def _tracked_model_insert(self, objs):
+        """Inserts ``objs`` one by one, setting their primary keys"""
+        opts = self.model._meta
+        fields = [f for f in opts.concrete_fields if f is not opts.auto_field]
+        for obj in objs:
+            obj.pk = self._insert(
+                [obj], fields=fields, return_id=True, using=self.db)
+            obj._state.adding = False
+            obj._state.db = self.db
+
+    def bulk_create(self, objs, *args, request=None, track_token=None,
+                    **kwargs):
+        """Inserts ``objs`` and stores their history.
+
+        Database backends which don't return primary keys of rows
+        inserted in bulk (sqlite, mysql, all with django<1.10) insert
+        objects without primary key one by one, so their history can
+        reference them.
+        """
+        objs = list(objs)
+        features = connections[self.db].features
+        with transaction.atomic(using=self.db):
+            if getattr(features, 'can_return_ids_from_bulk_insert', False):
+                super().bulk_create(objs, *args, **kwargs)
+            else:
+                super().bulk_create(
+                    [obj for obj in objs if obj.pk is not None],
+                    *args, **kwargs)
+                self._tracked_model_insert(
+                    [obj for obj in objs if obj.pk is None])
+            track_token = _get_track_token(request, track_token)
+            hists = []
+            for obj in objs:
+                state = serializer.dump_fields(obj)
+                hists.append(_create_history(
+                    obj, obj.pk, ActionType.CREATE, state, track_token))
+                obj._tracked_model_initial_state = state
+            _save_history(hists, self.db)
+        return objs
+
+    def update(self, **kwargs):
+        """Updates matched objects and stores history of changes.
+
+        Objects are updated in chunks of ``BULK_BATCH_SIZE``, so memory
+        use doesn't grow with number of matched objects. ``request``
+        and ``track_token`` are values of fields if model has such.
+        """
+        opts = self.model._meta
+        track = {
+            name: kwargs.pop(name) for name in ('request', 'track_token')
+            if name in kwargs and not _has_field(self.model, name)
+        }
+        tracked = serializer.fields_by_attname(self.model)
+        updates = [(opts.get_field(name), value)
+                   for name, value in kwargs.items()]
+        updates = [x for x in updates if x[0].attname in tracked]
+        if not updates:
+            return super().update(**kwargs)
+        fields = [field for field, _ in updates]
+        values = [value for _, value in updates]
+        refetch = any(hasattr(x, 'resolve_expression') for x in values)
+        new_values = []
+        if not refetch:
+            for field, value in zip(fields, values):
+                if isinstance(value, models.Model):
+                    value = value.pk
+                new_values.append(field.to_python(value))
+
+        rows, token = 0, None
+        with transaction.atomic(using=self.db):
+            chunks = self._tracked_model_chunks(fields, BULK_BATCH_SIZE)
+            for old in chunks:
+                queryset = models.QuerySet(self.model, using=self.db)
+                rows += queryset.filter(pk__in=list(old)).update(**kwargs)
+                if refetch:
+                    new = self._tracked_model_refetch(list(old), fields)
+                else:
+                    new = dict.fromkeys(old, new_values)
+
+                hists = []
+                for pk in old:
+                    old_state = serializer.dump_fields(
+                        self.model, old[pk], fields)
+                    new_state = serializer.dump_fields(
+                        self.model, new[pk], fields)
+                    changes = _diff_states(old_state, new_state)
+                    if not changes or _only_ignored(self.model, changes):
+                        continue
+                    if token is None:
+                        token = _get_track_token(
+                            track.get('request'), track.get('track_token'))
+                    hists.append(_create_history(
+                        self.model, pk, ActionType.UPDATE, changes, token))
+                _save_history(hists, self.db)
+        return rows
+
+    def delete(self, request=None, track_token=None):
+        """Stores history of matched objects deletion and deletes them,
+        in chunks of ``BULK_BATCH_SIZE`` like ``update``.
+        """
+        tracked = serializer.fields_by_attname(self.model)
+        fields = [f for f in self.model._meta.concrete_fields
+                  if f.attname in tracked]
+        deleted, counts, result, matched = 0, Counter(), None, False
+        with transaction.atomic(using=self.db):
+            track_token = _get_track_token(request, track_token)
+            chunks = self._tracked_model_chunks(fields, BULK_BATCH_SIZE)
+            for old in chunks:
+                matched = True
+                m2m = serializer.dump_m2m_many(self.model, list(old))
+                hists = []
+                for pk in old:
+                    state = serializer.dump_fields(
+                        self.model, old[pk], fields)
+                    state.update(m2m[pk])
+                    hists.append(_create_history(
+                        self.model, pk, ActionType.DELETE, state,
+                        track_token))
+                _save_history(hists, self.db)
+                queryset = models.QuerySet(self.model, using=self.db)
+                result = queryset.filter(pk__in=list(old)).delete()
+                if result is not None:
+                    deleted += result[0]
+                    counts.update(result[1])
+            if not matched:
+                return super().delete()
+        if result is None:
+            # Django<1.9 returns nothing
+            return None
+        return deleted, dict(counts)
+
+
+class TrackedManager(models.Manager.from_queryset(TrackedQuerySet)):
+    """Manager storing history of bulk operations,
+    see ``TrackedQuerySet``.
+    """
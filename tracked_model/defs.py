@@ -9,7 +9,25 @@ RELATED_FIELDS = (OneToOneField, ForeignKey)
 
 REQUEST_CACHE_FIELD = '_tracked_model_request_info'
 
-TrackToken = namedtuple('TrackToken', ('request_pk', 'user_pk'))
+# Unsaved ``RequestInfo`` of ``History``, stored together with it
+PENDING_REQUEST_FIELD = '_tracked_model_pending_request'
+
+# Names of fields changed by unsaved ``History``, see ``FieldChange``
+CHANGED_FIELDS_FIELD = '_tracked_model_changed_fields'
+
+# ``History`` loaded by ``control.prefetch_history``
+HISTORY_CACHE_FIELD = '_tracked_model_history'
+
+# Restored m2m values (lists of related pks) of materialized objects
+M2M_CACHE_FIELD = '_tracked_model_m2m'
+
+# Max number of objects handled by single query in bulk operations
+BULK_BATCH_SIZE = 500
+
+TrackToken = namedtuple(
+    'TrackToken', ('request_pk', 'user_pk', 'request_info'))
+# ``request_info`` is set only by ``create_track_token`` with ``defer``
+TrackToken.__new__.__defaults__ = (None,)
 
 
 class ActionType:
@@ -22,6 +40,16 @@ class ActionType:
         (UPDATE, _('Updated')),
         (DELETE, _('Deleted'))
     )
+    # Codes stored in database
+    CODES = {CREATE: 1, UPDATE: 2, DELETE: 3}
+    NAMES = {code: name for name, code in CODES.items()}
+
+
+class Backpressure:
+    """What to do with ``History`` when background writer queue is full"""
+    BLOCK = 'block'
+    DROP = 'drop'
+    SYNC = 'sync'
 
 
 class FieldType:
@@ -41,3 +69,16 @@ class Field:
     REL_MODEL = 'model'
     NEW = 'new'
     OLD = 'old'
+    # Related pks added to and removed from m2m field
+    ADDED = 'added'
+    REMOVED = 'removed'
+
+
+class Operation:
+    """Tracking operations reported by ``instrumentation``"""
+    SNAPSHOT = 'snapshot'
+    DIFF = 'diff'
+    SERIALIZE = 'serialize'
+    HISTORY_INSERT = 'history_insert'
+    REQUEST_INFO_INSERT = 'request_info_insert'
+    MATERIALIZE = 'materialize'
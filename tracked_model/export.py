@@ -0,0 +1,51 @@
+"""Streaming export of ``History``"""
+import csv
+
+from tracked_model import serializer
+from tracked_model.defs import BULK_BATCH_SIZE
+
+
+# Keys of ``HistoryQuerySet.stream`` records, in order of csv columns
+COLUMNS = (
+    'id', 'app_label', 'model', 'table_id', 'action_type', 'revision_ts',
+    'revision_author', 'revision_request', 'change_log')
+
+
+def write_ndjson(records, stream):
+    """Writes ``records`` to ``stream`` as json, one per line"""
+    for record in records:
+        stream.write(serializer.to_json(record))
+        stream.write('\n')
+
+
+def write_csv(records, stream):
+    """Writes ``records`` to ``stream`` as csv with header row.
+    Change logs are written as json.
+    """
+    writer = csv.writer(stream)
+    writer.writerow(COLUMNS)
+    for record in records:
+        record['revision_ts'] = record['revision_ts'].isoformat()
+        record['change_log'] = serializer.to_json(record['change_log'])
+        writer.writerow([record[x] for x in COLUMNS])
+
+
+FORMATS = {'ndjson': write_ndjson, 'csv': write_csv}
+
+
+def export_history(history, stream, fmt='ndjson',
+                   chunk_size=BULK_BATCH_SIZE):
+    """Writes ``history`` queryset to ``stream`` in ``fmt`` format,
+    reading it in chunks of ``chunk_size`` rows.
+    Returns number of exported rows.
+    """
+    counter = [0]
+
+    def counted(records):
+        """Yields ``records`` and counts them"""
+        for record in records:
+            counter[0] += 1
+            yield record
+
+    FORMATS[fmt](counted(history.stream(chunk_size)), stream)
+    return counter[0]
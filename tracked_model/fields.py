@@ -0,0 +1,23 @@
+"""Model fields"""
+from django.db import models
+
+from tracked_model.defs import ActionType
+
+
+class ActionTypeField(models.PositiveSmallIntegerField):
+    """Stores ``ActionType`` value as small integer code.
+    Values are still ``ActionType`` strings in python.
+    """
+    def from_db_value(self, value, *args):
+        """Returns ``ActionType`` for stored code"""
+        return self.to_python(value)
+
+    def to_python(self, value):
+        if value is None or value in ActionType.CODES:
+            return value
+        return ActionType.NAMES[int(value)]
+
+    def get_prep_value(self, value):
+        if value is None or isinstance(value, int):
+            return value
+        return ActionType.CODES[value]
@@ -0,0 +1,262 @@
+"""Measurements of tracking operations.
+
+With ``TRACKED_MODEL_INSTRUMENT`` setting enabled, every operation
+listed in ``defs.Operation`` sends ``operation_measured`` signal and is
+recorded by ``aggregator``. Disabled measurements cost a function call.
+"""
+import bisect
+import threading
+import time
+from collections import Counter
+
+from django.db import connections
+from django.dispatch import Signal
+from django.test.signals import setting_changed
+
+from tracked_model import conf
+
+
+# Sent with tracked model class (None if operation covers many models)
+# as sender. ``duration`` is in seconds, ``queries`` is number of
+# queries made (None if not counted), ``size`` is number of bytes of
+# stored change logs, ``fields`` are names of changed fields and
+# ``rows`` is number of stored rows, or None if not applicable.
+operation_measured = Signal(providing_args=[
+    'operation', 'duration', 'queries', 'size', 'fields', 'rows'])
+
+_enabled = None
+
+
+def is_enabled():
+    """Returns True if ``TRACKED_MODEL_INSTRUMENT`` setting is enabled"""
+    global _enabled  # pylint: disable=global-statement
+    if _enabled is None:
+        _enabled = bool(conf.get('INSTRUMENT'))
+    return _enabled
+
+
+def _reset_enabled(**kwargs):
+    """Drops cached ``is_enabled`` result when setting changes"""
+    global _enabled  # pylint: disable=global-statement
+    if kwargs['setting'] == conf.PREFIX + 'INSTRUMENT':
+        _enabled = None
+
+
+setting_changed.connect(_reset_enabled, dispatch_uid='tracked_model_instr')
+
+
+# Connection attribute with number of queries it executed, counted
+# once ``_count_queries`` is called for it
+QUERIES_FIELD = '_tracked_model_queries'
+
+
+class _CountingCursor:
+    """Cursor wrapper counting executed queries on its connection"""
+    def __init__(self, cursor, connection):
+        self._cursor = cursor
+        self._connection = connection
+
+    def __getattr__(self, name):
+        return getattr(self._cursor, name)
+
+    def __iter__(self):
+        return iter(self._cursor)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        return self._cursor.__exit__(exc_type, exc_value, traceback)
+
+    def _counted(self, method, *args):
+        count = getattr(self._connection, QUERIES_FIELD)
+        setattr(self._connection, QUERIES_FIELD, count + 1)
+        return method(*args)
+
+    def execute(self, *args):
+        return self._counted(self._cursor.execute, *args)
+
+    def executemany(self, *args):
+        return self._counted(self._cursor.executemany, *args)
+
+    def callproc(self, *args):
+        return self._counted(self._cursor.callproc, *args)
+
+
+def _count_queries(connection):
+    """Returns number of queries executed on ``connection``, counted
+    since first call for it. Cursors of the connection are wrapped,
+    its debug log (``queries_log``) is bounded and not always enabled.
+    """
+    if not hasattr(connection, QUERIES_FIELD):
+        setattr(connection, QUERIES_FIELD, 0)
+        for name in ('make_cursor', 'make_debug_cursor'):
+            make = getattr(connection, name)
+            setattr(connection, name, (
+                lambda cursor, make=make:
+                _CountingCursor(make(cursor), connection)))
+    return getattr(connection, QUERIES_FIELD)
+
+
+class Measurement:
+    """Context manager measuring single ``operation`` made on ``model``.
+
+    Queries are counted on ``using`` connection, if given. ``model``,
+    ``size``, ``fields`` and ``rows`` can be set on measurement before
+    exit, check ``active`` first if computing them costs anything.
+    """
+    active = True
+
+    def __init__(self, operation, model, using=None):
+        self.operation = operation
+        if model is not None and not isinstance(model, type):
+            model = type(model)
+        self.model = model
+        self.size = self.fields = self.rows = None
+        self._connection = connections[using] if using else None
+        self._start_queries = self._start = None
+
+    def __enter__(self):
+        if self._connection is not None:
+            self._start_queries = _count_queries(self._connection)
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        duration = time.perf_counter() - self._start
+        queries = None
+        if self._connection is not None:
+            queries = _count_queries(self._connection) - self._start_queries
+        if exc_type is None:
+            fields = self.fields
+            if fields is not None:
+                fields = list(fields)
+            operation_measured.send(
+                sender=self.model, operation=self.operation,
+                duration=duration, queries=queries, size=self.size,
+                fields=fields, rows=self.rows)
+
+
+class _NullMeasurement:
+    """Measurement used while instrumentation is disabled"""
+    active = False
+    model = size = fields = rows = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        pass
+
+    def __setattr__(self, name, value):
+        pass
+
+
+_NULL = _NullMeasurement()
+
+
+def measure(operation, model, using=None):
+    """Returns ``Measurement`` of ``operation``, or no-op context
+    manager if instrumentation is disabled
+    """
+    if _enabled is False or not is_enabled():
+        return _NULL
+    return Measurement(operation, model, using)
+
+
+# Upper bounds of histogram buckets, the last bucket is unbounded
+DURATION_BUCKETS = (
+    0.0001, 0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0)
+SIZE_BUCKETS = (64, 256, 1024, 4096, 16384, 65536, 262144)
+
+
+class Aggregator:
+    """Collects ``operation_measured`` reports in process.
+
+    Keeps counters, totals and histograms of durations and change log
+    sizes per model and operation, and counts of changed fields
+    per model. See ``get_stats``.
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._stats = {}
+        self._fields = {}
+
+    def record(self, sender, operation, duration, queries=None, size=None,
+               fields=None, rows=None, **kwargs):
+        """Records single measurement, ``operation_measured`` receiver"""
+        label = _label(sender)
+        with self._lock:
+            stats = self._stats.get((label, operation))
+            if stats is None:
+                stats = self._stats[(label, operation)] = {
+                    'count': 0, 'duration': 0.0, 'queries': 0, 'size': 0,
+                    'rows': 0,
+                    'duration_histogram': [0] * (len(DURATION_BUCKETS) + 1),
+                    'size_histogram': [0] * (len(SIZE_BUCKETS) + 1),
+                }
+            stats['count'] += 1
+            stats['duration'] += duration
+            stats['duration_histogram'][
+                bisect.bisect_left(DURATION_BUCKETS, duration)] += 1
+            stats['queries'] += queries or 0
+            stats['rows'] += rows or 0
+            if size is not None:
+                stats['size'] += size
+                stats['size_histogram'][
+                    bisect.bisect_left(SIZE_BUCKETS, size)] += 1
+            if fields:
+                self._fields.setdefault(label, Counter()).update(fields)
+
+    def get_stats(self):
+        """Returns copy of collected statistics::
+
+            {
+                'operations': {
+                    'app_label.ModelName': {
+                        operation: {
+                            'count', 'duration', 'queries', 'size',
+                            'rows', 'duration_histogram', 'size_histogram'
+                        }
+                    }
+                },
+                'fields': {'app_label.ModelName': {field: changes}}
+            }
+
+        Histograms are lists of counts of values in ``DURATION_BUCKETS``
+        and ``SIZE_BUCKETS``, plus count of greater values.
+        Operations covering many models are reported under ``'*'``.
+        """
+        with self._lock:
+            operations = {}
+            for (label, operation), stats in self._stats.items():
+                stats = dict(stats)
+                stats['duration_histogram'] = list(
+                    stats['duration_histogram'])
+                stats['size_histogram'] = list(stats['size_histogram'])
+                operations.setdefault(label, {})[operation] = stats
+            fields = {
+                label: dict(counter)
+                for label, counter in self._fields.items()
+            }
+        return {'operations': operations, 'fields': fields}
+
+    def reset(self):
+        """Drops collected statistics"""
+        with self._lock:
+            self._stats.clear()
+            self._fields.clear()
+
+
+def _label(model):
+    """Returns ``app_label.ModelName`` of ``model``, or ``'*'``"""
+    if model is None:
+        return '*'
+    if not isinstance(model, type):
+        model = type(model)
+    return '{0}.{1}'.format(model._meta.app_label, model._meta.object_name)
+
+
+aggregator = Aggregator()
+operation_measured.connect(
+    aggregator.record, dispatch_uid='tracked_model_aggregator')
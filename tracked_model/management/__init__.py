@@ -0,0 +1,11 @@
+"""Helpers shared by ``tracked_model`` management commands"""
+from django.apps import apps
+from django.core.management.base import CommandError
+
+
+def get_model(label):
+    """Returns model of ``app_label.ModelName`` ``label``"""
+    try:
+        return apps.get_model(label)
+    except (LookupError, ValueError):
+        raise CommandError('--model must be app_label.ModelName')
@@ -0,0 +1,74 @@
+"""Archive old history of tracked objects"""
+import datetime
+import gzip
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from tracked_model import conf, retention
+from tracked_model.defs import BULK_BATCH_SIZE
+from tracked_model.management import get_model
+from tracked_model.models import History
+
+
+class Command(BaseCommand):
+    """Moves ``History`` older than retention period to
+    ``ArchivedHistory`` table or gzipped NDJSON file.
+    Checkpoints are stored first, so remaining history
+    can still be materialized.
+    """
+    help = 'Archive old history of tracked objects'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--model', help='Limit to model given as app_label.ModelName')
+        parser.add_argument(
+            '--days', type=int,
+            help='Archive revisions older than N days, '
+                 'TRACKED_MODEL_RETENTION by default')
+        parser.add_argument(
+            '--file', help='Write revisions to gzipped NDJSON file '
+                           'instead of ArchivedHistory table')
+        parser.add_argument(
+            '--batch-size', type=int, default=BULK_BATCH_SIZE,
+            help='Number of revisions moved in single transaction')
+
+    def handle(self, *args, **options):
+        targets = self._targets(options['model'], options['days'])
+        if options['file']:
+            with gzip.open(options['file'], 'wt') as stream:
+                count = self._archive(targets, stream, options['batch_size'])
+        else:
+            count = self._archive(targets, None, options['batch_size'])
+        self.stdout.write('Archived {0} revisions'.format(count))
+
+    @staticmethod
+    def _targets(label, days):
+        """Returns list of ``(history, cutoff)`` to archive"""
+        if days is not None:
+            cutoff = timezone.now() - datetime.timedelta(days=days)
+            history = History.objects.all()
+            if label:
+                history = history.for_model(get_model(label))
+            return [(history, cutoff)]
+
+        if label:
+            labels = [label]
+        else:
+            labels = sorted(conf.get('RETENTION'))
+        targets = []
+        for label in labels:
+            model = get_model(label)
+            cutoff = retention.get_cutoff(model)
+            if cutoff is None:
+                raise CommandError(
+                    'No retention of {0}, use --days'.format(label))
+            targets.append((History.objects.for_model(model), cutoff))
+        return targets
+
+    @staticmethod
+    def _archive(targets, stream, batch_size):
+        """Archives ``targets``, returns number of archived revisions"""
+        return sum(
+            retention.archive(history, cutoff, stream, batch_size)
+            for history, cutoff in targets)
@@ -0,0 +1,72 @@
+"""Backfill checkpoints of tracked objects history"""
+from django.core.management.base import BaseCommand, CommandError
+from django.db import router, transaction
+
+from tracked_model import serializer, conf
+from tracked_model.defs import ActionType
+from tracked_model.management import get_model
+from tracked_model.models import History
+
+
+class Command(BaseCommand):
+    """Stores full object state in every N-th ``History`` revision,
+    or once change logs since last full state exceed N bytes.
+    Existing checkpoints are kept.
+    """
+    help = 'Backfill checkpoints of tracked objects history'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--revisions', type=int,
+            default=conf.get('CHECKPOINT_REVISIONS'),
+            help='Store checkpoint every N revisions')
+        parser.add_argument(
+            '--bytes', type=int, default=conf.get('CHECKPOINT_BYTES'),
+            help='Store checkpoint once change logs exceed N bytes')
+        parser.add_argument(
+            '--model', help='Limit to model given as app_label.ModelName')
+
+    def handle(self, *args, **options):
+        max_revisions = options['revisions']
+        max_bytes = options['bytes']
+        if not max_revisions and not max_bytes:
+            raise CommandError('Either --revisions or --bytes is required')
+
+        using = router.db_for_write(History)
+        history = History.objects.using(using)
+        if options['model']:
+            history = history.for_model(get_model(options['model']))
+        history = history.order_by(
+            'content_type', 'table_id', 'revision_ts', 'pk')
+        history = history.values_list(
+            'pk', 'content_type', 'table_id', 'action_type', 'change_log',
+            'snapshot')
+
+        obj_key = state = None
+        revisions = size = created = 0
+        with transaction.atomic(using=using):
+            for row in history.iterator():
+                pk, key, action_type, change_log, snapshot = (
+                    row[0], row[1:3], row[3], row[4], row[5])
+                if key != obj_key:
+                    obj_key, state = key, None
+                if snapshot is not None or action_type != ActionType.UPDATE:
+                    state = serializer.load_change_log(
+                        snapshot or change_log)
+                    revisions = size = 0
+                    continue
+                if state is None:
+                    continue
+
+                serializer.apply_changes(
+                    state, serializer.load_change_log(change_log))
+                revisions += 1
+                size += len(change_log)
+                if ((max_revisions and revisions >= max_revisions) or
+                        (max_bytes and size >= max_bytes)):
+                    History.objects.using(using).filter(pk=pk).update(
+                        snapshot=serializer.dump_change_log(state))
+                    revisions = size = 0
+                    created += 1
+
+        self.stdout.write('Created {0} checkpoints'.format(created))
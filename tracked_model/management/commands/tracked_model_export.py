@@ -0,0 +1,71 @@
+"""Export history of tracked objects"""
+import datetime
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+
+from tracked_model import export
+from tracked_model.defs import BULK_BATCH_SIZE
+from tracked_model.management import get_model
+from tracked_model.models import History
+
+
+class Command(BaseCommand):
+    """Writes ``History`` as NDJSON or CSV to a file or stdout.
+    Rows are read in chunks, so memory use is constant.
+    """
+    help = 'Export history of tracked objects'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--model', help='Limit to model given as app_label.ModelName')
+        parser.add_argument(
+            '--since', help='Export revisions made at or after datetime')
+        parser.add_argument(
+            '--until', help='Export revisions made before datetime')
+        parser.add_argument(
+            '--format', default='ndjson', choices=sorted(export.FORMATS))
+        parser.add_argument(
+            '--output', help='File to write to, stdout by default')
+        parser.add_argument(
+            '--chunk-size', type=int, default=BULK_BATCH_SIZE,
+            help='Number of rows read with single query')
+
+    def handle(self, *args, **options):
+        history = History.objects.all()
+        if options['model']:
+            history = history.for_model(get_model(options['model']))
+        if options['since']:
+            history = history.filter(
+                revision_ts__gte=self._datetime(options['since']))
+        if options['until']:
+            history = history.filter(
+                revision_ts__lt=self._datetime(options['until']))
+
+        if options['output']:
+            with open(options['output'], 'w', newline='') as stream:
+                count = export.export_history(
+                    history, stream, options['format'],
+                    options['chunk_size'])
+            self.stdout.write('Exported {0} revisions'.format(count))
+        else:
+            self.stdout.ending = ''
+            count = export.export_history(
+                history, self.stdout, options['format'],
+                options['chunk_size'])
+            self.stderr.write('Exported {0} revisions'.format(count))
+
+    @staticmethod
+    def _datetime(value):
+        """Returns datetime parsed from command line ``value``"""
+        parsed = parse_datetime(value)
+        if parsed is None:
+            date = parse_date(value)
+            if date is None:
+                raise CommandError('Invalid datetime: {0}'.format(value))
+            parsed = datetime.datetime.combine(date, datetime.time())
+        if settings.USE_TZ and timezone.is_naive(parsed):
+            parsed = timezone.make_aware(parsed)
+        return parsed
@@ -0,0 +1,47 @@
+"""Backfill field change index of tracked objects history"""
+from django.core.management.base import BaseCommand
+from django.db import router, transaction
+
+from tracked_model.defs import BULK_BATCH_SIZE
+from tracked_model.management import get_model
+from tracked_model.models import History, FieldChange, store_field_changes
+
+
+class Command(BaseCommand):
+    """Stores ``FieldChange`` rows of ``History`` stored without them,
+    e.g. before ``TRACKED_MODEL_FIELD_INDEX`` setting was enabled.
+    """
+    help = 'Backfill field change index of tracked objects history'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--model', help='Limit to model given as app_label.ModelName')
+        parser.add_argument(
+            '--batch-size', type=int, default=BULK_BATCH_SIZE,
+            help='Number of revisions indexed in single transaction')
+
+    def handle(self, *args, **options):
+        using = router.db_for_write(History)
+        history = History.objects.using(using).order_by('pk')
+        if options['model']:
+            history = history.for_model(get_model(options['model']))
+
+        batch_size = options['batch_size']
+        last_pk, indexed = None, 0
+        while True:
+            chunk = history
+            if last_pk is not None:
+                chunk = chunk.filter(pk__gt=last_pk)
+            hists = list(chunk[:batch_size])
+            if not hists:
+                break
+            last_pk = hists[-1].pk
+            done = set(FieldChange.objects.using(using).filter(
+                history_id__in=[x.pk for x in hists],
+            ).values_list('history_id', flat=True))
+            hists = [x for x in hists if x.pk not in done]
+            with transaction.atomic(using=using):
+                store_field_changes(hists)
+            indexed += len(hists)
+
+        self.stdout.write('Indexed {0} revisions'.format(indexed))
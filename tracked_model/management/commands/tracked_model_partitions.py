@@ -0,0 +1,74 @@
+"""Manage monthly partitions of history table"""
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections, router, transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+
+from tracked_model import partitions, retention
+from tracked_model.defs import BULK_BATCH_SIZE
+from tracked_model.models import History, FieldChange
+
+
+class Command(BaseCommand):
+    """Creates ``History`` partitions for following months and drops
+    old ones (see ``operations.PartitionHistory``). Checkpoints are
+    stored before partitions are dropped, so remaining history can
+    still be materialized. PostgreSQL only.
+    """
+    help = 'Manage monthly partitions of history table'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--ahead', type=int, default=3,
+            help='Create partitions for N following months')
+        parser.add_argument(
+            '--drop-before',
+            help='Drop partitions of months ending at or before date')
+
+    def handle(self, *args, **options):
+        connection = connections[router.db_for_write(History)]
+        if not partitions.supports_partitioning(connection):
+            raise CommandError('History partitioning requires PostgreSQL 11+')
+        table = History._meta.db_table
+        if not partitions.get_partitions(connection, table):
+            raise CommandError(
+                '{0} is not partitioned, see PartitionHistory'.format(table))
+
+        today = timezone.now().date()
+        until = today
+        for _ in range(options['ahead']):
+            until = partitions.next_month(until)
+        created = partitions.create_partitions(
+            connection, table, today, until)
+        self.stdout.write('Created {0} partitions'.format(len(created)))
+
+        if options['drop_before']:
+            before = parse_date(options['drop_before'])
+            if before is None:
+                raise CommandError('Invalid date: {0}'.format(
+                    options['drop_before']))
+            self._drop(connection, table, partitions.month_start(before))
+
+    def _drop(self, connection, table, before):
+        """Drops partitions ending at or before ``before``.
+
+        Checkpoints are stored and ``FieldChange`` rows of dropped
+        history are deleted first, in batches with own transactions,
+        so only dropping of partitions is done in single transaction.
+        """
+        cutoff = timezone.now().replace(
+            year=before.year, month=before.month, day=1,
+            hour=0, minute=0, second=0, microsecond=0)
+        using = connection.alias
+        retention.checkpoint_before(History.objects.all(), cutoff)
+        changes = FieldChange.objects.using(using)
+        old = changes.filter(revision_ts__lt=cutoff).order_by('pk')
+        while True:
+            with transaction.atomic(using=using):
+                pks = list(old.values_list('pk', flat=True)[:BULK_BATCH_SIZE])
+                if not pks:
+                    break
+                changes.filter(pk__in=pks).delete()
+        with transaction.atomic(using=using):
+            dropped = partitions.drop_partitions(connection, table, before)
+        self.stdout.write('Dropped {0} partitions'.format(len(dropped)))
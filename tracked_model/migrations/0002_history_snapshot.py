@@ -0,0 +1,19 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import models, migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tracked_model', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='history',
+            name='snapshot',
+            field=models.TextField(null=True),
+        ),
+    ]
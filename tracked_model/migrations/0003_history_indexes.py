@@ -0,0 +1,23 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import models, migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tracked_model', '0002_history_snapshot'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='history',
+            name='revision_ts',
+            field=models.DateTimeField(auto_now_add=True, db_index=True),
+        ),
+        migrations.AlterIndexTogether(
+            name='history',
+            index_together=set([('table_name', 'table_id', 'revision_ts')]),
+        ),
+    ]
@@ -0,0 +1,210 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.apps import apps as global_apps
+from django.db import models, migrations
+import tracked_model.fields
+from tracked_model import serializer
+
+
+ACTION_CODES = {'create': 1, 'update': 2, 'delete': 3}
+
+# SQL converting text column to binary, per database vendor
+TEXT_TO_BINARY = {
+    'postgresql': "convert_to({0}, 'UTF8')",
+    'sqlite': 'CAST({0} AS BLOB)',
+    'mysql': 'CAST({0} AS BINARY)',
+}
+
+
+def compact_history(apps, schema_editor):
+    """Moves data of ``History`` to compact columns"""
+    ContentType = apps.get_model('contenttypes', 'ContentType')
+    History = apps.get_model('tracked_model', 'History')
+    db_alias = schema_editor.connection.alias
+    history = History.objects.using(db_alias)
+
+    models_tracked = history.values_list('app_label', 'model_name').distinct()
+    for app_label, model_name in list(models_tracked):
+        content_type, _ = ContentType.objects.using(db_alias).get_or_create(
+            app_label=app_label, model=model_name.lower())
+        history.filter(app_label=app_label, model_name=model_name).update(
+            content_type=content_type)
+
+    for name, code in ACTION_CODES.items():
+        history.filter(action_type=name).update(action_code=code)
+
+    convert = TEXT_TO_BINARY.get(schema_editor.connection.vendor)
+    if convert is not None:
+        quote = schema_editor.quote_name
+        schema_editor.execute(
+            'UPDATE {0} SET {1} = {2}, {3} = {4}'.format(
+                quote(History._meta.db_table),
+                quote('change_log_data'),
+                convert.format(quote('change_log')),
+                quote('snapshot_data'),
+                convert.format(quote('snapshot'))))
+        return
+
+    rows = history.values_list('pk', 'change_log', 'snapshot')
+    for pk, change_log, snapshot in rows.iterator():
+        history.filter(pk=pk).update(
+            change_log_data=change_log.encode('utf-8'),
+            snapshot_data=snapshot and snapshot.encode('utf-8'))
+
+
+def expand_history(apps, schema_editor):
+    """Moves data of ``History`` back from compact columns"""
+    ContentType = apps.get_model('contenttypes', 'ContentType')
+    History = apps.get_model('tracked_model', 'History')
+    db_alias = schema_editor.connection.alias
+    history = History.objects.using(db_alias)
+
+    content_type_ids = history.values_list('content_type', flat=True)
+    content_types = ContentType.objects.using(db_alias).filter(
+        pk__in=list(content_type_ids.distinct()))
+    for content_type in content_types:
+        try:
+            model = global_apps.get_model(
+                content_type.app_label, content_type.model)
+            model_name, table_name = model.__name__, model._meta.db_table
+        except LookupError:
+            model_name = content_type.model
+            table_name = '{0}_{1}'.format(
+                content_type.app_label, content_type.model)
+        history.filter(content_type=content_type).update(
+            app_label=content_type.app_label, model_name=model_name,
+            table_name=table_name)
+
+    for name, code in ACTION_CODES.items():
+        history.filter(action_code=code).update(action_type=name)
+
+    # Values may be stored with any codec since, so they are decoded
+    rows = history.values_list('pk', 'change_log_data', 'snapshot_data')
+    for pk, change_log, snapshot in rows.iterator():
+        history.filter(pk=pk).update(
+            change_log=serializer.to_json(
+                serializer.load_change_log(change_log)),
+            snapshot=snapshot and serializer.to_json(
+                serializer.load_change_log(snapshot)))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('contenttypes', '0002_remove_content_type_name'),
+        ('tracked_model', '0003_history_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='history',
+            name='content_type',
+            field=models.ForeignKey(null=True, to='contenttypes.ContentType'),
+        ),
+        migrations.AddField(
+            model_name='history',
+            name='action_code',
+            field=tracked_model.fields.ActionTypeField(null=True, choices=[('create', 'Created'), ('update', 'Updated'), ('delete', 'Deleted')]),
+        ),
+        migrations.AddField(
+            model_name='history',
+            name='change_log_data',
+            field=models.BinaryField(null=True),
+        ),
+        migrations.AddField(
+            model_name='history',
+            name='snapshot_data',
+            field=models.BinaryField(null=True),
+        ),
+        # Removed columns are nullable first, so migration is reversible:
+        # they are added back empty and filled by ``expand_history``
+        migrations.AlterField(
+            model_name='history',
+            name='model_name',
+            field=models.TextField(null=True),
+        ),
+        migrations.AlterField(
+            model_name='history',
+            name='app_label',
+            field=models.TextField(null=True),
+        ),
+        migrations.AlterField(
+            model_name='history',
+            name='table_name',
+            field=models.TextField(null=True),
+        ),
+        migrations.AlterField(
+            model_name='history',
+            name='action_type',
+            field=models.TextField(choices=[('create', 'Created'), ('update', 'Updated'), ('delete', 'Deleted')], null=True),
+        ),
+        migrations.AlterField(
+            model_name='history',
+            name='change_log',
+            field=models.TextField(null=True),
+        ),
+        migrations.RunPython(compact_history, expand_history),
+        migrations.AlterIndexTogether(
+            name='history',
+            index_together=set([]),
+        ),
+        migrations.RemoveField(
+            model_name='history',
+            name='app_label',
+        ),
+        migrations.RemoveField(
+            model_name='history',
+            name='model_name',
+        ),
+        migrations.RemoveField(
+            model_name='history',
+            name='table_name',
+        ),
+        migrations.RemoveField(
+            model_name='history',
+            name='action_type',
+        ),
+        migrations.RemoveField(
+            model_name='history',
+            name='change_log',
+        ),
+        migrations.RemoveField(
+            model_name='history',
+            name='snapshot',
+        ),
+        migrations.RenameField(
+            model_name='history',
+            old_name='action_code',
+            new_name='action_type',
+        ),
+        migrations.RenameField(
+            model_name='history',
+            old_name='change_log_data',
+            new_name='change_log',
+        ),
+        migrations.RenameField(
+            model_name='history',
+            old_name='snapshot_data',
+            new_name='snapshot',
+        ),
+        migrations.AlterField(
+            model_name='history',
+            name='content_type',
+            field=models.ForeignKey(to='contenttypes.ContentType'),
+        ),
+        migrations.AlterField(
+            model_name='history',
+            name='action_type',
+            field=tracked_model.fields.ActionTypeField(choices=[('create', 'Created'), ('update', 'Updated'), ('delete', 'Deleted')]),
+        ),
+        migrations.AlterField(
+            model_name='history',
+            name='change_log',
+            field=models.BinaryField(),
+        ),
+        migrations.AlterIndexTogether(
+            name='history',
+            index_together=set([('content_type', 'table_id', 'revision_ts')]),
+        ),
+    ]
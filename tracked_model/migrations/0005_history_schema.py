@@ -0,0 +1,33 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('contenttypes', '0002_remove_content_type_name'),
+        ('tracked_model', '0004_compact_history'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='HistorySchema',
+            fields=[
+                ('id', models.AutoField(verbose_name='ID', primary_key=True, serialize=False, auto_created=True)),
+                ('digest', models.CharField(max_length=40)),
+                ('fields', models.TextField()),
+                ('content_type', models.ForeignKey(to='contenttypes.ContentType')),
+            ],
+        ),
+        migrations.AddField(
+            model_name='history',
+            name='schema',
+            field=models.ForeignKey(null=True, to='tracked_model.HistorySchema'),
+        ),
+        migrations.AlterUniqueTogether(
+            name='historyschema',
+            unique_together=set([('content_type', 'digest')]),
+        ),
+    ]
@@ -0,0 +1,40 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tracked_model', '0005_history_schema'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='UserAgent',
+            fields=[
+                ('id', models.AutoField(verbose_name='ID', primary_key=True, serialize=False, auto_created=True)),
+                ('digest', models.CharField(max_length=40, unique=True)),
+                ('value', models.TextField()),
+            ],
+        ),
+        migrations.CreateModel(
+            name='UserHost',
+            fields=[
+                ('id', models.AutoField(verbose_name='ID', primary_key=True, serialize=False, auto_created=True)),
+                ('digest', models.CharField(max_length=40, unique=True)),
+                ('value', models.TextField()),
+            ],
+        ),
+        migrations.AddField(
+            model_name='requestinfo',
+            name='interned_user_agent',
+            field=models.ForeignKey(null=True, to='tracked_model.UserAgent'),
+        ),
+        migrations.AddField(
+            model_name='requestinfo',
+            name='interned_user_host',
+            field=models.ForeignKey(null=True, to='tracked_model.UserHost'),
+        ),
+    ]
@@ -0,0 +1,42 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+import tracked_model.fields
+import django.db.models.deletion
+from django.conf import settings
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('contenttypes', '0002_remove_content_type_name'),
+        ('tracked_model', '0006_request_info_interning'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ArchivedHistory',
+            fields=[
+                ('id', models.IntegerField(primary_key=True, serialize=False)),
+                ('table_id', models.TextField()),
+                ('change_log', models.BinaryField()),
+                ('revision_ts', models.DateTimeField(db_index=True)),
+                ('action_type', tracked_model.fields.ActionTypeField(choices=[('create', 'Created'), ('update', 'Updated'), ('delete', 'Deleted')])),
+                ('snapshot', models.BinaryField(null=True)),
+                ('content_type', models.ForeignKey(related_name='+', on_delete=django.db.models.deletion.DO_NOTHING, to='contenttypes.ContentType', db_constraint=False)),
+                ('revision_author', models.ForeignKey(null=True, related_name='+', on_delete=django.db.models.deletion.DO_NOTHING, to=settings.AUTH_USER_MODEL, db_constraint=False)),
+                ('revision_request', models.ForeignKey(null=True, related_name='+', on_delete=django.db.models.deletion.DO_NOTHING, to='tracked_model.RequestInfo', db_constraint=False)),
+                ('schema', models.ForeignKey(null=True, related_name='+', on_delete=django.db.models.deletion.DO_NOTHING, to='tracked_model.HistorySchema', db_constraint=False)),
+            ],
+            options={
+                'ordering': ('revision_ts',),
+                'get_latest_by': 'revision_ts',
+            },
+        ),
+        migrations.AlterIndexTogether(
+            name='archivedhistory',
+            index_together=set([('content_type', 'table_id', 'revision_ts')]),
+        ),
+    ]
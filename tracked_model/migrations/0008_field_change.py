@@ -0,0 +1,34 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+from django.conf import settings
+import tracked_model.fields
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('contenttypes', '0002_remove_content_type_name'),
+        ('tracked_model', '0007_archived_history'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='FieldChange',
+            fields=[
+                ('id', models.AutoField(verbose_name='ID', primary_key=True, serialize=False, auto_created=True)),
+                ('field', models.CharField(max_length=255)),
+                ('action_type', tracked_model.fields.ActionTypeField(choices=[('create', 'Created'), ('update', 'Updated'), ('delete', 'Deleted')])),
+                ('revision_ts', models.DateTimeField()),
+                ('content_type', models.ForeignKey(related_name='+', to='contenttypes.ContentType')),
+                ('history', models.ForeignKey(related_name='field_changes', to='tracked_model.History', db_constraint=False)),
+                ('revision_author', models.ForeignKey(null=True, related_name='+', to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+        migrations.AlterIndexTogether(
+            name='fieldchange',
+            index_together=set([('content_type', 'field', 'revision_ts'), ('revision_author', 'revision_ts')]),
+        ),
+    ]
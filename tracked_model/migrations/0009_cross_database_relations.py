@@ -0,0 +1,40 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+from django.conf import settings
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tracked_model', '0008_field_change'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='fieldchange',
+            name='content_type',
+            field=models.ForeignKey(related_name='+', to='contenttypes.ContentType', db_constraint=False),
+        ),
+        migrations.AlterField(
+            model_name='fieldchange',
+            name='revision_author',
+            field=models.ForeignKey(null=True, related_name='+', to=settings.AUTH_USER_MODEL, db_constraint=False),
+        ),
+        migrations.AlterField(
+            model_name='history',
+            name='content_type',
+            field=models.ForeignKey(to='contenttypes.ContentType', db_constraint=False),
+        ),
+        migrations.AlterField(
+            model_name='history',
+            name='revision_author',
+            field=models.ForeignKey(null=True, to=settings.AUTH_USER_MODEL, db_constraint=False),
+        ),
+        migrations.AlterField(
+            model_name='historyschema',
+            name='content_type',
+            field=models.ForeignKey(to='contenttypes.ContentType', db_constraint=False),
+        ),
+    ]
@@ -0,0 +1,20 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+import tracked_model.models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tracked_model', '0009_cross_database_relations'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='history',
+            name='revision_ts',
+            field=models.DateTimeField(db_index=True, default=tracked_model.models.revision_now),
+        ),
+    ]
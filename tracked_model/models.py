@@ -1,10 +1,113 @@
 """Models and tools for access control."""
-from django.db import models
+import datetime
+import functools
+import hashlib
+import itertools
+import json
+import operator
+import threading
+
 from django.apps import apps
+from django.core.exceptions import FieldError
+from django.db import (
+    models, transaction, router, connections, DEFAULT_DB_ALIAS)
+from django.db.models import Max, Q
+from django.db.models.signals import post_migrate
 from django.conf import settings
+from django.contrib.contenttypes.models import ContentType
+from django.utils import timezone
+
+from tracked_model import serializer, conf, instrumentation, aio
+from tracked_model.fields import ActionTypeField
+from tracked_model.defs import (
+    REQUEST_CACHE_FIELD, PENDING_REQUEST_FIELD, CHANGED_FIELDS_FIELD,
+    BULK_BATCH_SIZE, ActionType, Operation)
+
+
+class CommittedIds:
+    """Cache of ids of rows known to be committed.
+
+    Ids of rows created inside atomic block are cached on commit
+    (``transaction.on_commit``), so ids of rolled back rows never are.
+    """
+    def __init__(self, max_size=None):
+        self.ids = {}
+        # Ids of rows stored by not yet committed transaction
+        self.pending = {}
+        self.max_size = max_size
+
+    def get(self, key):
+        """Returns cached id of ``key`` or None"""
+        return self.ids.get(key)
+
+    def add(self, key, pk, created, using):
+        """Caches ``pk`` of row identified by ``key``, if it's known
+        to be committed. ``created`` tells if row was just stored
+        on ``using`` connection.
+        """
+        if not transaction.get_connection(using).in_atomic_block:
+            self._committed(key, pk)
+        elif created:
+            self.pending[key] = pk
+            if hasattr(transaction, 'on_commit'):
+                transaction.on_commit(
+                    lambda: self._committed(key, pk), using=using)
+        elif key not in self.pending:
+            self._committed(key, pk)
+
+    def _committed(self, key, pk):
+        """Caches ``pk`` of committed row"""
+        if self.max_size is not None and len(self.ids) >= self.max_size:
+            self.ids.clear()
+        self.ids[key] = pk
+        self.pending.pop(key, None)
+
+    def is_pending(self, pk):
+        """Returns True if row with ``pk`` may be not committed yet"""
+        return pk in self.pending.values()
+
+    def clear(self, keys=None):
+        """Clears cached ids of ``keys``, all by default"""
+        if keys is None:
+            self.ids.clear()
+            self.pending.clear()
+        for key in keys or ():
+            self.ids.pop(key, None)
+            self.pending.pop(key, None)
+
+
+class InternedValueManager(models.Manager):
+    """Manager of lookup table of repeated strings"""
+    # Ids by model and value
+    _cache = CommittedIds(max_size=10000)
+
+    def get_id(self, value):
+        """Returns id of row holding ``value``, stored if missing"""
+        key = (self.model, value)
+        pk = self._cache.get(key)
+        if pk is not None:
+            return pk
+        obj, created = self.get_or_create(
+            digest=hashlib.sha1(value.encode('utf-8')).hexdigest(),
+            defaults={'value': value})
+        self._cache.add(key, obj.pk, created, obj._state.db)
+        return obj.pk
+
+
+class UserAgent(models.Model):
+    """Interned ``User-Agent`` header of ``RequestInfo``"""
+    digest = models.CharField(max_length=40, unique=True)
+    value = models.TextField()
 
-from tracked_model import serializer
-from tracked_model.defs import REQUEST_CACHE_FIELD, ActionType, Field
+    objects = InternedValueManager()
+
+
+class UserHost(models.Model):
+    """Interned remote host of ``RequestInfo``"""
+    digest = models.CharField(max_length=40, unique=True)
+    value = models.TextField()
+
+    objects = InternedValueManager()
 
 
 class RequestInfo(models.Model):
@@ -16,18 +119,27 @@ class RequestInfo(models.Model):
     method = models.TextField(null=True)
     referer = models.TextField(null=True)
     tstamp = models.DateTimeField(null=False, auto_now_add=True)
+    # Used instead of ``user_host`` and ``user_agent`` with
+    # ``TRACKED_MODEL_INTERN_REQUEST_INFO`` setting
+    interned_user_host = models.ForeignKey(UserHost, null=True)
+    interned_user_agent = models.ForeignKey(UserAgent, null=True)
 
     @staticmethod
-    def create_or_get_from_request(request):
+    def create_or_get_from_request(request, defer=False):
         """Returns `RequestInfo` instance.
 
         If object was already created during ``request`` it is
         returned. Otherwise new instance is created with details
         populated from ``request``. New instance is then cached for reuse
         on subsequential calls.
+
+        With ``defer``, new instance is not saved. It's stored together
+        with ``History`` referencing it, see ``store_request_infos``.
         """
         saved = getattr(request, REQUEST_CACHE_FIELD, None)
         if isinstance(saved, RequestInfo):
+            if saved.pk is None and not defer:
+                saved.save()
             return saved
         req = RequestInfo()
         req.user_ip = request.META.get('REMOTE_ADDR')
@@ -37,23 +149,469 @@ class RequestInfo(models.Model):
             request.get_full_path())
         req.method = request.META.get('REQUEST_METHOD')
         req.referer = request.META.get('HTTP_REFERER')
-        req.save()
+        if not defer:
+            req.save()
         setattr(request, REQUEST_CACHE_FIELD, req)
         return req
 
+    @staticmethod
+    def acreate_or_get_from_request(request, defer=False):
+        """Returns future of ``create_or_get_from_request``, see ``aio``"""
+        return aio.run(RequestInfo.create_or_get_from_request, request, defer)
+
+    def save(self, *args, **kwargs):
+        """Moves repeated values to lookup tables if
+        ``TRACKED_MODEL_INTERN_REQUEST_INFO`` setting is enabled.
+        """
+        using = kwargs.get('using') or router.db_for_write(RequestInfo)
+        with instrumentation.measure(
+                Operation.REQUEST_INFO_INSERT, None, using) as measurement:
+            self.intern_values()
+            super().save(*args, **kwargs)
+            measurement.rows = 1
+
+    def intern_values(self):
+        """Replaces ``user_host`` and ``user_agent`` with ids of
+        their rows in lookup tables, if interning is enabled.
+        """
+        if not conf.get('INTERN_REQUEST_INFO'):
+            return
+        if self.user_host is not None:
+            self.interned_user_host_id = UserHost.objects.get_id(
+                self.user_host)
+            self.user_host = None
+        if self.user_agent is not None:
+            self.interned_user_agent_id = UserAgent.objects.get_id(
+                self.user_agent)
+            self.user_agent = None
+
+    def get_user_host(self):
+        """Returns remote host, interned or not"""
+        if self.interned_user_host_id is not None:
+            return self.interned_user_host.value
+        return self.user_host
+
+    def get_user_agent(self):
+        """Returns ``User-Agent`` header, interned or not"""
+        if self.interned_user_agent_id is not None:
+            return self.interned_user_agent.value
+        return self.user_agent
+
+
+def store_request_infos(hists):
+    """Stores unsaved ``RequestInfo`` objects referenced by ``hists``
+    (see ``TRACKED_MODEL_DEFER_REQUEST_INFO`` setting) and sets
+    their ids on ``hists``.
+
+    Uses single query if database returns ids of bulk inserted rows,
+    otherwise one query per ``RequestInfo``.
+    """
+    pending = {}
+    for hist in hists:
+        info = hist.__dict__.get(PENDING_REQUEST_FIELD)
+        if info is not None and info.pk is None:
+            pending[id(info)] = info
+    if pending:
+        infos = list(pending.values())
+        using = router.db_for_write(RequestInfo)
+        features = connections[using].features
+        if getattr(features, 'can_return_ids_from_bulk_insert', False):
+            with instrumentation.measure(
+                    Operation.REQUEST_INFO_INSERT, None, using) as measure:
+                for info in infos:
+                    info.intern_values()
+                RequestInfo.objects.bulk_create(infos)
+                measure.rows = len(infos)
+        else:
+            for info in infos:
+                info.save()
+
+    for hist in hists:
+        info = hist.__dict__.pop(PENDING_REQUEST_FIELD, None)
+        if info is not None:
+            hist.revision_request_id = info.pk
+
+
+def _revision_chunks(history, chunk_size, key):
+    """Yields non-empty lists of up to ``chunk_size`` rows of ``history``
+    ordered by revision. Next list starts after ``(revision_ts, pk)``
+    of last row, as returned by ``key``.
+    """
+    chunk = history
+    while True:
+        rows = list(chunk[:chunk_size])
+        if rows:
+            yield rows
+        if len(rows) < chunk_size:
+            return
+        revision_ts, pk = key(rows[-1])
+        chunk = history.filter(
+            Q(revision_ts__gt=revision_ts) |
+            Q(revision_ts=revision_ts, pk__gt=pk))
+
+
+def _compose_changes(history):
+    """Returns net changes of ``history`` of single object, composed
+    from change logs in revision order, or None if it contains
+    creation or deletion. Raises ValueError if it's not of single object.
+    """
+    history = history.order_by('revision_ts', 'pk')
+    rows = history.values_list(
+        'content_type', 'table_id', 'action_type', 'change_log', 'schema')
+    changes, obj_key = {}, None
+    for row in rows.iterator():
+        if obj_key is None:
+            obj_key = row[:2]
+        elif row[:2] != obj_key:
+            raise ValueError('History of more than one object')
+        action_type, change_log, schema_id = row[2:]
+        if action_type != ActionType.UPDATE:
+            changes = None
+        if changes is None:
+            continue
+        change_log = serializer.load_change_log(change_log)
+        if schema_id is not None:
+            schema = HistorySchema.objects.get_fields(schema_id)
+            serializer.apply_schema(change_log, schema)
+        changes = serializer.merge_changes(changes, change_log)
+    return changes
+
+
+def _stream_record(row):
+    """Returns dict of ``History`` row of ``STREAM_FIELDS`` values"""
+    (pk, content_type_id, table_id, action_type, revision_ts, author_id,
+     request_id, schema_id, change_log) = row
+    content_type = ContentType.objects.get_for_id(content_type_id)
+    change_log = serializer.load_change_log(change_log)
+    if schema_id is not None:
+        schema = HistorySchema.objects.get_fields(schema_id)
+        serializer.apply_schema(change_log, schema)
+    return {
+        'id': pk,
+        'app_label': content_type.app_label,
+        'model': content_type.model,
+        'table_id': table_id,
+        'action_type': action_type,
+        'revision_ts': revision_ts,
+        'revision_author': author_id,
+        'revision_request': request_id,
+        'change_log': change_log,
+    }
+
+
+def _replay(rows):
+    """Returns state (see ``serializer.dump_model``) of an object after
+    ``rows`` of its ``History`` given as ``(action_type, change_log,
+    snapshot)`` tuples ordered by revision.
+
+    Replay starts from the last checkpoint, creation or deletion.
+    Returns None if object was deleted or its creation is missing.
+    """
+    start = None
+    for index, (action_type, _, snapshot) in enumerate(rows):
+        if snapshot is not None or action_type != ActionType.UPDATE:
+            start = index
+    if start is None:
+        return None
+
+    action_type, change_log, snapshot = rows[start]
+    if snapshot is None and action_type == ActionType.DELETE:
+        return None
+    data = serializer.load_change_log(snapshot or change_log)
+    for _, change_log, _ in rows[start + 1:]:
+        serializer.apply_changes(data, serializer.load_change_log(change_log))
+    return data
+
+
+# ``History`` columns read by ``HistoryQuerySet.stream``
+STREAM_FIELDS = (
+    'pk', 'content_type', 'table_id', 'action_type', 'revision_ts',
+    'revision_author', 'revision_request', 'schema', 'change_log')
+
+
+# Columns of tracked model removed by compact storage (migration 0004),
+# with functions returning their value for a model
+COMPAT_FIELDS = {
+    'app_label': lambda model: model._meta.app_label,
+    'model_name': lambda model: model.__name__,
+    'table_name': lambda model: model._meta.db_table,
+}
+
+
+def _pop_compat_lookups(lookups):
+    """Removes exact and ``in`` lookups of ``COMPAT_FIELDS`` from
+    ``lookups`` dict and returns content types of models matching all
+    of them, or None if there are no such lookups.
+    """
+    matched = None
+    for lookup in list(lookups):
+        name, _, kind = lookup.partition('__')
+        if name not in COMPAT_FIELDS:
+            continue
+        if kind not in ('', 'exact', 'in'):
+            raise FieldError(
+                'Unsupported lookup {0!r} of History.{1}'.format(kind, name))
+        value = lookups.pop(lookup)
+        values = set(value) if kind == 'in' else {value}
+        found = {
+            model for model in apps.get_models()
+            if COMPAT_FIELDS[name](model) in values
+        }
+        matched = found if matched is None else matched & found
+    if matched is None:
+        return None
+    return list(ContentType.objects.get_for_models(*matched).values())
+
+
+class HistoryQuerySet(models.QuerySet):
+    """``History`` queryset"""
+    def _filter_or_exclude(self, negate, *args, **kwargs):
+        # Columns of tracked model are stored as ``content_type``
+        # since compact storage, old lookups are still supported
+        content_types = _pop_compat_lookups(kwargs)
+        if content_types is not None:
+            args += (Q(content_type__in=content_types),)
+        return super()._filter_or_exclude(negate, *args, **kwargs)
+
+    def stream(self, chunk_size=BULK_BATCH_SIZE):
+        """Yields matched ``History`` as dicts with decoded change logs
+        (see ``History.get_change_log``), ordered by revision.
+
+        Rows are fetched in chunks of ``chunk_size`` with keyset
+        pagination on ``(revision_ts, id)``, so memory use doesn't grow
+        with number of rows and no model instances are built.
+        """
+        history = self.order_by('revision_ts', 'pk')
+        history = history.values_list(*STREAM_FIELDS)
+        chunks = _revision_chunks(
+            history, chunk_size, lambda row: (row[4], row[0]))
+        for rows in chunks:
+            for row in rows:
+                yield _stream_record(row)
+
+    def aiterator(self, chunk_size=BULK_BATCH_SIZE):
+        """Returns asynchronous iterator of matched ``History``, ordered
+        by revision. Chunks of ``chunk_size`` objects are fetched in pool
+        thread (see ``aio``), with keyset pagination like ``stream``.
+        """
+        history = self.order_by('revision_ts', 'pk')
+        return aio.ChunkIterator(_revision_chunks(
+            history, chunk_size, lambda hist: (hist.revision_ts, hist.pk)))
+
+    def __aiter__(self):
+        return self.aiterator()
+
+    def for_model(self, model):
+        """Returns history of ``model`` objects"""
+        content_type = ContentType.objects.get_for_model(model)
+        return self.filter(content_type=content_type)
+
+    def as_of(self, model, pks, timestamp):
+        """Returns dict of unsaved ``model`` instances keyed by pk,
+        with state they had at ``timestamp``.
+
+        Objects from ``pks`` which didn't exist at ``timestamp`` are
+        skipped. History of each ``BULK_BATCH_SIZE`` objects is read
+        with two queries: first finds the latest checkpoint, creation or
+        deletion of each object, second fetches only rows since then,
+        which are replayed.
+        """
+        opts = model._meta
+        history = self.for_model(model).filter(revision_ts__lte=timestamp)
+        objs = {}
+        table_ids = sorted({str(pk) for pk in pks})
+        for batch in serializer.batches(table_ids):
+            starts = history.filter(table_id__in=batch).filter(
+                Q(snapshot__isnull=False) | ~Q(action_type=ActionType.UPDATE))
+            starts = starts.order_by().values('table_id').annotate(
+                start=Max('revision_ts'))
+            by_start = {}
+            for row in starts:
+                by_start.setdefault(row['start'], []).append(row['table_id'])
+            if not by_start:
+                continue
+            since = functools.reduce(operator.or_, (
+                Q(table_id__in=batch_ids, revision_ts__gte=start)
+                for start, batch_ids in by_start.items()))
+            rows = history.filter(since).order_by(
+                'table_id', 'revision_ts', 'pk').values_list(
+                    'table_id', 'action_type', 'change_log', 'snapshot')
+            table_id, pending = None, []
+            for row in itertools.chain(rows.iterator(), [(None,) * 4]):
+                if row[0] != table_id:
+                    data = _replay(pending)
+                    if data is not None:
+                        obj = serializer.restore_model(model, data)
+                        obj.pk = opts.pk.to_python(table_id)
+                        objs[obj.pk] = obj
+                    table_id, pending = row[0], []
+                if row[3] is not None or row[1] != ActionType.UPDATE:
+                    pending = []
+                pending.append(row[1:])
+
+        return objs
+
+    def field_changes(self, field, model=None, author=None, since=None,
+                      until=None):
+        """Returns matched ``History`` changing ``field`` of ``model``
+        objects, made by ``author`` between ``since`` (inclusive) and
+        ``until`` (exclusive).
+
+        Uses ``FieldChange`` index (see ``TRACKED_MODEL_FIELD_INDEX``
+        setting), so change logs aren't decoded and only matching
+        rows are read. History stored without index isn't matched.
+        """
+        changes = FieldChange.objects.filter(field=field)
+        if model is not None:
+            changes = changes.filter(
+                content_type=ContentType.objects.get_for_model(model))
+        if author is not None:
+            changes = changes.filter(revision_author=author)
+        if since is not None:
+            changes = changes.filter(revision_ts__gte=since)
+        if until is not None:
+            changes = changes.filter(revision_ts__lt=until)
+        return self.filter(pk__in=changes.values('history_id'))
+
+    def diff(self, since, until=None):
+        """Returns net changes (see ``History.get_change_log``) between
+        states of single object at ``since`` and at ``until`` (latest by
+        default), like those of ``as_of``. Change logs of matched
+        ``History`` made in between are composed with single query.
+
+        Returns None if object was created or deleted in between.
+        Raises ValueError if matched history is of more than one object.
+        """
+        history = self.filter(revision_ts__gt=since)
+        if until is not None:
+            history = history.filter(revision_ts__lte=until)
+        return _compose_changes(history)
+
+
+class HistorySchemaManager(models.Manager):
+    """``HistorySchema`` manager caching schemas like
+    ``ContentTypeManager`` caches content types.
+
+    Schemas are cached only once they are known to be committed, so
+    ``History`` never references schema of rolled back transaction.
+    """
+    # Schema ids by model, schema fields by id
+    _cache = CommittedIds()
+    _fields_cache = {}
+
+    def get_for_model(self, model):
+        """Returns id of ``HistorySchema`` of current ``model`` fields"""
+        model = model._meta.concrete_model
+        schema_id = self._cache.get(model)
+        if schema_id is not None:
+            return schema_id
+
+        fields = json.dumps(serializer.dump_schema(model), sort_keys=True)
+        schema, created = self.get_or_create(
+            content_type=ContentType.objects.get_for_model(model),
+            digest=hashlib.sha1(fields.encode('utf-8')).hexdigest(),
+            defaults={'fields': fields})
+        self._cache.add(model, schema.pk, created, schema._state.db)
+        return schema.pk
+
+    def get_fields(self, schema_id):
+        """Returns fields dict (see ``serializer.dump_schema``) of
+        ``HistorySchema`` with ``schema_id``.
+        """
+        fields = self._fields_cache.get(schema_id)
+        if fields is None:
+            fields = json.loads(self.get(pk=schema_id).fields)
+            if not self._cache.is_pending(schema_id):
+                self._fields_cache[schema_id] = fields
+        return fields
+
+    def clear_cache(self, models=None):
+        """Clears cached schemas of ``models``, all by default"""
+        self._cache.clear(models)
+        self._fields_cache.clear()
+
+
+class HistorySchema(models.Model):
+    """Field types and relations of tracked model.
+    ``History`` references its schema instead of storing them
+    in every change log. New schema is stored when model fields change.
+    """
+    content_type = models.ForeignKey(ContentType, db_constraint=False)
+    digest = models.CharField(max_length=40)
+    fields = models.TextField()
+
+    objects = HistorySchemaManager()
+
+    class Meta:
+        """HistorySchema meta options"""
+        unique_together = (('content_type', 'digest'),)
+
+
+def create_schemas(app_config, using=DEFAULT_DB_ALIAS, **kwargs):
+    """Stores ``HistorySchema`` of tracked models of ``app_config``
+    after migration or flush, so they are committed before any
+    ``History`` references them.
+    """
+    from tracked_model.control import TrackedModelMixin
+    tracked = [
+        model for model in app_config.get_models()
+        if issubclass(model, TrackedModelMixin)
+    ]
+    manager = HistorySchema.objects.db_manager(using)
+    manager.clear_cache(tracked)
+    if (not tracked or not router.allow_migrate_model(using, HistorySchema) or
+            router.db_for_write(HistorySchema) != using):
+        return
+    tables = connections[using].introspection.table_names()
+    if HistorySchema._meta.db_table not in tables:
+        return
+    for model in tracked:
+        manager.get_for_model(model)
+
+
+post_migrate.connect(create_schemas, dispatch_uid='tracked_model_schemas')
+
+
+_last_revision_ts = None
+_revision_ts_lock = threading.Lock()
+
+
+def revision_now():
+    """Returns time of revision made now, later than any returned before
+    by this process. ``History`` is ordered by ``revision_ts`` of its
+    creation, even when it's stored later (see ``buffer`` and ``writer``).
+    """
+    global _last_revision_ts  # pylint: disable=global-statement
+    now = timezone.now()
+    with _revision_ts_lock:
+        last = _last_revision_ts
+        if (last is not None and now <= last and
+                timezone.is_aware(now) == timezone.is_aware(last)):
+            now = last + datetime.timedelta(microseconds=1)
+        _last_revision_ts = now
+    return now
+
 
 class History(models.Model):
     """Stores history of changes to ``TrackedModel``"""
-    model_name = models.TextField()
-    app_label = models.TextField()
-    table_name = models.TextField()
+    # No constraints on models of other apps, so history can be
+    # stored in another database, see ``routers.HistoryRouter``
+    content_type = models.ForeignKey(ContentType, db_constraint=False)
     table_id = models.TextField()
-    change_log = models.TextField()
+    change_log = models.BinaryField()
     revision_author = models.ForeignKey(
-        settings.AUTH_USER_MODEL, null=True)
-    revision_ts = models.DateTimeField(auto_now_add=True)
+        settings.AUTH_USER_MODEL, null=True, db_constraint=False)
+    # Set on creation rather than on insert, see ``revision_now``
+    revision_ts = models.DateTimeField(default=revision_now, db_index=True)
     revision_request = models.ForeignKey('RequestInfo', null=True)
-    action_type = models.TextField(choices=ActionType.CHOICES)
+    action_type = ActionTypeField(choices=ActionType.CHOICES)
+    # Full state of object after this revision, see ``materialize``
+    snapshot = models.BinaryField(null=True)
+    # Field types and relations of change log and snapshot,
+    # stored inline if missing
+    schema = models.ForeignKey(HistorySchema, null=True)
+
+    objects = HistoryQuerySet.as_manager()
 
     def __str__(self):
         template = '{0.model_name}/{0.revision_ts}/{0.revision_author}'
@@ -61,14 +619,51 @@ class History(models.Model):
 
     class Meta:
         """History meta options"""
-        index_together = (('table_name', 'table_id'),)
+        # Matches ``TrackedModelMixin.tracked_model_history`` and
+        # ``materialize`` lookups, see also ``operations.AddHistoryIndex``
+        index_together = (('content_type', 'table_id', 'revision_ts'),)
         ordering = ('revision_ts',)
         get_latest_by = 'revision_ts'
 
+    @property
+    def model_name(self):
+        """Returns name of tracked model"""
+        return self._tracked_model.__name__
+
+    @property
+    def app_label(self):
+        """Returns app label of tracked model"""
+        return self.content_type.app_label
+
+    @property
+    def table_name(self):
+        """Returns db table of tracked model"""
+        return self._tracked_model._meta.db_table
+
     @property
     def _tracked_model(self):
         """Returns model tracked by this instance of ``History``"""
-        return apps.get_model(self.app_label, self.model_name)
+        content_type = ContentType.objects.get_for_id(self.content_type_id)
+        return content_type.model_class()
+
+    def get_change_log(self):
+        """Returns ``change_log`` dict with field types and relations"""
+        return self._with_schema(serializer.load_change_log(self.change_log))
+
+    def get_snapshot(self):
+        """Returns ``snapshot`` dict with field types and relations,
+        or None if this ``History`` is not a checkpoint.
+        """
+        if self.snapshot is None:
+            return None
+        return self._with_schema(serializer.load_change_log(self.snapshot))
+
+    def _with_schema(self, data):
+        """Returns ``data`` with field types and relations of schema"""
+        if self.schema_id is None:
+            return data
+        schema = HistorySchema.objects.get_fields(self.schema_id)
+        return serializer.apply_schema(data, schema)
 
     def get_current_object(self):
         """Returns current instance of ``TrackedModel``
@@ -81,28 +676,147 @@ class History(models.Model):
         current ``History`` snapshot.
         To rollback to current snapshot, simply call ``save``
         on materialized object.
+
+        Restored m2m values are stored in ``M2M_CACHE_FIELD`` dict.
+        """
+        model = self._tracked_model
+        with instrumentation.measure(
+                Operation.MATERIALIZE, model, self._state.db):
+            return serializer.restore_model(model, self.get_state())
+
+    def diff(self, other):
+        """Returns net changes (see ``get_change_log``) from state after
+        this revision to state after ``other`` revision of the same
+        object. Change logs of revisions in between are composed with
+        single query, changes to earlier ``other`` are reversed.
+
+        Returns None if object was created or deleted in between.
+        """
+        if (other.content_type_id != self.content_type_id or
+                str(other.table_id) != str(self.table_id)):
+            raise ValueError('Revisions of different objects')
+        start, end = sorted(
+            (self, other), key=lambda x: (x.revision_ts, x.pk))
+        if start.action_type == ActionType.DELETE:
+            return None
+
+        history = History.objects.using(self._state.db).filter(
+            content_type_id=self.content_type_id, table_id=self.table_id)
+        history = history.filter(
+            Q(revision_ts__gt=start.revision_ts) |
+            Q(revision_ts=start.revision_ts, pk__gt=start.pk))
+        history = history.filter(
+            Q(revision_ts__lt=end.revision_ts) |
+            Q(revision_ts=end.revision_ts, pk__lte=end.pk))
+        changes = _compose_changes(history)
+        if changes is None or start is self:
+            return changes
+        return serializer.reverse_changes(changes)
+
+    def amaterialize(self):
+        """Returns future of ``materialize``, see ``aio``"""
+        return aio.run(self.materialize)
+
+    def get_state(self):
+        """Returns state (see ``serializer.dump_model``) of object
+        after this revision.
+
+        Changes are replayed from the latest checkpoint (``History``
+        with ``snapshot``) made at or before current one, or from
+        object creation if there is none.
         """
         if self.action_type == ActionType.DELETE:
             # On deletion current state is dumped to change_log
             # so it's enough to just restore it to object
-            data = serializer.from_json(self.change_log)
-            obj = serializer.restore_model(self._tracked_model, data)
-            return obj
-
-        changes = History.objects.filter(
-            model_name=self.model_name, app_label=self.app_label,
-            table_id=self.table_id)
-        changes = changes.filter(revision_ts__lte=self.revision_ts)
-        changes = list(changes.order_by('revision_ts'))
-
-        creation = changes.pop(0)
-        data = serializer.from_json(creation.change_log)
-        obj = serializer.restore_model(self._tracked_model, data)
-
-        for change in changes:
-            change_log = serializer.from_json(change.change_log)
-            for field in change_log:
-                next_val = change_log[field][Field.NEW]
-                setattr(obj, field, next_val)
-
-        return obj
+            return serializer.load_change_log(self.change_log)
+        if self.snapshot is not None:
+            return serializer.load_change_log(self.snapshot)
+
+        history = History.objects.using(self._state.db).filter(
+            content_type_id=self.content_type_id, table_id=self.table_id)
+        history = history.filter(
+            Q(revision_ts__lt=self.revision_ts) |
+            Q(revision_ts=self.revision_ts, pk__lte=self.pk))
+        checkpoint = history.exclude(snapshot=None)
+        checkpoint = checkpoint.order_by('-revision_ts', '-pk').first()
+        if checkpoint is not None:
+            history = history.filter(
+                Q(revision_ts__gt=checkpoint.revision_ts) |
+                Q(revision_ts=checkpoint.revision_ts, pk__gte=checkpoint.pk))
+        history = history.order_by('revision_ts', 'pk')
+        rows = list(history.values_list(
+            'action_type', 'change_log', 'snapshot'))
+        return _replay(rows)
+
+
+class ArchivedHistory(models.Model):
+    """``History`` moved out of ``History`` table by
+    ``retention.archive``. Keeps pk of original ``History``.
+    """
+    id = models.IntegerField(primary_key=True)
+    content_type = models.ForeignKey(
+        ContentType, on_delete=models.DO_NOTHING, db_constraint=False,
+        related_name='+')
+    table_id = models.TextField()
+    change_log = models.BinaryField()
+    revision_author = models.ForeignKey(
+        settings.AUTH_USER_MODEL, null=True, on_delete=models.DO_NOTHING,
+        db_constraint=False, related_name='+')
+    revision_ts = models.DateTimeField(db_index=True)
+    revision_request = models.ForeignKey(
+        RequestInfo, null=True, on_delete=models.DO_NOTHING,
+        db_constraint=False, related_name='+')
+    action_type = ActionTypeField(choices=ActionType.CHOICES)
+    snapshot = models.BinaryField(null=True)
+    schema = models.ForeignKey(
+        HistorySchema, null=True, on_delete=models.DO_NOTHING,
+        db_constraint=False, related_name='+')
+
+    class Meta:
+        """ArchivedHistory meta options"""
+        index_together = (('content_type', 'table_id', 'revision_ts'),)
+        ordering = ('revision_ts',)
+        get_latest_by = 'revision_ts'
+
+
+class FieldChange(models.Model):
+    """Field changed by ``History``, see ``TRACKED_MODEL_FIELD_INDEX``
+    setting and ``HistoryQuerySet.field_changes``
+    """
+    # No constraint, so ``History`` table can be partitioned
+    history = models.ForeignKey(
+        History, db_constraint=False, related_name='field_changes')
+    content_type = models.ForeignKey(
+        ContentType, db_constraint=False, related_name='+')
+    field = models.CharField(max_length=255)
+    action_type = ActionTypeField(choices=ActionType.CHOICES)
+    revision_author = models.ForeignKey(
+        settings.AUTH_USER_MODEL, null=True, db_constraint=False,
+        related_name='+')
+    revision_ts = models.DateTimeField()
+
+    class Meta:
+        """FieldChange meta options"""
+        index_together = (
+            ('content_type', 'field', 'revision_ts'),
+            ('revision_author', 'revision_ts'),
+        )
+
+
+def store_field_changes(hists):
+    """Stores ``FieldChange`` of every field changed by saved ``hists``
+    with single query per ``BULK_BATCH_SIZE`` rows
+    """
+    changes = []
+    for hist in hists:
+        fields = hist.__dict__.pop(CHANGED_FIELDS_FIELD, None)
+        if fields is None:
+            fields = serializer.load_change_log(hist.change_log)
+        changes.extend(
+            FieldChange(
+                history_id=hist.pk, content_type_id=hist.content_type_id,
+                field=field, action_type=hist.action_type,
+                revision_author_id=hist.revision_author_id,
+                revision_ts=hist.revision_ts)
+            for field in fields)
+    FieldChange.objects.bulk_create(changes, batch_size=BULK_BATCH_SIZE)
@@ -0,0 +1,97 @@
+"""Migration operations"""
+from django.db.migrations.operations.base import Operation
+from django.utils import timezone
+
+from tracked_model import partitions
+
+
+class AddHistoryIndex(Operation):
+    """Creates index ``name`` on ``History`` ``fields``.
+
+    Intended for project migrations (depending on latest
+    ``tracked_model`` migration) adding indexes for project specific
+    audit queries, e.g. by author and time range::
+
+        AddHistoryIndex(
+            'history_author_ts', ['revision_author', 'revision_ts'])
+    """
+    reduces_to_sql = True
+    reversible = True
+
+    def __init__(self, name, fields):
+        self.name = name
+        self.fields = fields
+
+    def deconstruct(self):
+        kwargs = {'name': self.name, 'fields': self.fields}
+        return (self.__class__.__name__, [], kwargs)
+
+    def state_forwards(self, app_label, state):
+        pass
+
+    def _sql_params(self, schema_editor, model):
+        """Returns params for schema editor index sql templates"""
+        quote = schema_editor.quote_name
+        columns = [model._meta.get_field(x).column for x in self.fields]
+        return {
+            'name': quote(self.name),
+            'table': quote(model._meta.db_table),
+            'columns': ', '.join(quote(x) for x in columns),
+            'using': '',
+            'extra': '',
+        }
+
+    def database_forwards(self, app_label, schema_editor, from_state,
+                          to_state):
+        model = to_state.apps.get_model('tracked_model', 'History')
+        if self.allow_migrate_model(schema_editor.connection.alias, model):
+            params = self._sql_params(schema_editor, model)
+            schema_editor.execute(schema_editor.sql_create_index % params)
+
+    def database_backwards(self, app_label, schema_editor, from_state,
+                           to_state):
+        model = from_state.apps.get_model('tracked_model', 'History')
+        if self.allow_migrate_model(schema_editor.connection.alias, model):
+            params = self._sql_params(schema_editor, model)
+            schema_editor.execute(schema_editor.sql_delete_index % params)
+
+    def describe(self):
+        return 'Create index {0} on History ({1})'.format(
+            self.name, ', '.join(self.fields))
+
+
+class PartitionHistory(Operation):
+    """Converts ``History`` table to table partitioned by month of
+    ``revision_ts`` (see ``partitions``), with partitions for existing
+    rows and ``months_ahead`` following months. Existing rows are
+    copied, so run it before history grows large.
+
+    Only PostgreSQL 11+ is supported, on other databases it does
+    nothing. Intended for project migrations, like ``AddHistoryIndex``.
+    """
+    reduces_to_sql = False
+    reversible = False
+
+    def __init__(self, months_ahead=3):
+        self.months_ahead = months_ahead
+
+    def deconstruct(self):
+        kwargs = {'months_ahead': self.months_ahead}
+        return (self.__class__.__name__, [], kwargs)
+
+    def state_forwards(self, app_label, state):
+        pass
+
+    def database_forwards(self, app_label, schema_editor, from_state,
+                          to_state):
+        connection = schema_editor.connection
+        model = to_state.apps.get_model('tracked_model', 'History')
+        if (self.allow_migrate_model(connection.alias, model) and
+                partitions.supports_partitioning(connection)):
+            until = timezone.now().date()
+            for _ in range(self.months_ahead):
+                until = partitions.next_month(until)
+            partitions.partition_table(schema_editor, model, until)
+
+    def describe(self):
+        return 'Partition History by month'
@@ -0,0 +1,148 @@
+"""Monthly partitions of ``History`` table on PostgreSQL.
+
+``History`` table is converted to table partitioned by range of
+``revision_ts`` with ``operations.PartitionHistory``. Partitions are
+named ``<table>_pYYYYMM``, rows outside of them go to ``<table>_default``.
+"""
+import datetime
+import re
+
+
+def supports_partitioning(connection):
+    """Returns True if ``connection`` supports declarative partitioning
+    with default partition (PostgreSQL 11+)
+    """
+    return (connection.vendor == 'postgresql' and
+            connection.pg_version >= 110000)
+
+
+def month_start(value):
+    """Returns first day of month of ``value`` date"""
+    return datetime.date(value.year, value.month, 1)
+
+
+def next_month(value):
+    """Returns first day of month following ``value`` date"""
+    if value.month == 12:
+        return datetime.date(value.year + 1, 1, 1)
+    return datetime.date(value.year, value.month + 1, 1)
+
+
+def partition_name(table, month):
+    """Returns name of ``table`` partition of ``month``"""
+    return '{0}_p{1:%Y%m}'.format(table, month)
+
+
+def get_partitions(connection, table):
+    """Returns sorted list of first days of months
+    ``table`` has partitions for
+    """
+    with connection.cursor() as cursor:
+        cursor.execute(
+            'SELECT child.relname FROM pg_inherits '
+            'JOIN pg_class child ON child.oid = pg_inherits.inhrelid '
+            'JOIN pg_class parent ON parent.oid = pg_inherits.inhparent '
+            'WHERE parent.relname = %s', [table])
+        names = [x[0] for x in cursor.fetchall()]
+
+    pattern = re.compile(r'^{0}_p(\d{{4}})(\d{{2}})$'.format(re.escape(table)))
+    months = []
+    for name in names:
+        match = pattern.match(name)
+        if match is not None:
+            months.append(datetime.date(
+                int(match.group(1)), int(match.group(2)), 1))
+    return sorted(months)
+
+
+def create_partitions(connection, table, since, until):
+    """Creates missing ``table`` partitions for months
+    from ``since`` date up to and including ``until`` date.
+    Returns list of first days of created months.
+    """
+    existing = set(get_partitions(connection, table))
+    quote = connection.ops.quote_name
+    created = []
+    month = month_start(since)
+    with connection.cursor() as cursor:
+        while month <= until:
+            if month not in existing:
+                cursor.execute(
+                    'CREATE TABLE {0} PARTITION OF {1} '
+                    'FOR VALUES FROM (%s) TO (%s)'.format(
+                        quote(partition_name(table, month)), quote(table)),
+                    [month.isoformat(), next_month(month).isoformat()])
+                created.append(month)
+            month = next_month(month)
+    return created
+
+
+def drop_partitions(connection, table, before):
+    """Drops ``table`` partitions of months ending at or before
+    ``before`` date. Returns list of first days of dropped months.
+
+    Store checkpoints first (see ``retention.checkpoint_before``),
+    so remaining history can be materialized.
+    """
+    quote = connection.ops.quote_name
+    dropped = []
+    with connection.cursor() as cursor:
+        for month in get_partitions(connection, table):
+            if next_month(month) > before:
+                break
+            cursor.execute('DROP TABLE {0}'.format(
+                quote(partition_name(table, month))))
+            dropped.append(month)
+    return dropped
+
+
+def partition_table(schema_editor, model, until):
+    """Converts ``model`` table to table partitioned by month of
+    ``revision_ts``, with partitions for months from the oldest row
+    up to and including ``until`` date, and copies existing rows.
+
+    Primary key becomes ``(id, revision_ts)``, foreign keys
+    from ``History`` table are not recreated.
+    """
+    connection = schema_editor.connection
+    quote = schema_editor.quote_name
+    table = model._meta.db_table
+    old_table = table + '_unpartitioned'
+    id_column = model._meta.pk.column
+    ts_column = model._meta.get_field('revision_ts').column
+
+    schema_editor.execute('ALTER TABLE {0} RENAME TO {1}'.format(
+        quote(table), quote(old_table)))
+    schema_editor.execute(
+        'CREATE TABLE {0} (LIKE {1} INCLUDING DEFAULTS '
+        'INCLUDING CONSTRAINTS) PARTITION BY RANGE ({2})'.format(
+            quote(table), quote(old_table), quote(ts_column)))
+    schema_editor.execute('ALTER TABLE {0} ADD PRIMARY KEY ({1}, {2})'.format(
+        quote(table), quote(id_column), quote(ts_column)))
+    schema_editor.execute('CREATE TABLE {0} PARTITION OF {1} DEFAULT'.format(
+        quote(table + '_default'), quote(table)))
+
+    # Partitioned indexes, created on every partition
+    for fields in [('revision_ts',)] + list(model._meta.index_together):
+        columns = [model._meta.get_field(x).column for x in fields]
+        schema_editor.execute('CREATE INDEX {0} ON {1} ({2})'.format(
+            quote('{0}_{1}_part'.format(table, '_'.join(columns))),
+            quote(table), ', '.join(quote(x) for x in columns)))
+
+    with connection.cursor() as cursor:
+        cursor.execute('SELECT MIN({0}) FROM {1}'.format(
+            quote(ts_column), quote(old_table)))
+        oldest = cursor.fetchone()[0]
+    create_partitions(
+        connection, table, oldest.date() if oldest else until, until)
+
+    schema_editor.execute('INSERT INTO {0} SELECT * FROM {1}'.format(
+        quote(table), quote(old_table)))
+    # Keep id sequence, owned by renamed table
+    with connection.cursor() as cursor:
+        cursor.execute('SELECT pg_get_serial_sequence(%s, %s)',
+                       [old_table, id_column])
+        sequence = cursor.fetchone()[0]
+    schema_editor.execute('ALTER SEQUENCE {0} OWNED BY {1}.{2}'.format(
+        sequence, quote(table), quote(id_column)))
+    schema_editor.execute('DROP TABLE {0}'.format(quote(old_table)))
@@ -0,0 +1,174 @@
+"""Retention of ``History``: archiving of old revisions"""
+import datetime
+
+from django.db import router, transaction
+from django.db.models import BooleanField, Case, Q, Value, When
+from django.utils import timezone
+
+from tracked_model import conf, export, serializer
+from tracked_model.defs import ActionType, BULK_BATCH_SIZE
+from tracked_model.models import History, ArchivedHistory
+
+
+def get_retention(model):
+    """Returns ``timedelta`` history of ``model`` is kept for
+    (see ``TRACKED_MODEL_RETENTION``), or None to keep it forever
+    """
+    label = '{0}.{1}'.format(model._meta.app_label, model._meta.object_name)
+    days = conf.get('RETENTION').get(label)
+    if days is None:
+        return None
+    return datetime.timedelta(days=days)
+
+
+def get_cutoff(model):
+    """Returns datetime history of ``model`` made before
+    should be archived, or None
+    """
+    retention = get_retention(model)
+    if retention is None:
+        return None
+    return timezone.now() - retention
+
+
+def _objects(history, cutoff, batch_size):
+    """Yields lists of ``(content_type_id, table_id)`` of objects
+    with ``history`` revisions made before ``cutoff``
+    """
+    keys = history.filter(revision_ts__lt=cutoff)
+    keys = keys.order_by('content_type', 'table_id')
+    keys = keys.values_list('content_type', 'table_id').distinct()
+    chunk = keys
+    while True:
+        rows = list(chunk[:batch_size])
+        if rows:
+            yield rows
+        if len(rows) < batch_size:
+            return
+        content_type_id, table_id = rows[-1]
+        chunk = keys.filter(
+            Q(content_type__gt=content_type_id) |
+            Q(content_type=content_type_id, table_id__gt=table_id))
+
+
+def _boundaries(content_type_id, table_ids, cutoff, using):
+    """Returns dict of ``(last revision before cutoff, first revision
+    at or after cutoff)`` rows keyed by ``table_id``.
+    Rows are ``(pk, action_type, has snapshot)`` tuples, or None.
+    """
+    history = History.objects.using(using).filter(
+        content_type_id=content_type_id, table_id__in=table_ids)
+    history = history.order_by('table_id', 'revision_ts', 'pk')
+    # Only tells if there is ``snapshot``, without reading it
+    history = history.annotate(has_snapshot=Case(
+        When(snapshot__isnull=True, then=Value(False)),
+        default=Value(True), output_field=BooleanField()))
+    history = history.values_list(
+        'pk', 'table_id', 'revision_ts', 'action_type', 'has_snapshot')
+
+    boundaries = {}
+    for pk, table_id, revision_ts, action_type, has_snapshot in history:
+        last, first = boundaries.get(table_id, (None, None))
+        row = (pk, action_type, has_snapshot)
+        if revision_ts < cutoff:
+            boundaries[table_id] = (row, first)
+        elif first is None:
+            boundaries[table_id] = (last, row)
+    return boundaries
+
+
+def checkpoint_before(history, cutoff, batch_size=BULK_BATCH_SIZE):
+    """Stores checkpoints so objects with ``history`` revisions made
+    before ``cutoff`` can be restored without them.
+
+    First revision made at or after ``cutoff`` gets ``snapshot``,
+    or if there is none, ``History`` with empty change log and full
+    state is added at ``cutoff``. Deleted objects are skipped.
+    Checkpoints are stored in write database of ``History``.
+    Returns number of stored checkpoints.
+    """
+    using = router.db_for_write(History)
+    history = history.using(using)
+    count = 0
+    for keys in _objects(history, cutoff, batch_size):
+        table_ids = {}
+        for content_type_id, table_id in keys:
+            table_ids.setdefault(content_type_id, []).append(table_id)
+
+        with transaction.atomic(using=using):
+            for content_type_id, ids in table_ids.items():
+                boundaries = _boundaries(content_type_id, ids, cutoff, using)
+                for last, first in boundaries.values():
+                    if last is None or last[1] == ActionType.DELETE:
+                        continue
+                    if first is None:
+                        count += _add_checkpoint(last[0], cutoff, using)
+                    elif first[1] == ActionType.UPDATE and not first[2]:
+                        count += _store_snapshot(first[0], using)
+    return count
+
+
+def _store_snapshot(pk, using):
+    """Stores full state of ``History`` ``pk`` in its ``snapshot``.
+    Returns 1 if state could be restored, 0 otherwise.
+    """
+    history = History.objects.using(using)
+    state = history.get(pk=pk).get_state()
+    if state is None:
+        return 0
+    history.filter(pk=pk).update(
+        snapshot=serializer.dump_change_log(state))
+    return 1
+
+
+def _add_checkpoint(pk, cutoff, using):
+    """Stores state after ``History`` ``pk`` in new ``History``
+    made at ``cutoff``. Returns 1 if state could be restored,
+    0 otherwise.
+    """
+    history = History.objects.using(using)
+    last = history.get(pk=pk)
+    state = last.get_state()
+    if state is None:
+        return 0
+    history.create(
+        content_type_id=last.content_type_id, table_id=last.table_id,
+        action_type=ActionType.UPDATE, schema_id=last.schema_id,
+        revision_ts=cutoff, change_log=serializer.dump_change_log({}),
+        snapshot=serializer.dump_change_log(state))
+    return 1
+
+
+# Columns copied from ``History`` to ``ArchivedHistory``
+ARCHIVE_FIELDS = tuple(x.attname for x in History._meta.concrete_fields)
+
+
+def archive(history, cutoff, stream=None, batch_size=BULK_BATCH_SIZE):
+    """Moves ``history`` revisions made before ``cutoff`` to
+    ``ArchivedHistory``, or writes them to ``stream`` as NDJSON
+    (see ``export.write_ndjson``) and deletes them.
+
+    Checkpoints are stored first (see ``checkpoint_before``), so
+    remaining history can still be materialized. Revisions are moved
+    in batches of ``batch_size``, each in its own transaction
+    on write database of ``History``.
+    Returns number of archived revisions.
+    """
+    checkpoint_before(history, cutoff, batch_size)
+    using = router.db_for_write(History)
+    old = history.using(using).filter(revision_ts__lt=cutoff).order_by('pk')
+    count = 0
+    while True:
+        with transaction.atomic(using=using):
+            pks = list(old.values_list('pk', flat=True)[:batch_size])
+            if not pks:
+                return count
+            batch = History.objects.using(using).filter(pk__in=pks)
+            if stream is None:
+                ArchivedHistory.objects.using(using).bulk_create(
+                    ArchivedHistory(**row)
+                    for row in batch.values(*ARCHIVE_FIELDS))
+            else:
+                export.write_ndjson(batch.stream(batch_size), stream)
+            batch.delete()
+        count += len(pks)
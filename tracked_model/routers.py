@@ -0,0 +1,60 @@
+"""Database router of tracking models"""
+from django.db import router
+
+from tracked_model import conf
+
+
+APP_LABEL = 'tracked_model'
+
+
+def _is_tracking(model):
+    """Returns True if ``model`` belongs to ``tracked_model`` app"""
+    return model._meta.app_label == APP_LABEL
+
+
+class HistoryRouter:
+    """Routes writes of ``History``, ``RequestInfo`` and other models
+    of ``tracked_model`` app to ``TRACKED_MODEL_DATABASE`` and their
+    reads to ``TRACKED_MODEL_READ_DATABASE`` (e.g. a replica),
+    or to ``TRACKED_MODEL_DATABASE`` if it's not set.
+
+    Objects tracking models reference (users, content types) are
+    looked up as if they weren't referenced from another database.
+    Tables of tracking models are created in every database, but are
+    written to only in ``TRACKED_MODEL_DATABASE``. Those of other
+    databases stay empty, so deleting users there still works.
+    """
+    def db_for_read(self, model, **hints):
+        """Returns read database of tracking models"""
+        if not _is_tracking(model):
+            return self._related_db(router.db_for_read, model, hints)
+        return conf.get('READ_DATABASE') or conf.get('DATABASE')
+
+    def db_for_write(self, model, **hints):
+        """Returns write database of tracking models"""
+        if not _is_tracking(model):
+            return self._related_db(router.db_for_write, model, hints)
+        return conf.get('DATABASE')
+
+    @staticmethod
+    def _related_db(route, model, hints):
+        """Returns database of ``model`` object related to instance
+        of tracking model, as given by ``route`` without hints,
+        or None if there is no such instance
+        """
+        instance = hints.get('instance')
+        if instance is None or not _is_tracking(type(instance)):
+            return None
+        return route(model)
+
+    def allow_relation(self, obj1, obj2, **hints):
+        """Allows relations between tracking models and other objects"""
+        if _is_tracking(type(obj1)) or _is_tracking(type(obj2)):
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        """Allows migrations of tracking models in their database"""
+        if app_label == APP_LABEL and db == conf.get('DATABASE'):
+            return True
+        return None
@@ -1,55 +1,316 @@
 """Dump model and field data to dictionary"""
 import json
+import zlib
+from collections import namedtuple
+from operator import attrgetter
 
+from django.core.exceptions import ImproperlyConfigured
 from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import BinaryField
+from django.db.models.signals import class_prepared
+from django.test.signals import setting_changed
 
-from tracked_model.defs import RELATED_FIELDS, FieldType, Field
+from tracked_model import conf
+from tracked_model.defs import (
+    RELATED_FIELDS, BULK_BATCH_SIZE, M2M_CACHE_FIELD, FieldType, Field)
 
+try:
+    # Value of deferred field passed by ``Model.from_db``
+    from django.db.models.base import DEFERRED
+except ImportError:  # django<1.10 defers fields with model subclasses
+    DEFERRED = object()
 
-def _basic_field_data(field, obj):
-    """Returns ``obj.field`` data as a dict"""
-    value = field.value_from_object(obj)
-    return {Field.TYPE: FieldType.VAL, Field.VALUE: value}
+try:
+    import orjson
+except ImportError:
+    orjson = None
 
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
 
-def _related_field_data(field, obj):
-    """Returns relation ``field`` as a dict.
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
 
-    Dict contains related pk info and some meta information
-    for reconstructing objects.
-    """
-    data = _basic_field_data(field, obj)
-    relation_info = {
-        Field.REL_DB_TABLE: field.rel.to._meta.db_table,
-        Field.REL_APP: field.rel.to._meta.app_label,
-        Field.REL_MODEL: field.rel.to.__name__
-    }
-    data[Field.TYPE] = FieldType.REL
-    data[Field.REL] = relation_info
-    return data
 
+_JSON_ENCODER = DjangoJSONEncoder()
+
+# Values of field data stored by position in compact format
+COMPACT_KEYS = (
+    Field.TYPE, Field.VALUE, Field.OLD, Field.NEW, Field.REL,
+    Field.ADDED, Field.REMOVED)
+COMPACT_TYPES = (FieldType.VAL, FieldType.REL, FieldType.M2M)
+COMPACT_REL_KEYS = (Field.REL_DB_TABLE, Field.REL_APP, Field.REL_MODEL)
+
+# Field data keys describing change of field value
+CHANGE_KEYS = (Field.OLD, Field.NEW, Field.ADDED, Field.REMOVED)
 
-def _m2m_field_data(field, obj):
-    """Returns m2m ``field`` as a dict.
+# Field data keys stored in ``HistorySchema`` instead of change logs
+SCHEMA_KEYS = (Field.TYPE, Field.REL)
 
-    Value is an array of related primary keys and some meta information
-    for reconstructing objects.
+# Values stored before codecs were introduced are plain json objects
+LEGACY_FORMAT = b'{'
+
+
+def _relation_info(field):
+    """Returns meta information of model related by ``field``,
+    used for reconstructing objects.
     """
-    data = _basic_field_data(field, obj)
-    data[Field.TYPE] = FieldType.M2M
     related = field.rel.to
-    relation_info = {
+    return {
         Field.REL_DB_TABLE: related._meta.db_table,
         Field.REL_APP: related._meta.app_label,
         Field.REL_MODEL: related.__name__
     }
-    data[Field.REL] = relation_info
-    value = data[Field.VALUE]
-    value = [x[0] for x in value.values_list('pk')]
-    data[Field.VALUE] = value
+
+
+def _values_getter(attnames):
+    """Returns function returning tuple of object ``attnames`` values"""
+    if len(attnames) == 1:
+        return lambda obj: (getattr(obj, attnames[0]),)
+    return attrgetter(*attnames)
+
+
+# Field metadata of a model computed once for all dumps of its objects.
+# ``fields`` is a tuple of ``(name, attname, type, rel)`` entries
+# of tracked concrete fields, ``entries`` maps attnames to them and
+# ``concrete`` to tracked fields. ``values`` returns values of all
+# concrete fields, ``positions`` are indexes of tracked ones among
+# them, or None if all are tracked, and ``index`` maps attnames of
+# tracked fields to their index. ``m2m`` is a tuple of
+# ``(field, name, rel)`` entries of tracked m2m fields and ``ignored``
+# are names of fields whose changes alone aren't stored.
+# ``rel`` dicts (see ``_relation_info``) are shared by all dumps.
+DumpPlan = namedtuple('DumpPlan', (
+    'fields', 'entries', 'concrete', 'values', 'positions', 'index',
+    'm2m', 'ignored'))
+
+_PLANS = {}
+
+
+def _tracked_meta(model):
+    """Returns function telling if ``model`` field is tracked, and
+    names of fields ignored when changed alone, as configured by
+    ``TrackedMeta`` class of ``model`` (see ``TrackedModelMixin``)
+    """
+    meta = getattr(model, 'TrackedMeta', None)
+    include = getattr(meta, 'fields', None)
+    exclude = frozenset(getattr(meta, 'exclude', ()))
+    ignored = frozenset(getattr(meta, 'ignore_changes', ()))
+    skip_blobs = getattr(meta, 'skip_blobs', False)
+
+    opts = model._meta
+    names = {f.name for f in opts.concrete_fields + opts.many_to_many}
+    for option, value in (('fields', include or ()), ('exclude', exclude),
+                          ('ignore_changes', ignored)):
+        unknown = set(value) - names
+        if unknown:
+            raise ImproperlyConfigured(
+                '{0}.TrackedMeta.{1} refers to unknown fields: {2}'.format(
+                    model.__name__, option, ', '.join(sorted(unknown))))
+
+    def is_tracked(field):
+        """Returns True if changes of ``field`` are stored"""
+        if field.primary_key:
+            return True
+        if include is not None and field.name not in include:
+            return False
+        if skip_blobs and isinstance(field, BinaryField):
+            return False
+        return field.name not in exclude
+
+    return is_tracked, ignored
+
+
+def get_plan(model):
+    """Returns ``DumpPlan`` of ``model`` class"""
+    plan = _PLANS.get(model)
+    if plan is not None:
+        return plan
+
+    is_tracked, ignored = _tracked_meta(model)
+    concrete = model._meta.concrete_fields
+    tracked = [f for f in concrete if is_tracked(f)]
+    fields = []
+    for field in tracked:
+        if isinstance(field, RELATED_FIELDS):
+            rel = _relation_info(field)
+            field_type = FieldType.REL
+        else:
+            rel = None
+            field_type = FieldType.VAL
+        fields.append((field.name, field.attname, field_type, rel))
+    positions = None
+    if len(tracked) != len(concrete):
+        positions = tuple(
+            i for i, field in enumerate(concrete) if is_tracked(field))
+    plan = _PLANS[model] = DumpPlan(
+        fields=tuple(fields),
+        entries={entry[1]: entry for entry in fields},
+        concrete={f.attname: f for f in tracked},
+        values=_values_getter([f.attname for f in concrete]),
+        positions=positions,
+        index={
+            f.attname: i for i, f in enumerate(concrete) if is_tracked(f)},
+        m2m=tuple(
+            (f, f.name, _relation_info(f))
+            for f in model._meta.many_to_many if is_tracked(f)),
+        ignored=ignored)
+    return plan
+
+
+def clear_plans(**kwargs):
+    """Drops cached ``DumpPlan`` objects.
+    Called when models are (re)loaded or ``INSTALLED_APPS`` change.
+    """
+    if kwargs.get('setting', 'INSTALLED_APPS') == 'INSTALLED_APPS':
+        _PLANS.clear()
+
+
+class_prepared.connect(clear_plans, dispatch_uid='tracked_model_plans')
+setting_changed.connect(clear_plans, dispatch_uid='tracked_model_plans')
+
+
+def _dump_entries(entries, values):
+    """Returns dict of field data of plan ``entries`` holding ``values``"""
+    data = {}
+    for (name, _, field_type, rel), value in zip(entries, values):
+        if value is DEFERRED:
+            continue
+        if rel is None:
+            data[name] = {Field.TYPE: field_type, Field.VALUE: value}
+        else:
+            data[name] = {
+                Field.TYPE: field_type, Field.VALUE: value, Field.REL: rel}
+    return data
+
+
+def dump_values(obj):
+    """Returns tuple of ``obj`` concrete field values.
+
+    Values are ordered as ``obj._meta.concrete_fields``, same as
+    the ``values`` passed by ``Model.from_db`` to model constructor.
+    Deferred fields aren't loaded, their values are ``DEFERRED``.
+    """
+    deferred = deferred_fields(obj)
+    if not deferred:
+        return get_plan(type(obj)).values(obj)
+    return tuple(
+        DEFERRED if f.attname in deferred else getattr(obj, f.attname)
+        for f in obj._meta.concrete_fields)
+
+
+def deferred_fields(obj):
+    """Returns attnames of fields of ``obj`` deferred on load and not
+    loaded or assigned since
+    """
+    return {
+        name for name in obj.get_deferred_fields()
+        if name not in obj.__dict__
+    }
+
+
+def fields_by_attname(model):
+    """Returns dict of ``model`` tracked concrete fields keyed by
+    attname
+    """
+    return get_plan(model).concrete
+
+
+def dump_field(field, value):
+    """Returns concrete ``field`` holding ``value`` as a dict"""
+    entry = get_plan(field.model).entries[field.attname]
+    return _dump_entries((entry,), (value,))[field.name]
+
+
+def dump_fields(obj, values=None, fields=None):
+    """Returns tracked concrete fields of ``obj`` as a dict.
+
+    ``fields`` default to all concrete fields of ``obj``, untracked
+    ones are skipped. If ``values`` are given, they are used instead of
+    current ``obj`` attributes and must follow ``fields`` order.
+    ``obj`` may also be a model class if ``values`` are given.
+    Deferred fields (``DEFERRED`` values) are left out.
+    Never touches database.
+    """
+    plan = get_plan(obj if isinstance(obj, type) else type(obj))
+    deferred = None
+    if values is None:
+        deferred = deferred_fields(obj)
+    if fields is None:
+        entries = plan.fields
+        if deferred:
+            values = dump_values(obj)
+        if plan.positions is None:
+            if values is None:
+                values = plan.values(obj)
+        elif values is None:
+            values = [getattr(obj, entry[1]) for entry in entries]
+        else:
+            values = [values[i] for i in plan.positions]
+    else:
+        if values is None:
+            values = [
+                DEFERRED if f.attname in deferred else getattr(obj, f.attname)
+                for f in fields]
+        tracked = plan.entries
+        pairs = [
+            (tracked[f.attname], value) for f, value in zip(fields, values)
+            if f.attname in tracked
+        ]
+        entries = [entry for entry, _ in pairs]
+        values = [value for _, value in pairs]
+
+    return _dump_entries(entries, values)
+
+
+def dump_m2m(obj):
+    """Returns m2m fields of ``obj`` as a dict.
+
+    Runs one query per m2m field.
+    """
+    data = {}
+    for m2m, name, rel in get_plan(type(obj)).m2m:
+        related = m2m.value_from_object(obj)
+        value = [x[0] for x in related.values_list('pk')]
+        data[name] = {Field.TYPE: FieldType.M2M, Field.VALUE: value,
+                      Field.REL: rel}
+
+    return data
+
+
+def dump_m2m_many(model, pks):
+    """Returns m2m fields of ``model`` objects with ``pks`` as a dict
+    of ``dump_m2m`` like dicts keyed by object pk.
+
+    Runs one query per m2m field for every ``BULK_BATCH_SIZE`` objects.
+    """
+    data = {pk: {} for pk in pks}
+    for m2m, name, rel in get_plan(model).m2m:
+        through = m2m.rel.through
+        source = through._meta.get_field(m2m.m2m_field_name()).attname
+        target = through._meta.get_field(m2m.m2m_reverse_field_name())
+        related = {pk: [] for pk in pks}
+        for batch in batches(pks):
+            rows = through._default_manager.filter(**{source + '__in': batch})
+            for pk, related_pk in rows.values_list(source, target.attname):
+                related[pk].append(related_pk)
+        for pk in pks:
+            data[pk][name] = {Field.TYPE: FieldType.M2M,
+                              Field.VALUE: related[pk], Field.REL: rel}
+
     return data
 
 
+def batches(items, size=BULK_BATCH_SIZE):
+    """Yields ``items`` sequence in slices of ``size``"""
+    for i in range(0, len(items), size):
+        yield items[i:i + size]
+
+
 def dump_model(obj):
     """Returns ``obj`` as a dict.
 
@@ -67,19 +328,47 @@ def dump_model(obj):
         }
     }
     """
-    data = {}
-    for field in obj._meta.fields:
-        if isinstance(field, RELATED_FIELDS):
-            field_data = _related_field_data(field, obj)
-        else:
-            field_data = _basic_field_data(field, obj)
-        data[field.name] = field_data
-
+    data = dump_fields(obj)
     if obj.pk:
-        for m2m in obj._meta.many_to_many:
-            field_data = _m2m_field_data(m2m, obj)
-            data[m2m.name] = field_data
+        data.update(dump_m2m(obj))
+
+    return data
 
+
+def dump_schema(model):
+    """Returns types and relations of ``model`` fields as a dict of
+    ``dump_model`` like dicts without values.
+    """
+    plan = get_plan(model)
+    schema = {}
+    for name, _, field_type, rel in plan.fields:
+        schema[name] = {Field.TYPE: field_type}
+        if rel is not None:
+            schema[name][Field.REL] = rel
+    for _, name, rel in plan.m2m:
+        schema[name] = {Field.TYPE: FieldType.M2M, Field.REL: rel}
+    return schema
+
+
+def strip_schema(data):
+    """Returns ``data`` (see ``dump_model``) or change log without
+    field types and relations, which are stored in ``HistorySchema``.
+    """
+    return {
+        name: {
+            key: value for key, value in field_data.items()
+            if key not in SCHEMA_KEYS
+        }
+        for name, field_data in data.items()
+    }
+
+
+def apply_schema(data, schema):
+    """Adds field types and relations of ``schema`` (see
+    ``dump_schema``) to ``data`` stripped by ``strip_schema``.
+    """
+    for name, field_data in data.items():
+        field_data.update(schema.get(name, ()))
     return data
 
 
@@ -89,11 +378,118 @@ def restore_model(cls, data):
     """
     obj = cls()
     for field in data:
-        setattr(obj, field, data[field][Field.VALUE])
+        restore_field(obj, field, data[field][Field.VALUE])
 
     return obj
 
 
+def restore_field(obj, name, value):
+    """Sets ``value`` of ``obj`` field called ``name``.
+    Relations are set by their primary key.
+
+    M2M values can't be set without saving ``obj``, so they are
+    stored in ``M2M_CACHE_FIELD`` dict of ``obj``.
+    """
+    field = obj._meta.get_field(name)
+    if field.many_to_many:
+        obj.__dict__.setdefault(M2M_CACHE_FIELD, {})[name] = value
+        return
+    setattr(obj, field.attname, value)
+
+
+def apply_changes(data, change_log):
+    """Updates ``data`` dict (see ``dump_model``) with new values
+    from ``change_log``.
+    M2M changes holding added and removed pks are applied to
+    current list of related pks.
+    """
+    for field, field_data in change_log.items():
+        if field not in data:
+            data[field] = {
+                key: value for key, value in field_data.items()
+                if key not in CHANGE_KEYS
+            }
+        if Field.NEW in field_data:
+            data[field][Field.VALUE] = field_data[Field.NEW]
+        else:
+            data[field][Field.VALUE] = apply_m2m_changes(
+                data[field].get(Field.VALUE) or [], field_data)
+
+
+def apply_m2m_changes(pks, field_data):
+    """Returns list of related ``pks`` with pks added and removed
+    by m2m ``field_data`` change.
+    """
+    removed = set(field_data.get(Field.REMOVED, ()))
+    pks = [x for x in pks if x not in removed]
+    present = set(pks)
+    pks.extend(x for x in field_data.get(Field.ADDED, ()) if x not in present)
+    return pks
+
+
+def merge_m2m_changes(first, second):
+    """Returns m2m change equal to ``first`` change followed
+    by ``second``, or None if they cancel out.
+    """
+    added = set(first.get(Field.ADDED, ()))
+    removed = set(first.get(Field.REMOVED, ()))
+    # Pks removed after being added (or the other way round) were
+    # in their initial state before ``first`` change
+    for pk in second.get(Field.ADDED, ()):
+        if pk in removed:
+            removed.discard(pk)
+        else:
+            added.add(pk)
+    for pk in second.get(Field.REMOVED, ()):
+        if pk in added:
+            added.discard(pk)
+        else:
+            removed.add(pk)
+    merged = {
+        key: value for key, value in first.items()
+        if key not in CHANGE_KEYS
+    }
+    if added:
+        merged[Field.ADDED] = sorted(added)
+    if removed:
+        merged[Field.REMOVED] = sorted(removed)
+    return merged if added or removed else None
+
+
+def merge_changes(first, second):
+    """Returns change log of two consecutive updates.
+    Fields which ended up with their initial value are dropped.
+    """
+    merged = dict(first)
+    for field, data in second.items():
+        if field not in merged:
+            merged[field] = data
+        elif Field.NEW not in data:
+            merged[field] = merge_m2m_changes(merged[field], data)
+        else:
+            data = dict(data)
+            data[Field.OLD] = merged[field][Field.OLD]
+            merged[field] = data
+
+    return {
+        field: data for field, data in merged.items()
+        if data is not None and
+        (Field.NEW not in data or data[Field.OLD] != data[Field.NEW])
+    }
+
+
+def reverse_changes(change_log):
+    """Returns change log undoing ``change_log``"""
+    swapped = {
+        Field.OLD: Field.NEW, Field.NEW: Field.OLD,
+        Field.ADDED: Field.REMOVED, Field.REMOVED: Field.ADDED,
+    }
+    return {
+        field: {swapped.get(key, key): value for key, value in data.items()}
+        for field, data in change_log.items()
+    }
+
+
 def to_json(data):
     """Returns data serialized to json using DjangoJSONEncoder"""
     return json.dumps(data, cls=DjangoJSONEncoder)
@@ -102,3 +498,150 @@ def to_json(data):
 def from_json(json_data):
     """Returns data deserialized from json"""
     return json.loads(json_data, encoding='utf-8')
+
+
+def _compact_entry(field_data):
+    """Returns ``field_data`` dict as positional list.
+    First item is a bitmask of ``COMPACT_KEYS`` present in the dict,
+    followed by their values.
+    """
+    mask = 0
+    entry = [mask]
+    for index, key in enumerate(COMPACT_KEYS):
+        if key not in field_data:
+            continue
+        value = field_data[key]
+        if key == Field.TYPE:
+            value = COMPACT_TYPES.index(value)
+        elif key == Field.REL:
+            value = [value[x] for x in COMPACT_REL_KEYS]
+        mask |= 1 << index
+        entry.append(value)
+    entry[0] = mask
+    return entry
+
+
+def _expand_entry(entry):
+    """Returns field data dict of positional ``entry``"""
+    mask = entry[0]
+    values = iter(entry[1:])
+    field_data = {}
+    for index, key in enumerate(COMPACT_KEYS):
+        if not mask & (1 << index):
+            continue
+        value = next(values)
+        if key == Field.TYPE:
+            value = COMPACT_TYPES[value]
+        elif key == Field.REL:
+            value = dict(zip(COMPACT_REL_KEYS, value))
+        field_data[key] = value
+    return field_data
+
+
+def to_compact(data):
+    """Returns dumped model or change log ``data`` in positional format"""
+    return {name: _compact_entry(x) for name, x in data.items()}
+
+
+def from_compact(data):
+    """Returns data converted back from positional format"""
+    return {name: _expand_entry(x) for name, x in data.items()}
+
+
+def _json_dumps(data):
+    """Returns ``data`` as json bytes, using ``orjson`` if installed"""
+    if orjson is not None:
+        return orjson.dumps(
+            data, default=_JSON_ENCODER.default,
+            option=orjson.OPT_PASSTHROUGH_DATETIME)
+    return to_json(data).encode('utf-8')
+
+
+def _json_loads(value):
+    """Returns data of json bytes, using ``orjson`` if installed"""
+    if orjson is not None:
+        return orjson.loads(value)
+    return from_json(value.decode('utf-8'))
+
+
+def _msgpack_dumps(data):
+    """Returns compact ``data`` packed with ``msgpack``"""
+    return msgpack.packb(
+        to_compact(data), default=_JSON_ENCODER.default, use_bin_type=True)
+
+
+def _msgpack_loads(value):
+    """Returns data unpacked with ``msgpack``"""
+    return from_compact(msgpack.unpackb(value, raw=False))
+
+
+Codec = namedtuple('Codec', ('code', 'name', 'dumps', 'loads'))
+
+# Registered codecs by name and by code stored in row header
+CODECS = {}
+CODES = {}
+
+
+def register_codec(code, name, dumps, loads):
+    """Registers codec stored in rows header as ``code``.
+    ``dumps`` returns bytes of dumped model or change log,
+    ``loads`` returns data of those bytes.
+    """
+    if not 0 < code < 256 or code == LEGACY_FORMAT[0]:
+        raise ValueError('Invalid codec code: {0}'.format(code))
+    if code in CODES and CODES[code].name != name:
+        raise ValueError('Codec code {0} already used'.format(code))
+    CODES[code] = CODECS[name] = Codec(code, name, dumps, loads)
+
+
+register_codec(1, 'json', _json_dumps, _json_loads)
+register_codec(
+    2, 'compact',
+    lambda data: _json_dumps(to_compact(data)),
+    lambda value: from_compact(_json_loads(value)))
+if msgpack is not None:
+    register_codec(3, 'msgpack', _msgpack_dumps, _msgpack_loads)
+
+
+# Compressions by name: (code, compress, decompress)
+COMPRESSIONS = {'zlib': (1, zlib.compress, zlib.decompress)}
+if zstandard is not None:
+    COMPRESSIONS['zstd'] = (
+        2, lambda value: zstandard.ZstdCompressor().compress(value),
+        lambda value: zstandard.ZstdDecompressor().decompress(value))
+DECOMPRESS = {code: x for code, _, x in COMPRESSIONS.values()}
+
+
+def dump_change_log(data):
+    """Returns ``data`` encoded for ``History.change_log`` or
+    ``History.snapshot``.
+
+    Value starts with two bytes header: code of codec
+    (``TRACKED_MODEL_CODEC`` setting) and code of compression, 0 if
+    value is not compressed.
+    """
+    codec = CODECS[conf.get('CODEC')]
+    value = codec.dumps(data)
+    compression = 0
+    min_bytes = conf.get('COMPRESS_MIN_BYTES')
+    if min_bytes is not None and len(value) >= min_bytes:
+        compression, compress, _ = COMPRESSIONS[conf.get('COMPRESSION')]
+        value = compress(value)
+    return bytes((codec.code, compression)) + value
+
+
+def load_change_log(value):
+    """Returns data decoded from ``History.change_log`` or
+    ``History.snapshot`` value.
+    Plain json values stored without header are supported too.
+    """
+    if isinstance(value, str):
+        value = value.encode('utf-8')
+    value = bytes(value)
+    if value[:1] == LEGACY_FORMAT:
+        return _json_loads(value)
+    codec, compression = value[0], value[1]
+    value = value[2:]
+    if compression:
+        value = DECOMPRESS[compression](value)
+    return CODES[codec].loads(value)
@@ -0,0 +1,209 @@
+"""Background writer of ``History`` objects"""
+import atexit
+import logging
+import queue
+import threading
+
+from django.db import connections, router, transaction
+
+from tracked_model import conf, instrumentation
+from tracked_model.defs import Backpressure, Operation
+
+
+logger = logging.getLogger(__name__)
+
+_STOP = object()
+
+
+def _bulk_create(hists):
+    """Stores ``History`` objects with single query, after
+    ``RequestInfo`` objects they reference.
+
+    With ``TRACKED_MODEL_FIELD_INDEX`` setting enabled, ``FieldChange``
+    objects are stored too. Unless database returns ids of bulk inserted
+    rows, ``History`` objects are then stored one by one.
+    """
+    from tracked_model.models import (
+        History, store_request_infos, store_field_changes)
+    using = router.db_for_write(History)
+    if not conf.get('FIELD_INDEX'):
+        store_request_infos(hists)
+        _insert(hists, using)
+        return
+
+    features = connections[using].features
+    with transaction.atomic(using=using):
+        store_request_infos(hists)
+        _insert(hists, using, bulk=getattr(
+            features, 'can_return_ids_from_bulk_insert', False))
+        store_field_changes(hists)
+
+
+def _insert(hists, using, bulk=True):
+    """Inserts ``History`` objects, with single query if ``bulk``"""
+    from tracked_model.models import History
+    with instrumentation.measure(
+            Operation.HISTORY_INSERT, None, using) as measurement:
+        if bulk:
+            History.objects.using(using).bulk_create(hists)
+        else:
+            for hist in hists:
+                hist.save(using=using)
+        if measurement.active:
+            measurement.model = _tracked_model(hists)
+            measurement.rows = len(hists)
+            measurement.size = sum(
+                len(x.change_log) + len(x.snapshot or b'') for x in hists)
+
+
+def _tracked_model(hists):
+    """Returns model tracked by all ``hists``, or None if they track
+    different models
+    """
+    if len({x.content_type_id for x in hists}) != 1:
+        return None
+    return hists[0].content_type.model_class()
+
+
+class HistoryWriter:
+    """Stores ``History`` objects in a background thread.
+
+    Objects are put on a queue of ``maxsize`` and stored in batches of
+    up to ``batch_size`` with ``write`` callable. Writer thread uses its
+    own database connection. ``backpressure`` decides what happens
+    when the queue is full, see ``Backpressure``.
+    """
+    def __init__(self, maxsize, batch_size, backpressure,
+                 write=_bulk_create):
+        self.queue = queue.Queue(maxsize)
+        self.batch_size = batch_size
+        self.backpressure = backpressure
+        self.write = write
+        self.dropped = 0
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def start(self):
+        """Starts writer thread if it's not running"""
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(
+                    target=self._run, name='tracked-model-writer')
+                self._thread.daemon = True
+                self._thread.start()
+
+    def put(self, hists):
+        """Queues ``hists`` for writing"""
+        self.start()
+        for index, hist in enumerate(hists):
+            if self.backpressure == Backpressure.BLOCK:
+                self.queue.put(hist)
+                continue
+            try:
+                self.queue.put_nowait(hist)
+            except queue.Full:
+                rest = hists[index:]
+                if self.backpressure == Backpressure.SYNC:
+                    # Objects queued before are written first
+                    self.flush()
+                    self.write(rest)
+                else:
+                    with self._lock:
+                        self.dropped += len(rest)
+                    logger.warning(
+                        'History queue is full, dropped %d objects',
+                        len(rest))
+                return
+
+    def flush(self):
+        """Blocks until all queued objects are written"""
+        if self._thread is not None:
+            self.queue.join()
+
+    def stop(self, timeout=None):
+        """Writes queued objects and stops writer thread"""
+        if self._thread is None:
+            return
+        self.queue.put(_STOP)
+        self._thread.join(timeout)
+        self._thread = None
+
+    def _next_batch(self):
+        """Returns list of queued objects waiting for writing and
+        whether writer should stop after writing them.
+        """
+        batch = []
+        item = self.queue.get()
+        while item is not _STOP:
+            batch.append(item)
+            if len(batch) >= self.batch_size:
+                return batch, False
+            try:
+                item = self.queue.get_nowait()
+            except queue.Empty:
+                return batch, False
+        self.queue.task_done()
+        return batch, True
+
+    def _run(self):
+        """Writes queued objects until stopped"""
+        try:
+            stop = False
+            while not stop:
+                batch, stop = self._next_batch()
+                if not batch:
+                    continue
+                try:
+                    self.write(batch)
+                except Exception:  # pylint: disable=broad-except
+                    logger.exception(
+                        'Failed to store %d history objects', len(batch))
+                finally:
+                    for _ in batch:
+                        self.queue.task_done()
+        finally:
+            connections.close_all()
+
+
+_writer = None
+_writer_lock = threading.Lock()
+
+
+def get_writer():
+    """Returns ``HistoryWriter`` configured with settings.
+    It's stopped on interpreter shutdown.
+    """
+    global _writer  # pylint: disable=global-statement
+    with _writer_lock:
+        if _writer is None:
+            _writer = HistoryWriter(
+                conf.get('ASYNC_QUEUE_SIZE'),
+                conf.get('ASYNC_BATCH_SIZE'),
+                conf.get('ASYNC_BACKPRESSURE'))
+            atexit.register(stop)
+        return _writer
+
+
+def write_history(hists):
+    """Stores ``History`` objects with single query, or queues them
+    for background writer if ``TRACKED_MODEL_ASYNC`` setting is enabled.
+    """
+    if conf.get('ASYNC'):
+        get_writer().put(hists)
+    else:
+        _bulk_create(hists)
+
+
+def flush():
+    """Blocks until all queued ``History`` objects are written"""
+    if _writer is not None:
+        _writer.flush()
+
+
+def stop(timeout=None):
+    """Writes queued ``History`` objects and stops background writer"""
+    global _writer  # pylint: disable=global-statement
+    with _writer_lock:
+        writer, _writer = _writer, None
+    if writer is not None:
+        writer.stop(timeout)